@@ -0,0 +1,61 @@
+"""This script compiles corpus annotation files to the binary corpus format.
+
+"""
+
+import sys
+import argparse
+
+from tde.util.reader import load_corpus_txt, save_corpus_bin
+
+
+if __name__ == '__main__':
+    def parse_args():
+        parser = argparse.ArgumentParser(
+            prog='compile_corpus.py',
+            formatter_class=argparse.RawDescriptionHelpFormatter,
+            description='Compile phone or word files to the binary corpus '
+            'format.',
+            epilog="""Example usage:
+
+$ python compile_corpus.py resources/english.phn resources/english.wrd
+
+writes the directories `resources/english.phn.bin` and
+`resources/english.wrd.bin`, which the eval scripts load instead of the text
+files when they are present and up to date.
+
+Note that the input files must be formatted like this:
+
+fileid starttime endtime symbol
+...
+""")
+        parser.add_argument('infiles', metavar='INPUT',
+                            nargs='+',
+                            help='input phone or word files')
+        parser.add_argument('-o', '--output',
+                            action='store',
+                            dest='output',
+                            default=None,
+                            help='output directory, only with a single '
+                            'input file (default: INPUT.bin)')
+        parser.add_argument('-v', '--verbose',
+                            action='store_true',
+                            dest='verbose',
+                            default=False,
+                            help='display progress')
+        return vars(parser.parse_args())
+
+    args = parse_args()
+    infiles = args['infiles']
+    verbose = args['verbose']
+    if args['output'] is not None and len(infiles) > 1:
+        print 'Option -o can only be used with a single input file.'
+        sys.exit(1)
+    for infile in infiles:
+        outdir = args['output'] or infile + '.bin'
+        if verbose:
+            print 'Compiling {0} to {1}...'.format(infile, outdir),
+            sys.stdout.flush()
+        save_corpus_bin(load_corpus_txt(infile), outdir)
+        if verbose:
+            print 'done.'
+            sys.stdout.flush()
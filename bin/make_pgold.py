@@ -0,0 +1,79 @@
+"""This script precomputes the gold pairs of the folds of a dataset.
+
+"""
+
+import sys
+import os.path as path
+import argparse
+
+from tde.goldset import PgoldFolds, pgold_digest
+from tde.util.reader import load_corpus, load_split, load_classes_txt
+
+
+if __name__ == '__main__':
+    def parse_args():
+        parser = argparse.ArgumentParser(
+            prog='make_pgold.py',
+            formatter_class=argparse.RawDescriptionHelpFormatter,
+            description='Precompute the gold pairs of the folds of a '
+            'dataset.',
+            epilog="""Example usage:
+
+$ python make_pgold.py resources english
+
+reads `english.classes`, `english.phn`, `english.intervals.cross` and
+`english.intervals.within` from `resources/` and writes the gold pairs of every
+fold, with their counts and weights, to `resources/english.pgold`. The eval
+scripts load this file instead of computing the gold pairs for every
+evaluated system, as long as the input files are unchanged.
+""")
+        parser.add_argument('resource_dir', metavar='RESOURCEDIR',
+                            nargs=1,
+                            help='resource directory')
+        parser.add_argument('dataset', metavar='DATASET',
+                            nargs=1,
+                            help='name of the dataset')
+        parser.add_argument('-o', '--output',
+                            action='store',
+                            dest='output',
+                            default=None,
+                            help='output file '
+                            '(default: RESOURCEDIR/DATASET.pgold)')
+        parser.add_argument('-v', '--verbose',
+                            action='store_true',
+                            dest='verbose',
+                            default=False,
+                            help='display progress')
+        return vars(parser.parse_args())
+
+    args = parse_args()
+    resource_dir = args['resource_dir'][0]
+    dataset = args['dataset'][0]
+    verbose = args['verbose']
+
+    resource = lambda ext: path.join(resource_dir, dataset + ext)
+    gold_clsfile = resource('.classes')
+    phn_corpus_file = resource('.phn')
+    cross_file = resource('.intervals.cross')
+    within_file = resource('.intervals.within')
+    outfile = args['output'] or resource('.pgold')
+
+    if verbose:
+        print 'Reading input files...',
+        sys.stdout.flush()
+    corpus = load_corpus(phn_corpus_file)
+    gold_clsdict, _ = load_classes_txt(gold_clsfile, corpus)
+    folds = {'cross': load_split(cross_file, multiple=True),
+             'within': load_split(within_file, multiple=True)}
+    if verbose:
+        print 'done.'
+    pgold_folds = PgoldFolds.build(gold_clsdict, folds,
+                                   pgold_digest(gold_clsfile, phn_corpus_file,
+                                                cross_file, within_file),
+                                   verbose)
+    if verbose:
+        print 'Writing {0}...'.format(outfile),
+        sys.stdout.flush()
+    pgold_folds.save(outfile)
+    if verbose:
+        print 'done.'
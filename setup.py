@@ -39,7 +39,9 @@ extensions = [Extension('tde.substrings.ccss',
                         sources=['tde/substrings/levenshtein.pyx'],
                         extra_compile_args=['-shared', '-pthread', '-fPIC',
                                             '-fwrapv', '-O3', '-Wall',
-                                            '-fno-strict-aliasing'],
+                                            '-fno-strict-aliasing',
+                                            '-fopenmp'],
+                        extra_link_args=['-fopenmp'],
                         include_dirs=['/usr/include/python2.7', np_inc])]
 
 setup(
@@ -51,7 +53,8 @@ setup(
     author_email='maartenversteegh@gmail.com',
     url='https://github.com/mwv/tde',
     packages=[
-        'tde', 'tde.data', 'tde.util',  'tde.measures', 'tde.substrings'
+        'tde', 'tde.data', 'tde.util',  'tde.measures', 'tde.substrings',
+        'tde.eval'
     ],
     package_dir={'tde':
                  'tde'},
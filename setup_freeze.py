@@ -28,7 +28,9 @@ extensions = [Extension('tde.substrings.ccss', sources=['tde/substrings/ccss.pyx
               Extension('tde.substrings.levenshtein', sources=['tde/substrings/levenshtein'],
                         extra_compile_args=['-shared', '-pthread', '-fPIC',
                                             '-fwrapv', '-O3', '-Wall',
-                                            '-fno-strict-aliasing'],
+                                            '-fno-strict-aliasing',
+                                            '-fopenmp'],
+                        extra_link_args=['-fopenmp'],
                         include_dirs=['/usr/include/python2.7', np_inc])]
 
 
@@ -7,6 +7,8 @@ ClassID
     Class identifier. Used as keys in ClassDict.
 ClassDict
     Mapping representing a partitioning.
+CompactClassDict
+    Array-backed ClassDict.
 
 """
 
@@ -14,6 +16,10 @@ from pprint import pformat
 from itertools import izip, repeat, combinations, ifilterfalse
 import collections
 
+import numpy as np
+
+from tde.data.interval import Interval
+from tde.data.fragment import FragmentToken
 from tde.util.functions import unique, flatten
 
 class ClassDict(collections.Mapping):
@@ -24,6 +30,9 @@ class ClassDict(collections.Mapping):
     Parameters
     ----------
     clsdict : dict from ClassID to tuple of FragmentToken
+    symbols : SymbolTable, optional
+        Integer coding of the marks, shared with the Corpus that was used to
+        annotate the fragments.
 
     Methods
     -------
@@ -35,8 +44,9 @@ class ClassDict(collections.Mapping):
         Restrict to a collection of Intervals
 
     """
-    def __init__(self, clsdict):
+    def __init__(self, clsdict, symbols=None):
         self.clsdict = clsdict
+        self.symbols = symbols
 
     def __contains__(self, key):
         return key in self.clsdict
@@ -59,9 +69,26 @@ class ClassDict(collections.Mapping):
     def __ne__(self, other):
         return not self.__eq__(other)
 
+    def iteritems(self):
+        return self.clsdict.iteritems()
+
+    def itervalues(self):
+        return self.clsdict.itervalues()
+
     def pretty(self):
         return pformat(self.clsdict)
 
+    def compact(self):
+        """
+        Convert to the array-backed representation.
+
+        Returns
+        -------
+        CompactClassDict
+
+        """
+        return CompactClassDict.from_clsdict(self)
+
     def iter_fragments(self, with_class=False):
         """
         Iterate over FragmentTokens.
@@ -78,9 +105,9 @@ class ClassDict(collections.Mapping):
         """
         if with_class:
             return unique(flatten(izip(repeat(c), v)
-                                  for c, v in self.clsdict.iteritems()))
+                                  for c, v in self.iteritems()))
         else:
-            return unique(flatten(self.clsdict.itervalues()))
+            return unique(flatten(self.itervalues()))
 
     def iter_pairs(self, within, order):
         """
@@ -98,7 +125,7 @@ class ClassDict(collections.Mapping):
         Iterator over (FragmentToken, FragmentToken) pairs.
 
         """
-        vals = self.clsdict.itervalues()
+        vals = self.itervalues()
         if within:
             if order:
                 pairs = flatten(((f1, f2), (f2, f1))
@@ -141,10 +168,19 @@ class ClassDict(collections.Mapping):
             New ClassDict object restricted to the fragments in `interval_db`
 
         """
+        items = [(classID, fragments)
+                 for classID, fragments in self.iteritems()]
+        flat = [f for _, fragments in items for f in fragments]
+        covered = interval_db.is_covered_many(
+            [f.name for f in flat],
+            [f.interval.start for f in flat],
+            [f.interval.end for f in flat])
         r = {}
-        for classID, fragments in self.clsdict.iteritems():
-            fs = [f for f in fragments
-                  if interval_db.is_covered(f.name, f.interval)]
+        offset = 0
+        for classID, fragments in items:
+            mask = covered[offset:offset+len(fragments)]
+            offset += len(fragments)
+            fs = [f for f, c in izip(fragments, mask) if c]
             if len(fs) == 0:
                 pass
             elif len(fs) == 1:
@@ -154,7 +190,241 @@ class ClassDict(collections.Mapping):
                     r[classID] = tuple(fs)
             else:
                 r[classID] = tuple(fs)
-        return ClassDict(r)
+        return ClassDict(r, symbols=self.symbols)
+
+
+class CompactClassDict(ClassDict):
+    """
+    ClassDict backed by parallel arrays.
+
+    Instead of holding a tuple of FragmentTokens per class, the fragments are
+    stored as a struct of arrays, grouped by class. Filenames and marks are
+    interned, so that the object is small in memory and cheap to pickle.
+    FragmentTokens are only constructed when a class is accessed.
+
+    Use `from_clsdict` or `ClassDict.compact` to construct.
+
+    Parameters
+    ----------
+    classes : list of ClassID
+    offsets : ndarray of ints
+        Fragments of `classes[i]` are at positions offsets[i]:offsets[i+1].
+    names : list of strings
+    name_codes : ndarray of ints
+        Index into `names` for each fragment.
+    starts, ends : ndarray of floats
+    marks : list of marks
+    mark_codes : ndarray of ints
+        Index into `marks` for each fragment, -1 for fragments without mark.
+    symbols : SymbolTable, optional
+        If given, `marks` is `symbols.marks` and the mark codes are mark ids.
+
+    Attributes
+    ----------
+    class_codes : ndarray of ints
+        Index into `classes` for each fragment.
+
+    """
+    def __init__(self, classes, offsets, names, name_codes, starts, ends,
+                 marks, mark_codes, symbols=None):
+        self.classes = list(classes)
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.names = list(names)
+        self.name_codes = np.asarray(name_codes, dtype=np.int32)
+        self.starts = np.asarray(starts, dtype=np.double)
+        self.ends = np.asarray(ends, dtype=np.double)
+        self.marks = list(marks) if symbols is None else symbols.marks
+        self.mark_codes = np.asarray(mark_codes, dtype=np.int32)
+        self.symbols = symbols
+        self._index = {c: i for i, c in enumerate(self.classes)}
+
+    @classmethod
+    def from_clsdict(cls, clsdict):
+        """
+        Build a CompactClassDict from a mapping of ClassID to tuples of
+        FragmentTokens.
+
+        Parameters
+        ----------
+        clsdict : ClassDict or dict from ClassID to tuple of FragmentToken
+
+        Returns
+        -------
+        CompactClassDict
+
+        """
+        if isinstance(clsdict, CompactClassDict):
+            return clsdict
+        symbols = getattr(clsdict, 'symbols', None)
+        classes = []
+        offsets = [0]
+        names = {}
+        marks = {}
+        if symbols is None:
+            mark_id = lambda m: marks.setdefault(m, len(marks))
+        else:
+            mark_id = symbols.mark_id
+        name_codes = []
+        mark_codes = []
+        starts = []
+        ends = []
+        for class_id, fragments in clsdict.iteritems():
+            classes.append(class_id)
+            offsets.append(offsets[-1] + len(fragments))
+            for f in fragments:
+                name_codes.append(names.setdefault(f.name, len(names)))
+                if f.mark is None:
+                    mark_codes.append(-1)
+                else:
+                    mark_codes.append(mark_id(f.mark))
+                starts.append(f.interval.start)
+                ends.append(f.interval.end)
+        return cls(classes, offsets,
+                   sorted(names, key=names.get), name_codes,
+                   starts, ends,
+                   sorted(marks, key=marks.get) if symbols is None
+                   else symbols.marks,
+                   mark_codes, symbols=symbols)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['_index']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._index = {c: i for i, c in enumerate(self.classes)}
+
+    @property
+    def clsdict(self):
+        return dict(self.iteritems())
+
+    @property
+    def class_codes(self):
+        return np.repeat(np.arange(len(self.classes), dtype=np.int32),
+                         np.diff(self.offsets))
+
+    def __contains__(self, key):
+        return key in self._index
+
+    def __getitem__(self, key):
+        return self._fragments(self._index[key])
+
+    def __iter__(self):
+        return iter(self.classes)
+
+    def __len__(self):
+        return len(self.classes)
+
+    def __repr__(self):
+        return '<CompactClassDict {0} classes, {1} fragments>'.format(
+            len(self.classes), self.starts.shape[0])
+
+    def __str__(self):
+        # the inherited __str__ would build a FragmentToken per fragment
+        return repr(self)
+
+    def iteritems(self):
+        return ((c, self._fragments(i)) for i, c in enumerate(self.classes))
+
+    def itervalues(self):
+        return (self._fragments(i) for i in xrange(len(self.classes)))
+
+    def n_fragments(self):
+        """Number of fragments, counted over all classes."""
+        return self.starts.shape[0]
+
+    def fragment(self, ix):
+        """
+        Materialize a single FragmentToken.
+
+        Parameters
+        ----------
+        ix : int
+            Position in the fragment arrays.
+
+        Returns
+        -------
+        FragmentToken
+
+        """
+        mark_code = self.mark_codes[ix]
+        return FragmentToken(self.names[self.name_codes[ix]],
+                             Interval(float(self.starts[ix]),
+                                      float(self.ends[ix])),
+                             None if mark_code < 0 else self.marks[mark_code])
+
+    def _fragments(self, class_ix):
+        lo, hi = self.offsets[class_ix], self.offsets[class_ix+1]
+        names = self.names
+        marks = self.marks
+        return tuple(FragmentToken(names[n], Interval(s, e),
+                                   None if m < 0 else marks[m])
+                     for n, s, e, m in izip(self.name_codes[lo:hi].tolist(),
+                                            self.starts[lo:hi].tolist(),
+                                            self.ends[lo:hi].tolist(),
+                                            self.mark_codes[lo:hi].tolist()))
+
+    def take(self, mask, remove_singletons=False):
+        """
+        Select a subset of the fragments.
+
+        Classes left without fragments are dropped.
+
+        Parameters
+        ----------
+        mask : ndarray of bools or of ints
+            Fragments to keep, as a mask or as positions in the fragment
+            arrays.
+        remove_singletons : bool
+            Remove classes with a single element
+
+        Returns
+        -------
+        CompactClassDict
+
+        """
+        mask = np.asarray(mask)
+        if mask.dtype != np.bool:
+            positions = mask
+            mask = np.zeros(self.starts.shape[0], dtype=np.bool)
+            mask[positions] = True
+        counts = np.bincount(self.class_codes[mask],
+                             minlength=len(self.classes))
+        min_count = 2 if remove_singletons else 1
+        keep_class = counts >= min_count
+        mask = mask & np.repeat(keep_class, np.diff(self.offsets))
+        offsets = np.concatenate(([0], np.cumsum(counts[keep_class])))
+        return CompactClassDict([c for c, k in izip(self.classes, keep_class)
+                                 if k],
+                                offsets,
+                                self.names, self.name_codes[mask],
+                                self.starts[mask], self.ends[mask],
+                                self.marks, self.mark_codes[mask],
+                                symbols=self.symbols)
+
+    def restrict(self, interval_db, remove_singletons=False):
+        """
+        Restrict the CompactClassDict to a set of Intervals.
+
+        Parameters
+        ----------
+        interval_db : IntervalDB
+            Collection of Intervals
+        remove_singletons : bool
+            Remove classes with a single element
+
+        Returns
+        -------
+        CompactClassDict
+            New object restricted to the fragments in `interval_db`
+
+        """
+        names = np.array(self.names, dtype=object)
+        covered = interval_db.is_covered_many(names[self.name_codes],
+                                              self.starts, self.ends) \
+            if len(names) > 0 else np.zeros(0, dtype=np.bool)
+        return self.take(covered, remove_singletons=remove_singletons)
 
 
 ClassID = collections.namedtuple('ClassID', ['ID', 'mark'])
@@ -9,13 +9,79 @@ Corpus
 """
 
 from functools import cmp_to_key
+from itertools import izip
 from pprint import pformat
 import collections
 
+import numpy as np
+
 from tde.data.sorted_list import SortedList
-from tde.data.segment_annotation import annotation_cmp
+from tde.data.segment_annotation import SegmentAnnotation, annotation_cmp
 from tde.data.fragment import FragmentToken
+from tde.data.interval import Interval, IntervalIndex, interval_bisect
+from tde.data.symbols import SymbolTable
 from tde.util.functions import flatten
+from tde.util.lru import LRUCache
+
+_annotation_key = cmp_to_key(annotation_cmp)
+
+# default bound on the number of cached `tokens` lookups
+CACHE_SIZE = 1 << 18
+
+
+class _ArraySegments(collections.Mapping):
+    """
+    Segment annotations of a Corpus built from the layout of `token_arrays`.
+
+    The SegmentAnnotations of a name are only built when the name is first
+    looked up, so that a corpus loaded memory-mapped keeps its tokens in the
+    arrays until they are needed.
+
+    """
+    def __init__(self, names, name_codes, starts, ends, phone_ids, offsets,
+                 symbols):
+        self._arrays = (names, name_codes, starts, ends, phone_ids, offsets)
+        self._symbols = symbols
+        # segments are laid out by name: those of a name are contiguous
+        segment_codes = name_codes[offsets[:-1]]
+        codes = np.unique(segment_codes)
+        lo = np.searchsorted(segment_codes, codes, side='left')
+        hi = np.searchsorted(segment_codes, codes, side='right')
+        self._ranges = {names[c]: (l, h)
+                        for c, l, h in izip(codes.tolist(), lo.tolist(),
+                                            hi.tolist())}
+        self._built = {}
+
+    def __getitem__(self, name):
+        try:
+            return self._built[name]
+        except KeyError:
+            pass
+        lo, hi = self._ranges[name]
+        _, _, starts, ends, phone_ids, offsets = self._arrays
+        first, last = int(offsets[lo]), int(offsets[hi])
+        start_list = starts[first:last].tolist()
+        end_list = ends[first:last].tolist()
+        phones = self._symbols.phones
+        marks = [phones[i] for i in phone_ids[first:last].tolist()]
+        bounds = (offsets[lo:hi + 1] - first).tolist()
+        fas = SortedList.from_sorted(
+            (SegmentAnnotation(
+                name,
+                [FragmentToken(name, Interval(start_list[i], end_list[i]),
+                               marks[i])
+                 for i in xrange(a, b)],
+                presorted=True)
+             for a, b in izip(bounds[:-1], bounds[1:])),
+            key=_annotation_key)
+        self._built[name] = fas
+        return fas
+
+    def __iter__(self):
+        return iter(self._ranges)
+
+    def __len__(self):
+        return len(self._ranges)
 
 
 class Corpus(collections.Mapping):
@@ -28,9 +94,18 @@ class Corpus(collections.Mapping):
     Parameters
     ----------
     segment_annotations : list of SegmentAnnotations
+    symbols : SymbolTable, optional
+        Integer coding of the symbols in the annotation. Built from the
+        annotation if not given.
+    cache_size : int, optional
+        Maximum number of `tokens` lookups kept in the cache, None for no
+        limit.
+    cache_bytes : int, optional
+        Maximum estimated size in bytes of the cache, None for no limit.
 
     """
-    def __init__(self, segment_annotations=None):
+    def __init__(self, segment_annotations=None, symbols=None,
+                 cache_size=CACHE_SIZE, cache_bytes=None):
         self.segment_annotations = {}
         if segment_annotations is None:
             segment_annotations = []
@@ -39,8 +114,79 @@ class Corpus(collections.Mapping):
                 self.segment_annotations[fa.name].insert(fa)
             except KeyError:
                 self.segment_annotations[fa.name] = \
-                    SortedList([fa], key=cmp_to_key(annotation_cmp))
-        self._cache = {}
+                    SortedList([fa], key=_annotation_key)
+        if symbols is None:
+            symbols = SymbolTable(sorted(set(
+                token.mark
+                for fas in self.segment_annotations.itervalues()
+                for fa in fas
+                for token in fa)))
+        self.symbols = symbols
+        self._cache = LRUCache(cache_size, cache_bytes)
+        self._token_arrays = None
+        self._token_index = None
+        self._segment_offsets = None
+        self._token_params = None
+        self._token_counts = None
+        self._segment_bounds = {}
+        self._search_index = None
+
+    @classmethod
+    def from_arrays(cls, names, name_codes, starts, ends, phone_ids, offsets,
+                    symbols):
+        """
+        Build a Corpus from the layout of `token_arrays`.
+
+        The arrays are used as they are, memory-mapped or not, and the
+        SegmentAnnotations of a name are only built when it is first looked
+        up. Such a corpus is pickled as its arrays.
+
+        Parameters
+        ----------
+        names : list of strings
+            Sorted identifiers.
+        name_codes : ndarray of ints
+            Index into `names` for each token.
+        starts, ends : ndarray of floats
+        phone_ids : ndarray of ints
+            Symbol id of the mark of each token in `symbols`.
+        offsets : ndarray of ints
+            Segment i holds the tokens at positions offsets[i]:offsets[i+1].
+        symbols : SymbolTable
+
+        Returns
+        -------
+        Corpus
+
+        Raises
+        ------
+        ValueError
+            If the arrays don't have matching lengths, or if the tokens are
+            not laid out by name, then by segment, then in temporal order, or
+            if tokens of the same name overlap.
+
+        """
+        ntokens = len(name_codes)
+        if not (len(starts) == len(ends) == len(phone_ids) == ntokens):
+            raise ValueError('token arrays must have the same length')
+        if len(offsets) == 0 or offsets[0] != 0 or offsets[-1] != ntokens \
+           or np.any(np.diff(offsets) <= 0):
+            raise ValueError('invalid segment offsets')
+        if np.any(name_codes[offsets[:-1]] != name_codes[offsets[1:] - 1]):
+            raise ValueError('segment spans several names')
+        if np.any(np.diff(name_codes) < 0) or \
+           np.any((starts[1:] < ends[:-1])[np.diff(name_codes) == 0]):
+            raise ValueError('tokens are not sorted or overlap')
+        corpus = cls(symbols=symbols)
+        names = list(names)
+        corpus.segment_annotations = _ArraySegments(
+            names, name_codes, starts, ends, phone_ids, offsets, symbols)
+        corpus._token_arrays = (names, name_codes, starts, ends, phone_ids)
+        corpus._segment_offsets = offsets
+        interval = Interval(0, 0)
+        corpus._token_params = (interval.minimum_overlap,
+                                interval.minimum_overlap_fraction)
+        return corpus
 
     def __eq__(self, other):
         if not isinstance(other, Corpus):
@@ -57,6 +203,34 @@ class Corpus(collections.Mapping):
                     return False
         return True
 
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        if isinstance(self.segment_annotations, _ArraySegments):
+            # rebuilt from the token arrays, which joblib can memory-map
+            state['segment_annotations'] = None
+        else:
+            # the sort key is not picklable; the annotations are stored in
+            # order
+            state['segment_annotations'] = {
+                name: list(fas)
+                for name, fas in self.segment_annotations.iteritems()}
+        state['_cache'] = LRUCache(self._cache.maxsize, self._cache.maxbytes)
+        state['_token_index'] = None
+        state['_segment_bounds'] = {}
+        state['_search_index'] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        if self.segment_annotations is None:
+            self.segment_annotations = _ArraySegments(
+                *(self._token_arrays + (self._segment_offsets,
+                                        self.symbols)))
+        else:
+            self.segment_annotations = {
+                name: SortedList.from_sorted(fas, key=_annotation_key)
+                for name, fas in self.segment_annotations.iteritems()}
+
     def __len__(self):
         return len(self.segment_annotations)
 
@@ -67,14 +241,286 @@ class Corpus(collections.Mapping):
         return iter(self.segment_annotations)
 
     def __repr__(self):
-        return '<Corpus - {0} segments, {1} names>'.format(
-            sum(map(len, self.values())), len(self))
+        if self._segment_offsets is None:
+            n_segments = sum(map(len, self.values()))
+        else:
+            n_segments = self._segment_offsets.shape[0] - 1
+        return '<Corpus - {0} segments, {1} names>'.format(n_segments,
+                                                           len(self))
 
     def __str__(self):
         return pformat(self.segment_annotations)
 
     def clear(self):
-        self._cache = {}
+        self._cache.clear()
+
+    def cache_info(self):
+        """
+        Statistics of the cache of `tokens`.
+
+        Returns
+        -------
+        CacheInfo
+            Named tuple of hits, misses, maxsize, maxbytes, currsize and
+            nbytes.
+
+        """
+        return self._cache.info()
+
+    def set_cache_size(self, cache_size=CACHE_SIZE, cache_bytes=None):
+        """
+        Change the bounds of the cache of `tokens`.
+
+        Parameters
+        ----------
+        cache_size : int, optional
+            Maximum number of lookups, None for no limit.
+        cache_bytes : int, optional
+            Maximum estimated size in bytes, None for no limit.
+
+        """
+        self._cache.resize(cache_size, cache_bytes)
+
+    def token_arrays(self):
+        """
+        The tokens of the corpus as flat arrays.
+
+        Tokens are laid out by name, then by segment, then in temporal order,
+        so that the tokens of a segment are contiguous.
+
+        Returns
+        -------
+        names : list of strings
+        name_codes : ndarray of ints
+            Index into `names` for each token.
+        starts, ends : ndarray of floats
+        phone_ids : ndarray of ints
+            Symbol id of the mark of each token in `self.symbols`.
+
+        """
+        if self._token_arrays is None:
+            names = sorted(self.segment_annotations.keys())
+            tokens = [token
+                      for name in names
+                      for fa in self.segment_annotations[name]
+                      for token in fa]
+            name_index = {name: i for i, name in enumerate(names)}
+            name_codes = np.fromiter((name_index[t.name] for t in tokens),
+                                     dtype=np.int32, count=len(tokens))
+            starts = np.fromiter((t.interval.start for t in tokens),
+                                 dtype=np.double, count=len(tokens))
+            ends = np.fromiter((t.interval.end for t in tokens),
+                               dtype=np.double, count=len(tokens))
+            phone_ids = np.fromiter((self.symbols.phone_id(t.mark)
+                                     for t in tokens),
+                                    dtype=np.int32, count=len(tokens))
+            lengths = [len(fa) for name in names
+                       for fa in self.segment_annotations[name]]
+            offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+            np.cumsum(lengths, out=offsets[1:])
+            params = set((t.interval.minimum_overlap,
+                          t.interval.minimum_overlap_fraction)
+                         for t in tokens)
+            self._segment_offsets = offsets
+            self._token_params = params.pop() if len(params) == 1 else None
+            self._token_arrays = (names, name_codes, starts, ends, phone_ids)
+        return self._token_arrays
+
+    def token_counts(self):
+        """
+        Number of distinct tokens and of distinct marks in the corpus.
+
+        Computed once on `token_arrays` and cached.
+
+        Returns
+        -------
+        n_tokens : int
+            Number of tokens, counting identical tokens once.
+        n_types : int
+            Number of distinct marks.
+
+        """
+        if self._token_counts is None:
+            _, name_codes, starts, ends, phone_ids = self.token_arrays()
+            order = np.lexsort((phone_ids, ends, starts, name_codes))
+            # a token is new if it differs from the previous one in order
+            new = np.ones(order.shape[0], dtype=np.bool)
+            if order.shape[0] > 0:
+                new[1:] = False
+                for key in (name_codes, starts, ends, phone_ids):
+                    key = key[order]
+                    new[1:] |= key[1:] != key[:-1]
+            self._token_counts = (int(new.sum()),
+                                  np.unique(phone_ids).shape[0])
+        return self._token_counts
+
+    def _segments(self, name):
+        """Bounds of the segments of a name, None if they are not sorted."""
+        try:
+            return self._segment_bounds[name]
+        except KeyError:
+            fas = self.segment_annotations[name]
+            if any(fa.interval is None for fa in fas):
+                self._segment_bounds[name] = None
+                return None
+            starts = np.fromiter((fa.interval.start for fa in fas),
+                                 dtype=np.double, count=len(fas))
+            ends = np.fromiter((fa.interval.end for fa in fas),
+                               dtype=np.double, count=len(fas))
+            if np.any(np.diff(starts) < 0) or np.any(np.diff(ends) < 0):
+                bounds = None
+            else:
+                bounds = (starts, ends, fas[0].interval)
+            self._segment_bounds[name] = bounds
+            return bounds
+
+    def _index(self):
+        """IntervalIndex of the segments by name and of the tokens by
+        segment, None if the segments are not sorted."""
+        if self._search_index is None:
+            _, name_codes, starts, ends, _ = self.token_arrays()
+            offsets = self._segment_offsets
+            sizes = np.diff(offsets)
+            firsts, lasts = offsets[:-1], offsets[1:] - 1
+            params = self._token_params
+            if np.any(sizes == 0):
+                self._search_index = False
+                return None
+            try:
+                segments = IntervalIndex(name_codes[firsts], starts[firsts],
+                                         ends[lasts])
+                tokens = IntervalIndex(np.repeat(np.arange(sizes.shape[0]),
+                                                 sizes),
+                                       starts, ends, *(params or (0., 0.)))
+                self._search_index = (segments, tokens)
+            except ValueError:
+                self._search_index = False
+        return self._search_index or None
+
+    def token_range(self, name, interval):
+        """
+        Find the position of the tokens covering an interval in
+        `token_arrays`.
+
+        Parameters
+        ----------
+        name : string
+            Identifier.
+        interval : Interval
+            Time segment.
+
+        Returns
+        -------
+        start, stop : int
+            The tokens are at positions start:stop. The range is empty if the
+            interval covers no tokens.
+
+        Raises
+        ------
+        KeyError
+            If name is not known.
+        ValueError
+            If the interval is not found.
+        """
+        self.token_arrays()
+        tokens = self.tokens(name, interval)
+        if len(tokens) == 0:
+            return 0, 0
+        if self._token_index is None:
+            names, name_codes, starts, _, _ = self._token_arrays
+            self._token_index = {
+                (names[c], s): i
+                for i, (c, s) in enumerate(izip(name_codes.tolist(),
+                                                starts.tolist()))}
+        start = self._token_index[(name, tokens[0].interval.start)]
+        return start, start + len(tokens)
+
+    def tokens_many(self, names, intervals):
+        """
+        Find the positions of the tokens covering many intervals in
+        `token_arrays`.
+
+        Gives the same ranges as `token_range` on each interval, but the
+        intervals are looked up in batches with `np.searchsorted`.
+
+        The ranges are those of the bisection of the SortedLists under
+        `interval_cmp`, quirks included: a query that starts or ends inside
+        a token keeps it only if they overlap enough, and only the last
+        segment that compares lower or equal is searched. `interval_cmp` is
+        not a total order, so where that bisection depends on its path the
+        query is answered by `token_range` rather than by the arrays. The
+        quirks are kept because the gold fragments, pairs and scores of
+        existing evaluations are computed with `tokens`.
+
+        Parameters
+        ----------
+        names : sequence of strings
+            Identifiers.
+        intervals : sequence of Intervals
+            Time segments.
+
+        Returns
+        -------
+        start, stop : ndarray of ints
+            The tokens covering interval i are at positions
+            start[i]:stop[i]. Both are -1 where `token_range` raises KeyError
+            or ValueError.
+
+        """
+        all_names, _, _, _, _ = self.token_arrays()
+        n = len(intervals)
+        start = np.full(n, -1, dtype=np.int64)
+        stop = np.full(n, -1, dtype=np.int64)
+        if n == 0:
+            return start, stop
+        name_index = {name: i for i, name in enumerate(all_names)}
+        codes = np.fromiter((name_index.get(name, -1) for name in names),
+                            dtype=np.int64, count=n)
+        index = self._index()
+        if index is None:
+            exact = np.zeros(n, dtype=np.bool)
+        else:
+            segments, tokens = index
+            params = [(segments.minimum_overlap,
+                       segments.minimum_overlap_fraction),
+                      (tokens.minimum_overlap,
+                       tokens.minimum_overlap_fraction)]
+            exact = np.fromiter(
+                (params[0] == params[1] ==
+                 (i.minimum_overlap, i.minimum_overlap_fraction)
+                 for i in intervals),
+                dtype=np.bool, count=n) & (codes >= 0) & \
+                (self._token_params is not None)
+            q = np.nonzero(exact)[0]
+            qstarts = np.fromiter((intervals[i].start for i in q.tolist()),
+                                  dtype=np.double, count=q.shape[0])
+            qends = np.fromiter((intervals[i].end for i in q.tolist()),
+                                dtype=np.double, count=q.shape[0])
+            # the last segment that compares lower or equal, as `tokens`
+            _, right, valid = segments.bisect(codes[q], qstarts, qends)
+            seg = right - 1
+            found = (seg >= np.searchsorted(segments.groups, codes[q])) & \
+                (seg >= 0)
+            seg = np.maximum(seg, 0)
+            sstarts, sends = segments.starts[seg], segments.ends[seg]
+            overlap = np.where((sends < qstarts) | (sstarts > qends), 0.,
+                               np.minimum(sends, qends) -
+                               np.maximum(sstarts, qstarts))
+            found &= valid & (overlap > 0.)
+            left, right, tvalid = tokens.bisect(seg[found], qstarts[found],
+                                                qends[found])
+            valid[found] = tvalid
+            exact[q[~valid]] = False
+            ok = np.nonzero(found)[0][tvalid]
+            empty = left[tvalid] == right[tvalid]
+            start[q[ok]] = np.where(empty, 0, left[tvalid])
+            stop[q[ok]] = np.where(empty, 0, right[tvalid])
+        for i in np.nonzero(~exact & (codes >= 0))[0].tolist():
+            try:
+                start[i], stop[i] = self.token_range(names[i], intervals[i])
+            except (KeyError, ValueError):
+                pass
+        return start, stop
 
     def iter_fragments(self):
         return flatten(self.iter_segments())
@@ -104,7 +550,61 @@ class Corpus(collections.Mapping):
                 r = s.restrict(interval_db)
                 if len(r.tokens) > 0:
                     sa.append(r)
-        return Corpus(sa)
+        return Corpus(sa, symbols=self.symbols,
+                      cache_size=self._cache.maxsize,
+                      cache_bytes=self._cache.maxbytes)
+
+    def take(self, positions):
+        """
+        Return a new Corpus, containing only some of the tokens.
+
+        Segments left without tokens are dropped.
+
+        Parameters
+        ----------
+        positions : ndarray of ints
+            Positions in `token_arrays` of the tokens to keep.
+
+        Returns
+        -------
+        Corpus
+            New Corpus object.
+        """
+        names, name_codes, starts, ends, phone_ids = self.token_arrays()
+        positions = np.unique(positions)
+        segment_ix = np.searchsorted(self._segment_offsets, positions,
+                                     side='right') - 1
+        if isinstance(self.segment_annotations, _ArraySegments):
+            # stay on the arrays, without building any SegmentAnnotation
+            used, codes = np.unique(name_codes[positions],
+                                    return_inverse=True)
+            offsets = np.r_[0, np.flatnonzero(np.diff(segment_ix)) + 1,
+                            positions.shape[0]]
+            corpus = Corpus.from_arrays(
+                [names[c] for c in used.tolist()],
+                codes.astype(name_codes.dtype), starts[positions],
+                ends[positions], phone_ids[positions], offsets,
+                self.symbols)
+            corpus.set_cache_size(self._cache.maxsize, self._cache.maxbytes)
+            return corpus
+        segments = [fa for name in names
+                    for fa in self.segment_annotations[name]]
+        bounds = np.flatnonzero(np.diff(segment_ix)) + 1
+        sa = []
+        for lo, hi in izip(np.r_[0, bounds].tolist(),
+                           np.r_[bounds, positions.shape[0]].tolist()):
+            if lo == hi:
+                continue
+            seg = segment_ix[lo]
+            fa = segments[seg]
+            first = self._segment_offsets[seg]
+            sa.append(SegmentAnnotation(
+                fa.name, [fa.tokens[i - first]
+                          for i in positions[lo:hi].tolist()],
+                presorted=True))
+        return Corpus(sa, symbols=self.symbols,
+                      cache_size=self._cache.maxsize,
+                      cache_bytes=self._cache.maxbytes)
 
     def annotation(self, name, interval):
         """
@@ -151,18 +651,37 @@ class Corpus(collections.Mapping):
             FragmentTokens covered by the interval.
         """
         key = (name, interval)
-        if not key in self._cache:
+        tokens = self._cache.get(key)
+        if tokens is None:
             try:
                 fa_for_filename = self[name]
             except KeyError:
                 raise KeyError('no such name: {0}'.format(name))
-            dummy_token = FragmentToken(name, interval, None)
-            try:
-                fa = fa_for_filename.find_le(dummy_token)
-            except ValueError:
-                raise ValueError('interval not found: {0}'.format(str(interval)))
+            bounds = self._segments(name)
+            found = None
+            if bounds is not None:
+                starts, ends, segment = bounds
+                if (segment.minimum_overlap,
+                    segment.minimum_overlap_fraction) == \
+                   (interval.minimum_overlap,
+                    interval.minimum_overlap_fraction):
+                    found = interval_bisect(starts, ends, interval)
+            if found is not None:
+                # the last segment that compares lower or equal
+                if found[1] == 0:
+                    raise ValueError('interval not found: {0}'
+                                     .format(str(interval)))
+                fa = fa_for_filename[found[1] - 1]
+            else:
+                dummy_token = FragmentToken(name, interval, None)
+                try:
+                    fa = fa_for_filename.find_le(dummy_token)
+                except ValueError:
+                    raise ValueError('interval not found: {0}'
+                                     .format(str(interval)))
             if (fa.interval.overlap(interval)) > 0:
-                self._cache[key] = fa.tokens_at_interval(interval)
+                tokens = fa.tokens_at_interval(interval)
+                self._cache[key] = tokens
             else:
                 raise ValueError('interval not found: {0}'.format(str(interval)))
-        return self._cache[key]
+        return tokens
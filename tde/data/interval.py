@@ -7,15 +7,19 @@ Interval
     Defines temporal interval.
 IntervalDB
     Collection of intervals.
+IntervalIndex
+    Grouped sequences of intervals, bisected in batches.
 
 Functions
 ---------
 interval_cmp
     Comparison function for Interval objects.
+interval_bisect
+    Bisect a sequence of intervals ordered by `interval_cmp`.
 
 """
 
-import bisect
+from itertools import izip
 from pprint import pformat
 
 import numpy as np
@@ -296,16 +300,103 @@ def interval_cmp(i1, i2):
             return 1
 
 
+def _cmp_bounds(start, end, qstart, qend, minimum_overlap,
+                minimum_overlap_fraction):
+    """`interval_cmp` of [start, end] and [qstart, qend] on floats."""
+    if end < qstart or start > qend:
+        over = 0.
+    else:
+        over = min(end, qend) - max(start, qstart)
+    # np.isclose(over, 0.0)
+    if not abs(over) <= 1e-08 and \
+       (over > minimum_overlap or
+        over > minimum_overlap_fraction * (qend - qstart) or
+        over > minimum_overlap_fraction * (end - start)):
+        return 0
+    if over > 0.:
+        return -1 if start < qstart else 1
+    return -1 if end <= qstart else 1
+
+
+def _cmp_bounds_many(starts, ends, qstarts, qends, minimum_overlap,
+                     minimum_overlap_fraction):
+    """`_cmp_bounds` on arrays."""
+    over = np.where((ends < qstarts) | (starts > qends), 0.,
+                    np.minimum(ends, qends) - np.maximum(starts, qstarts))
+    overlaps = ~np.isclose(over, 0.0) & \
+        ((over > minimum_overlap) |
+         (over > minimum_overlap_fraction * (qends - qstarts)) |
+         (over > minimum_overlap_fraction * (ends - starts)))
+    return np.where(overlaps, 0,
+                    np.where(over > 0.,
+                             np.where(starts < qstarts, -1, 1),
+                             np.where(ends <= qstarts, -1, 1)))
+
+
+def interval_bisect(starts, ends, interval):
+    """
+    Bisect a sequence of intervals ordered by `interval_cmp`.
+
+    Finds what `bisect_left` and `bisect_right` return for `interval` on the
+    intervals [starts[i], ends[i]] compared with `interval_cmp`, with
+    `np.searchsorted`: the intervals that end before `interval` starts
+    compare lower and those that start after it ends compare greater, so
+    that `interval_cmp` only has to be evaluated on the intervals in
+    between. `interval_cmp` is not antisymmetric, so it is evaluated both
+    ways, as `bisect_left` tests `a[i] < x` and `bisect_right` `x < a[i]`.
+
+    Parameters
+    ----------
+    starts, ends : ndarray of floats
+        Both sorted. The intervals must have the same overlap parameters as
+        `interval`.
+    interval : Interval
+
+    Returns
+    -------
+    (left, right) or None
+        The insertion points, or None if `interval_cmp` does not order the
+        intervals around `interval`, in which case the result of a bisection
+        depends on its path.
+
+    """
+    qstart, qend = interval.start, interval.end
+    lo = int(np.searchsorted(ends, qstart, side='right'))
+    hi = int(np.searchsorted(starts, qend, side='left'))
+    if hi < lo:
+        return None
+    mo = interval.minimum_overlap
+    mf = interval.minimum_overlap_fraction
+    left = right = lo
+    lower, upper = True, False
+    for start, end in izip(starts[lo:hi].tolist(), ends[lo:hi].tolist()):
+        is_lower = _cmp_bounds(start, end, qstart, qend, mo, mf) < 0
+        is_upper = _cmp_bounds(qstart, qend, start, end, mo, mf) < 0
+        if (is_lower and not lower) or (upper and not is_upper):
+            return None
+        lower, upper = is_lower, is_upper
+        left += is_lower
+        right += not is_upper
+    return left, right
+
+
 class IntervalDB(object):
     """Holds collection of fragments and makes them easily searchable.
 
+    The intervals are stored per filename as sorted NumPy arrays of starts and
+    ends, together with the running maximum of the ends. This allows queries
+    to be answered with `np.searchsorted`, either one at a time or in batches
+    through the `*_many` methods.
+
     Parameters
     ----------
     mapping : dict from string to sorted list of Intervals
 
     Attributes
     ----------
-    starts, ends : list of floats
+    starts, ends : dict from string to ndarray of floats
+    maxends : dict from string to ndarray of floats
+        Running maximum of `ends`.
 
     Methods
     -------
@@ -313,21 +404,36 @@ class IntervalDB(object):
         Find all the intervals that overlap with the query interval.
     is_covered(filename, interval)
         Determine if an interval is covered.
+    is_covered_many(filenames, starts, ends)
+        Determine for a batch of intervals whether they are covered.
     largest_overlap(filename, interval)
         Find the interval with the largest overlap.
+    largest_overlap_many(filenames, starts, ends)
+        Find the intervals with the largest overlap for a batch of intervals.
 
     """
     def __init__(self, mapping):
         starts = {}
         ends = {}
+        maxends = {}
         for fname in mapping:
-            starts[fname], ends[fname] = zip(*mapping[fname])
+            intervals = np.array([tuple(i) for i in mapping[fname]],
+                                 dtype=np.double).reshape(-1, 2)
+            order = np.argsort(intervals[:, 0], kind='mergesort')
+            starts[fname] = intervals[order, 0]
+            ends[fname] = intervals[order, 1]
+            maxends[fname] = np.maximum.accumulate(ends[fname])
         self.starts = starts
         self.ends = ends
+        self.maxends = maxends
 
     def __eq__(self, other):
         if isinstance(other, IntervalDB):
-            return self.starts == other.starts and self.ends == other.ends
+            if sorted(self.starts.keys()) != sorted(other.starts.keys()):
+                return False
+            return all(np.array_equal(self.starts[k], other.starts[k]) and
+                       np.array_equal(self.ends[k], other.ends[k])
+                       for k in self.starts)
         else:
             return False
 
@@ -335,15 +441,75 @@ class IntervalDB(object):
         return not self.__eq__(other)
 
     def __repr__(self):
-        return '<IntervalDB {0} entries>'.format(
-            sum(map(len, self.starts.itervalues())))
+        return '<IntervalDB {0} entries>'.format(len(self))
 
     def __str__(self):
         return 'IntervalDB\n- starts: {0}\n- ends: {1}'.format(
-            pformat(self.starts), pformat(self.ends))
+            pformat({k: tuple(v.tolist()) for k, v in self.starts.iteritems()}),
+            pformat({k: tuple(v.tolist()) for k, v in self.ends.iteritems()}))
 
     def __len__(self):
-        return sum(map(len, self.starts.itervalues()))
+        return sum(v.shape[0] for v in self.starts.itervalues())
+
+    def _span(self, fname, qstarts, qends):
+        """Index range of the intervals in `fname` that may overlap with the
+        query intervals. Raises KeyError if fname is not a known key."""
+        lo = np.searchsorted(self.maxends[fname], qstarts, side='right')
+        hi = np.searchsorted(self.starts[fname], qends, side='left')
+        return lo, hi
+
+    def _covered(self, fname, qstarts, qends):
+        starts = self.starts[fname]
+        if starts.shape[0] == 0:
+            return np.zeros(np.shape(qstarts), dtype=np.bool)
+        ix = np.searchsorted(starts, qstarts, side='right') - 1
+        maxends = self.maxends[fname][np.maximum(ix, 0)]
+        return (ix >= 0) & (qends > qstarts) & (maxends >= qends)
+
+    def _largest_overlap(self, fname, qstarts, qends):
+        starts = self.starts[fname]
+        ends = self.ends[fname]
+        maxends = self.maxends[fname]
+        lo, hi = self._span(fname, qstarts, qends)
+        best = np.empty(qstarts.shape, dtype=np.intp)
+        best.fill(-1)
+        best_overlap = np.zeros(qstarts.shape, dtype=np.double)
+        if starts.shape[0] == 0 or qstarts.shape[0] == 0:
+            return best
+        # the intervals in [lo, mid) start at or before the query, so their
+        # overlap only depends on their end, clipped to the query end. The
+        # best one is the first to reach that clipped end, a search on the
+        # running maximum of the ends
+        mid = np.maximum(np.searchsorted(starts, qstarts, side='right'), lo)
+        before = mid > lo
+        reach = np.minimum(maxends[np.maximum(mid - 1, 0)], qends)
+        first = np.searchsorted(maxends, reach, side='left')
+        overlap = reach - qstarts
+        better = before & (overlap > 0)
+        best[better] = first[better]
+        best_overlap[better] = overlap[better]
+        # an interval starting within the query can only do better if it
+        # starts before the query end minus the best overlap so far
+        hi = np.minimum(hi, np.searchsorted(starts, qends - best_overlap,
+                                            side='right'))
+        width = hi - mid
+        if width.max() <= 0:
+            return best
+        # walk the remaining candidate ranges in lockstep, widest first so
+        # that each step only touches the queries that still have one; a
+        # strict comparison keeps the earliest interval on ties, like `max`
+        # on `find` does
+        order = np.argsort(-width, kind='mergesort')
+        neg_width = -width[order]
+        for offset in xrange(width.max()):
+            active = order[:np.searchsorted(neg_width, -offset, side='left')]
+            ix = mid[active] + offset
+            overlap = (np.minimum(ends[ix], qends[active]) -
+                       np.maximum(starts[ix], qstarts[active]))
+            better = overlap > best_overlap[active]
+            best[active[better]] = ix[better]
+            best_overlap[active[better]] = overlap[better]
+        return best
 
     def find(self, fname, interval):
         """
@@ -367,12 +533,14 @@ class IntervalDB(object):
         starts = self.starts[fname]
         ends = self.ends[fname]
         qstart, qend = interval.start, interval.end
-        left = max(bisect.bisect_left(starts, qstart) - 1, 0)
-        right = bisect.bisect_right(starts, qend)
+        lo, hi = self._span(fname, qstart, qend)
+        starts = starts[lo:hi]
+        ends = ends[lo:hi]
+        overlap = np.minimum(ends, qend) - np.maximum(starts, qstart)
         return (Interval(start, end)
-                for start, end in zip(starts[left:right],
-                                      ends[left:right])
-                if Interval(start, end).overlap(interval) > 0)
+                for start, end, o in zip(starts.tolist(), ends.tolist(),
+                                         overlap.tolist())
+                if o > 0)
 
     def is_covered(self, fname, interval):
         """
@@ -388,12 +556,31 @@ class IntervalDB(object):
         bool
 
         """
-        try:
-            b = any(interval.start >= start and interval.end <= end
-                    for start, end in self.find(fname, interval))
-        except KeyError:
-            b = False
-        return b
+        if not fname in self.starts:
+            return False
+        return bool(self._covered(fname, interval.start, interval.end))
+
+    def is_covered_many(self, fnames, starts, ends):
+        """
+        Determine for a batch of intervals whether they are covered.
+
+        Parameters
+        ----------
+        fnames : sequence of strings
+        starts, ends : sequences of floats
+
+        Returns
+        -------
+        ndarray of bools
+
+        """
+        starts = np.asarray(starts, dtype=np.double)
+        ends = np.asarray(ends, dtype=np.double)
+        r = np.zeros(starts.shape, dtype=np.bool)
+        for fname, ix in _group_by_name(fnames):
+            if fname in self.starts:
+                r[ix] = self._covered(fname, starts[ix], ends[ix])
+        return r
 
     def largest_overlap(self, fname, interval):
         """Return the interval that has the largest overlap with the query
@@ -416,8 +603,155 @@ class IntervalDB(object):
         ValueError
             if no interval is found
         """
-        return max(self.find(fname, interval),
-                   key=lambda x: interval.overlap(x))
+        ix = self._largest_overlap(fname,
+                                   np.array([interval.start], dtype=np.double),
+                                   np.array([interval.end], dtype=np.double))[0]
+        if ix < 0:
+            raise ValueError('no overlapping interval found: {0}'
+                             .format(str(interval)))
+        return Interval(float(self.starts[fname][ix]),
+                        float(self.ends[fname][ix]))
+
+    def largest_overlap_many(self, fnames, starts, ends):
+        """Find the intervals with the largest overlap for a batch of query
+        intervals.
+
+        Parameters
+        ----------
+        fnames : sequence of strings
+        starts, ends : sequences of floats
+
+        Returns
+        -------
+        ostarts, oends : ndarray of floats
+            start and end points of the intervals with the largest overlap.
+            NaN where fname is not a known key or no interval is found.
+        """
+        starts = np.asarray(starts, dtype=np.double)
+        ends = np.asarray(ends, dtype=np.double)
+        ostarts = np.empty(starts.shape, dtype=np.double)
+        ostarts.fill(np.nan)
+        oends = ostarts.copy()
+        for fname, ix in _group_by_name(fnames):
+            if not fname in self.starts:
+                continue
+            best = self._largest_overlap(fname, starts[ix], ends[ix])
+            found = best >= 0
+            ostarts[ix[found]] = self.starts[fname][best[found]]
+            oends[ix[found]] = self.ends[fname][best[found]]
+        return ostarts, oends
+
+
+class IntervalIndex(object):
+    """
+    Grouped sequences of intervals, bisected in batches.
+
+    Holds the intervals of several sequences, for instance the segments of
+    every file of a corpus, and answers `interval_bisect` for many query
+    intervals at once, each in the sequence of its own group. Times are
+    replaced by their rank among the distinct interval bounds, so that a
+    group and a time pack into one integer key and all the queries are
+    answered by a single `np.searchsorted`.
+
+    Parameters
+    ----------
+    groups : ndarray of ints
+        Group of each interval, in non-decreasing order.
+    starts, ends : ndarray of floats
+        Within a group, both must be sorted.
+    minimum_overlap, minimum_overlap_fraction : float
+        Overlap parameters of the intervals.
+
+    Raises
+    ------
+    ValueError
+        If the intervals are not grouped or not sorted within their group.
+
+    """
+    def __init__(self, groups, starts, ends, minimum_overlap=0.03,
+                 minimum_overlap_fraction=0.5):
+        self.groups = np.asarray(groups, dtype=np.int64)
+        self.starts = np.asarray(starts, dtype=np.double)
+        self.ends = np.asarray(ends, dtype=np.double)
+        self.minimum_overlap = minimum_overlap
+        self.minimum_overlap_fraction = minimum_overlap_fraction
+        self.times = np.unique(np.concatenate((self.starts, self.ends)))
+        self._base = self.times.shape[0] + 1
+        self._start_keys = self._pack(self.groups,
+                                      np.searchsorted(self.times, self.starts))
+        self._end_keys = self._pack(self.groups,
+                                    np.searchsorted(self.times, self.ends))
+        if np.any(np.diff(self._start_keys) < 0) or \
+           np.any(np.diff(self._end_keys) < 0):
+            raise ValueError('intervals are not sorted by group and time')
+
+    def _pack(self, groups, ranks):
+        return groups * self._base + ranks
+
+    def bisect(self, groups, starts, ends):
+        """
+        Bisect the sequences of intervals for many intervals.
+
+        Parameters
+        ----------
+        groups : ndarray of ints
+            Group to search for each query.
+        starts, ends : ndarray of floats
+            Query intervals, with the same overlap parameters as the index.
+
+        Returns
+        -------
+        left, right : ndarray of ints
+            As `interval_bisect`, as positions in the whole index.
+        valid : ndarray of bools
+            False where `interval_bisect` would return None.
+
+        """
+        groups = np.asarray(groups, dtype=np.int64)
+        starts = np.asarray(starts, dtype=np.double)
+        ends = np.asarray(ends, dtype=np.double)
+        # intervals with end <= start of the query, and start < end of it
+        lo = np.searchsorted(
+            self._end_keys,
+            self._pack(groups,
+                       np.searchsorted(self.times, starts, side='right') - 1),
+            side='right')
+        hi = np.searchsorted(
+            self._start_keys,
+            self._pack(groups, np.searchsorted(self.times, ends, side='left')),
+            side='left')
+        valid = hi >= lo
+        width = np.where(valid, hi - lo, 0)
+        query = np.repeat(np.arange(groups.shape[0]), width)
+        position = np.arange(query.shape[0]) - \
+            np.repeat(np.cumsum(width) - width, width) + lo[query]
+        istarts, iends = self.starts[position], self.ends[position]
+        qstarts, qends = starts[query], ends[query]
+        params = self.minimum_overlap, self.minimum_overlap_fraction
+        lower = _cmp_bounds_many(istarts, iends, qstarts, qends, *params) < 0
+        upper = _cmp_bounds_many(qstarts, qends, istarts, iends, *params) < 0
+        same = np.diff(query) == 0
+        unordered = same & ((lower[1:] & ~lower[:-1]) |
+                            (upper[:-1] & ~upper[1:]))
+        valid[query[1:][unordered]] = False
+        left = lo + np.bincount(query, weights=lower,
+                                minlength=groups.shape[0]).astype(np.int64)
+        right = lo + np.bincount(query, weights=~upper,
+                                 minlength=groups.shape[0]).astype(np.int64)
+        return left, right, valid
+
+
+def _group_by_name(names):
+    """Yield (name, indices) pairs for the distinct names in a sequence."""
+    names = list(names)
+    if len(names) == 0:
+        return
+    uniq, inverse = np.unique(np.array(names, dtype=object),
+                              return_inverse=True)
+    order = np.argsort(inverse, kind='mergesort')
+    bounds = np.searchsorted(inverse[order], np.arange(len(uniq) + 1))
+    for i, name in enumerate(uniq):
+        yield name, order[bounds[i]:bounds[i+1]]
 
 
 if __name__ == '__main__':
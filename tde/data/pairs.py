@@ -0,0 +1,881 @@
+"""
+Fragment pairs as integer index arrays.
+
+Classes
+-------
+FragmentTable
+    Table of the distinct fragments in a ClassDict.
+PairSet
+    Collection of fragment pairs, stored as index arrays into a FragmentTable.
+PairIndex
+    Persistent index of a PairSet for batched membership tests.
+
+Functions
+---------
+within_pairs
+    Pairs of fragments from the same class.
+gold_pairs
+    Pairs of non-overlapping fragments with the same annotation.
+substring_pairs
+    Pairs of aligned substrings of the fragment pairs in a ClassDict.
+
+"""
+
+from __future__ import division
+
+from collections import Counter
+from itertools import izip
+
+import numpy as np
+from joblib import Parallel, delayed, effective_n_jobs
+
+from tde.data.classes import CompactClassDict
+from tde.data.interval import Interval
+from tde.data.fragment import FragmentToken
+from tde.util.shared import SharedData
+
+
+class FragmentTable(object):
+    """
+    Table of the distinct fragments in a ClassDict.
+
+    Fragments are considered the same if their names, intervals and marks are
+    equal, which is the equality of FragmentToken. Each distinct fragment gets
+    an integer id.
+
+    Use `from_clsdict` to construct.
+
+    Attributes
+    ----------
+    names : list of strings
+    name_codes : ndarray of ints
+        Index into `names` for each distinct fragment.
+    name_ranks : ndarray of ints
+        Rank of each name in `names` in lexicographic order.
+    starts, ends : ndarray of floats
+    marks : list of marks
+    mark_codes : ndarray of ints
+        Index into `marks` for each distinct fragment.
+    symbols : SymbolTable or None
+        If the ClassDict has a SymbolTable, `marks` is `symbols.marks` and the
+        mark codes are its mark ids, so that they can be compared across
+        tables.
+    offsets : ndarray of ints
+        Class boundaries in `ids`.
+    ids : ndarray of ints
+        Fragment id of every fragment in the ClassDict, grouped by class.
+
+    """
+    def __init__(self, names, name_codes, starts, ends, marks, mark_codes,
+                 offsets, ids, symbols=None):
+        self.symbols = symbols
+        self.names = names
+        self.name_codes = name_codes
+        self.starts = starts
+        self.ends = ends
+        self.marks = marks
+        self.mark_codes = mark_codes
+        self.offsets = offsets
+        self.ids = ids
+        name_ranks = np.empty(len(names), dtype=np.int64)
+        name_ranks[np.argsort(np.array(names, dtype=object),
+                              kind='mergesort')] = np.arange(len(names))
+        self.name_ranks = name_ranks
+        self._tokens = None
+
+    @classmethod
+    def from_clsdict(cls, clsdict):
+        """
+        Build the table of distinct fragments in a ClassDict.
+
+        Parameters
+        ----------
+        clsdict : ClassDict
+
+        Returns
+        -------
+        FragmentTable
+
+        """
+        cc = CompactClassDict.from_clsdict(clsdict)
+        if cc.symbols is None:
+            marks = cc.marks + [None]
+            none_code = len(cc.marks)
+        else:
+            marks = cc.symbols.marks
+            none_code = cc.symbols.mark_id(None) \
+                if np.any(cc.mark_codes < 0) else 0
+        mark_codes = np.where(cc.mark_codes < 0, none_code, cc.mark_codes)
+        n = cc.starts.shape[0]
+        order = np.lexsort((mark_codes, cc.ends, cc.starts, cc.name_codes))
+        new = np.ones(n, dtype=np.bool)
+        if n > 1:
+            new[1:] = ((np.diff(cc.name_codes[order]) != 0) |
+                       (np.diff(cc.starts[order]) != 0) |
+                       (np.diff(cc.ends[order]) != 0) |
+                       (np.diff(mark_codes[order]) != 0))
+        ids = np.empty(n, dtype=np.int64)
+        ids[order] = np.cumsum(new) - 1
+        first = order[new]
+        return cls(cc.names, cc.name_codes[first],
+                   cc.starts[first], cc.ends[first],
+                   marks, mark_codes[first],
+                   cc.offsets, ids, symbols=cc.symbols)
+
+    def __len__(self):
+        return self.starts.shape[0]
+
+    def tokens(self):
+        """
+        Materialize the distinct fragments.
+
+        Returns
+        -------
+        list of FragmentToken
+            FragmentToken for each fragment id.
+
+        """
+        if self._tokens is None:
+            names = self.names
+            marks = self.marks
+            self._tokens = [FragmentToken(names[n], Interval(s, e), marks[m])
+                            for n, s, e, m in izip(self.name_codes.tolist(),
+                                                   self.starts.tolist(),
+                                                   self.ends.tolist(),
+                                                   self.mark_codes.tolist())]
+        return self._tokens
+
+    def label_counts(self, counts):
+        """
+        Convert an array of counts indexed by mark code to a dict.
+
+        Parameters
+        ----------
+        counts : ndarray
+
+        Returns
+        -------
+        dict from mark to count
+            Marks with a non-zero count.
+
+        """
+        marks = self.marks
+        return {marks[c]: counts[c].item() for c in np.nonzero(counts)[0]}
+
+    def translate(self, other):
+        """
+        Map the fragment ids of another table onto the ids of this table.
+
+        Parameters
+        ----------
+        other : FragmentTable
+
+        Returns
+        -------
+        ndarray of ints
+            Id in this table for each fragment in `other`, -1 if absent.
+
+        """
+        if other is self:
+            return np.arange(len(self), dtype=np.int64)
+        name_map = _index_map(self.names, other.names)
+        if other.marks is self.marks:
+            mark_map = np.arange(len(other.marks) + 1, dtype=np.int64)
+        else:
+            mark_map = _index_map(self.marks, other.marks)
+        n = len(self)
+        names = np.concatenate((self.name_codes,
+                                name_map[other.name_codes]))
+        starts = np.concatenate((self.starts, other.starts))
+        ends = np.concatenate((self.ends, other.ends))
+        marks = np.concatenate((self.mark_codes,
+                                mark_map[other.mark_codes]))
+        # sort both tables together; a fragment of `other` is found if the
+        # first row of its group of equal fragments comes from `self`
+        order = np.lexsort((np.arange(names.shape[0]),
+                            marks, ends, starts, names))
+        new = np.ones(order.shape[0], dtype=np.bool)
+        if order.shape[0] > 1:
+            new[1:] = ((np.diff(names[order]) != 0) |
+                       (np.diff(starts[order]) != 0) |
+                       (np.diff(ends[order]) != 0) |
+                       (np.diff(marks[order]) != 0))
+        first = order[new]
+        owner = np.where(first < n, first, -1)
+        ids = np.empty(order.shape[0], dtype=np.int64)
+        ids[order] = owner[np.cumsum(new) - 1]
+        ids = ids[n:]
+        ids[(names[n:] < 0) | (marks[n:] < 0)] = -1
+        return ids
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_tokens'] = None
+        return state
+
+
+class PairSet(object):
+    """
+    Collection of fragment pairs.
+
+    Pairs are stored as two arrays of fragment ids into a FragmentTable.
+    Iterating over a PairSet yields (FragmentToken, FragmentToken) pairs, so
+    that it can be used wherever an iterator over pairs is expected, but the
+    set primitives `typeset`, `freqs`, `weights` and `nmatch` are computed
+    directly on the arrays.
+
+    Parameters
+    ----------
+    table : FragmentTable
+    left, right : ndarray of ints
+        Fragment ids of the first and second element of each pair.
+    index : PairIndex, optional
+        Index on `table`, used to look up the fragments of other PairSets in
+        `intersection`.
+
+    """
+    def __init__(self, table, left, right, index=None):
+        self.table = table
+        self.left = np.asarray(left, dtype=np.int64)
+        self.right = np.asarray(right, dtype=np.int64)
+        self.index = index
+        self._sorted_keys = None
+        self._nmatch_counts = None
+        self._weight_array = None
+
+    def __len__(self):
+        return self.left.shape[0]
+
+    def __iter__(self):
+        tokens = self.table.tokens()
+        for i, j in izip(self.left.tolist(), self.right.tolist()):
+            yield tokens[i], tokens[j]
+
+    def __repr__(self):
+        return '<PairSet {0} pairs>'.format(len(self))
+
+    def flat(self):
+        """Fragment ids of the pairs, in iteration order."""
+        return np.column_stack((self.left, self.right)).ravel()
+
+    def typeset(self):
+        """
+        The unique marks in the pairs, in order of first occurrence.
+
+        Returns
+        -------
+        list of marks
+
+        """
+        codes = self.table.mark_codes[self.flat()]
+        _, first = np.unique(codes, return_index=True)
+        marks = self.table.marks
+        return [marks[c] for c in codes[np.sort(first)].tolist()]
+
+    def freq_counts(self):
+        """
+        Absolute frequencies of the marks over the distinct fragments.
+
+        Returns
+        -------
+        ndarray of ints
+            Counts indexed by mark code.
+
+        """
+        return np.bincount(self.table.mark_codes[np.unique(self.flat())],
+                           minlength=len(self.table.marks))
+
+    def freqs(self):
+        """
+        Absolute frequencies of the marks over the distinct fragments.
+
+        Returns
+        -------
+        dict from mark to int
+
+        """
+        return self.table.label_counts(self.freq_counts())
+
+    def weight_array(self):
+        """
+        Relative frequencies of the marks over the distinct fragments.
+
+        Returns
+        -------
+        ndarray of floats
+            Weights indexed by mark code.
+
+        """
+        if self._weight_array is None:
+            counts = self.freq_counts()
+            total = counts.sum()
+            if total == 0:
+                self._weight_array = counts.astype(np.double)
+            else:
+                self._weight_array = counts / total
+        return self._weight_array
+
+    def weights(self):
+        """
+        Relative frequencies of the marks over the distinct fragments.
+
+        Returns
+        -------
+        dict from mark to float
+
+        """
+        fs = self.freqs()
+        total = sum(fs.itervalues())
+        return {t: fs[t] / total for t in fs}
+
+    def nmatch_counts(self):
+        """
+        Count the pairs per mark of the second fragment.
+
+        Returns
+        -------
+        ndarray of ints
+            Counts indexed by mark code.
+
+        """
+        if self._nmatch_counts is None:
+            self._nmatch_counts = np.bincount(
+                self.table.mark_codes[self.right],
+                minlength=len(self.table.marks))
+        return self._nmatch_counts
+
+    def nmatch(self):
+        """
+        Count the pairs per mark of the second fragment.
+
+        Returns
+        -------
+        Counter from mark to int
+
+        """
+        return Counter(self.table.label_counts(self.nmatch_counts()))
+
+    def intersection(self, other):
+        """
+        Select the pairs that also occur in another PairSet.
+
+        Parameters
+        ----------
+        other : PairSet
+
+        Returns
+        -------
+        PairSet
+            The pairs of `self` that are in `other`, in the order of `self`.
+
+        """
+        if self.index is None and other.index is not None:
+            # look up our fragments in the index of other instead
+            ids = other.index.lookup(self.table)
+            left, right = ids[self.left], ids[self.right]
+            keys = left * len(other.table) + right
+            mask = ((left >= 0) & (right >= 0) &
+                    _isin_sorted(keys, other.sorted_keys()))
+            return PairSet(self.table, self.left[mask], self.right[mask])
+        if self.index is not None:
+            ids = self.index.lookup(other.table)
+        else:
+            ids = self.table.translate(other.table)
+        oleft, oright = ids[other.left], ids[other.right]
+        valid = (oleft >= 0) & (oright >= 0)
+        n = len(self.table)
+        okeys = np.sort(oleft[valid] * n + oright[valid])
+        keys = self.left * n + self.right
+        mask = _isin_sorted(keys, okeys)
+        return PairSet(self.table, self.left[mask], self.right[mask],
+                       self.index)
+
+    def sorted_keys(self):
+        """The pairs encoded as left * len(table) + right, sorted."""
+        if self._sorted_keys is None:
+            self._sorted_keys = np.sort(self.left * len(self.table) +
+                                        self.right)
+        return self._sorted_keys
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_sorted_keys'] = None
+        state['_nmatch_counts'] = None
+        state['_weight_array'] = None
+        return state
+
+
+class PairIndex(object):
+    """
+    Persistent index of a PairSet for batched membership tests.
+
+    The index is built once, for instance on the gold pairs of a whole
+    corpus, and `restrict` hands out the pairs of every fold as PairSets that
+    share it. Their intersection with another PairSet then only has to look
+    up the fragments of the other set in the index.
+
+    Fragments are looked up on packed integer keys of their name and the
+    ranks of their start and end among the distinct times in the table;
+    marks are compared after the lookup. Lookups are batched with
+    searchsorted.
+
+    Parameters
+    ----------
+    pairs : PairSet
+
+    Raises
+    ------
+    ValueError
+        If there are too many names and times to pack in a 64 bit key.
+
+    """
+    def __init__(self, pairs):
+        table = pairs.table
+        self.table = table
+        self.times = np.unique(np.concatenate((table.starts, table.ends)))
+        self._time_bits = int(self.times.shape[0]).bit_length()
+        if int(len(table.names)).bit_length() + 2 * self._time_bits > 63:
+            raise ValueError('too many distinct names and times to index')
+        keys = self._pack(table.name_codes.astype(np.int64),
+                          _rank(self.times, table.starts),
+                          _rank(self.times, table.ends))
+        order = np.lexsort((table.mark_codes, keys))
+        self._fragment_keys = keys[order]
+        self._fragment_ids = order
+        self._fragment_names = \
+            np.array(table.names, dtype=object)[table.name_codes] \
+            if len(table.names) > 0 else np.zeros(0, dtype=object)
+        keys = pairs.left * len(table) + pairs.right
+        order = np.argsort(keys, kind='mergesort')
+        self.left = pairs.left[order]
+        self.right = pairs.right[order]
+        self.keys = keys[order]
+
+    def __len__(self):
+        return self.keys.shape[0]
+
+    def __repr__(self):
+        return '<PairIndex {0} pairs>'.format(len(self))
+
+    def _pack(self, names, starts, ends):
+        tb = self._time_bits
+        return (names << (2 * tb)) | (starts << tb) | ends
+
+    def lookup(self, table):
+        """
+        Find the fragments of another table in the indexed table.
+
+        Parameters
+        ----------
+        table : FragmentTable
+
+        Returns
+        -------
+        ndarray of ints
+            Id in the indexed table for each fragment in `table`, -1 if
+            absent.
+
+        """
+        if table is self.table:
+            return np.arange(len(table), dtype=np.int64)
+        names = _index_map(self.table.names, table.names)[table.name_codes]
+        if table.marks is self.table.marks:
+            marks = table.mark_codes
+        else:
+            marks = _index_map(self.table.marks,
+                               table.marks)[table.mark_codes]
+        starts = _rank(self.times, table.starts)
+        ends = _rank(self.times, table.ends)
+        valid = (names >= 0) & (starts >= 0) & (ends >= 0) & (marks >= 0)
+        keys = np.where(valid, self._pack(names, starts, ends), -1)
+        lo = np.searchsorted(self._fragment_keys, keys, side='left')
+        hi = np.searchsorted(self._fragment_keys, keys, side='right')
+        ids = np.full(len(table), -1, dtype=np.int64)
+        single = valid & (hi - lo == 1)
+        found = self._fragment_ids[lo[single]]
+        ids[single] = np.where(self.table.mark_codes[found] == marks[single],
+                               found, -1)
+        # the same interval with different marks; only in hand-made tables
+        for i in np.nonzero(valid & (hi - lo > 1))[0]:
+            candidates = self._fragment_ids[lo[i]:hi[i]]
+            match = candidates[self.table.mark_codes[candidates] == marks[i]]
+            if match.shape[0] > 0:
+                ids[i] = match[0]
+        return ids
+
+    def contains(self, pairs):
+        """
+        Test the pairs of a PairSet for membership.
+
+        Parameters
+        ----------
+        pairs : PairSet
+
+        Returns
+        -------
+        ndarray of bools
+            Whether each pair of `pairs` is in the index.
+
+        """
+        ids = self.lookup(pairs.table)
+        left, right = ids[pairs.left], ids[pairs.right]
+        return ((left >= 0) & (right >= 0) &
+                _isin_sorted(left * len(self.table) + right, self.keys))
+
+    def restrict(self, interval_db):
+        """
+        Select the pairs of fragments that are covered by an IntervalDB.
+
+        For pairs built by `within_pairs`, these are the pairs of the
+        ClassDict restricted to `interval_db`.
+
+        Parameters
+        ----------
+        interval_db : IntervalDB
+
+        Returns
+        -------
+        PairSet
+            Pairs in the indexed table, with this index.
+
+        """
+        table = self.table
+        covered = interval_db.is_covered_many(self._fragment_names,
+                                              table.starts, table.ends)
+        mask = covered[self.left] & covered[self.right]
+        pairs = PairSet(table, self.left[mask], self.right[mask], self)
+        pairs._sorted_keys = self.keys[mask]
+        return pairs
+
+
+def _index_map(values, other_values):
+    """Position of each of other_values in values, -1 if absent, with an
+    extra -1 at the end so that the result can be indexed with -1."""
+    index = {value: i for i, value in enumerate(values)}
+    return np.array([index.get(value, -1) for value in other_values] + [-1],
+                    dtype=np.int64)
+
+
+def _rank(values, queries):
+    """Position of each query in the sorted array values, -1 if absent."""
+    if values.shape[0] == 0:
+        return np.full(queries.shape, -1, dtype=np.int64)
+    pos = np.searchsorted(values, queries)
+    clipped = np.minimum(pos, values.shape[0] - 1)
+    return np.where(values[clipped] == queries, clipped, -1).astype(np.int64)
+
+
+def _isin_sorted(keys, sorted_keys):
+    """Membership of keys in the sorted array sorted_keys."""
+    if sorted_keys.shape[0] == 0:
+        return np.zeros(keys.shape, dtype=np.bool)
+    pos = np.minimum(np.searchsorted(sorted_keys, keys),
+                     sorted_keys.shape[0] - 1)
+    return sorted_keys[pos] == keys
+
+
+def _combinations(offsets):
+    """All index pairs i < j within each group delimited by `offsets`, in the
+    order of itertools.combinations applied per group."""
+    offsets = np.asarray(offsets, dtype=np.int64)
+    sizes = np.diff(offsets)
+    lefts = [np.zeros(0, dtype=np.int64)]
+    rights = [np.zeros(0, dtype=np.int64)]
+    for n in np.unique(sizes[sizes > 1]):
+        base = offsets[:-1][sizes == n][:, np.newaxis]
+        i, j = np.triu_indices(n, 1)
+        lefts.append((base + i).ravel())
+        rights.append((base + j).ravel())
+    left = np.concatenate(lefts)
+    right = np.concatenate(rights)
+    order = np.lexsort((right, left))
+    return left[order], right[order]
+
+
+def _unique_pairs(left, right, n):
+    keys = left * n + right
+    _, first = np.unique(keys, return_index=True)
+    first = np.sort(first)
+    return left[first], right[first]
+
+
+def _overlap(table, left, right):
+    s1, e1 = table.starts[left], table.ends[left]
+    s2, e2 = table.starts[right], table.ends[right]
+    over = np.minimum(e1, e2) - np.maximum(s1, s2)
+    over[(e1 < s2) | (s1 > e2)] = 0.
+    return over
+
+
+def _overlaps_with(table, left, right, minimum_overlap=0.03,
+                   minimum_overlap_fraction=0.5):
+    """Vectorized Interval.overlaps_with, ignoring the names."""
+    over = _overlap(table, left, right)
+    len1 = table.ends[left] - table.starts[left]
+    len2 = table.ends[right] - table.starts[right]
+    return (~np.isclose(over, 0.0) &
+            ((over > minimum_overlap) |
+             (over > minimum_overlap_fraction * len2) |
+             (over > minimum_overlap_fraction * len1)))
+
+
+def within_pairs(clsdict, order):
+    """
+    Pairs of fragments from the same class.
+
+    Equivalent to `ClassDict.iter_pairs(within=True, order=order)`.
+
+    Parameters
+    ----------
+    clsdict : ClassDict or FragmentTable
+    order : bool
+        Also include reverse of a pair. If False, each pair is sorted by
+        (name, start).
+
+    Returns
+    -------
+    PairSet
+
+    """
+    table = clsdict if isinstance(clsdict, FragmentTable) \
+        else FragmentTable.from_clsdict(clsdict)
+    pleft, pright = _combinations(table.offsets)
+    left, right = table.ids[pleft], table.ids[pright]
+    if order:
+        left, right = (np.column_stack((left, right)).ravel(),
+                       np.column_stack((right, left)).ravel())
+    else:
+        rank_l, rank_r = table.name_ranks[table.name_codes[left]], \
+            table.name_ranks[table.name_codes[right]]
+        swap = ((rank_r < rank_l) |
+                ((rank_r == rank_l) &
+                 (table.starts[right] < table.starts[left])))
+        left, right = np.where(swap, right, left), np.where(swap, left, right)
+    left, right = _unique_pairs(left, right, len(table))
+    keep = ~_overlaps_with(table, left, right)
+    return PairSet(table, left[keep], right[keep])
+
+
+def gold_pairs(clsdict):
+    """
+    Pairs of non-overlapping fragments with the same annotation.
+
+    Each pair is sorted by (name, start).
+
+    Parameters
+    ----------
+    clsdict : ClassDict or FragmentTable
+
+    Returns
+    -------
+    PairSet
+
+    """
+    table = clsdict if isinstance(clsdict, FragmentTable) \
+        else FragmentTable.from_clsdict(clsdict)
+    ids = np.arange(len(table), dtype=np.int64)
+    ids = ids[np.lexsort((ids, table.starts,
+                          table.name_ranks[table.name_codes],
+                          table.mark_codes))]
+    codes = table.mark_codes[ids]
+    offsets = np.concatenate(([0],
+                              np.nonzero(np.diff(codes))[0] + 1,
+                              [codes.shape[0]]))
+    pleft, pright = _combinations(offsets)
+    left, right = ids[pleft], ids[pright]
+    keep = ~_overlaps_with(table, left, right)
+    left, right = left[keep], right[keep]
+    same = ((table.name_codes[left] == table.name_codes[right]) &
+            (_overlap(table, left, right) > 0))
+    return PairSet(table, left[~same], right[~same])
+
+
+def _substring_offsets(len1, len2, minlength, maxlength):
+    """Offsets and lengths of the aligned substrings of two sequences of
+    lengths len1 and len2, as enumerated by acss.psubstrings."""
+    short = min(len1, len2)
+    dx, dy, lengths = [], [], []
+    for offset in xrange(abs(len1 - len2) + 1):
+        for length in xrange(minlength, min(short + 1, maxlength)):
+            for start in xrange(short - length + 1):
+                if len1 <= len2:
+                    dx.append(start)
+                    dy.append(offset + start)
+                else:
+                    dx.append(offset + start)
+                    dy.append(start)
+                lengths.append(length)
+    return (np.array(dx, dtype=np.int64), np.array(dy, dtype=np.int64),
+            np.array(lengths, dtype=np.int64))
+
+
+def _class_chunks(offsets, n_chunks):
+    """Split the classes delimited by `offsets` into at most `n_chunks` runs
+    of consecutive classes with about the same number of pairs."""
+    sizes = np.diff(offsets)
+    cost = np.cumsum(sizes * sizes)
+    if cost.shape[0] == 0:
+        return []
+    # each chunk ends with the class that reaches its share of the pairs
+    cuts = np.searchsorted(cost, cost[-1] * np.arange(1, n_chunks) / n_chunks)
+    bounds = np.unique(np.concatenate(([0], np.minimum(cuts + 1,
+                                                       cost.shape[0]),
+                                       [cost.shape[0]])))
+    return zip(bounds[:-1].tolist(), bounds[1:].tolist())
+
+
+def _chunk_substring_keys(clsdict, corpus, minlength, maxlength):
+    return _substring_keys(clsdict, corpus.get(), minlength, maxlength)
+
+
+def _substring_keys(clsdict, corpus, minlength, maxlength):
+    """Sorted keys (x * ntokens + y) * maxlength + length of the substring
+    pairs of `clsdict`, x and y being token positions in `corpus`."""
+    pairs = within_pairs(clsdict, order=True)
+    table = pairs.table
+    ntokens = corpus.token_arrays()[2].shape[0]
+
+    # token range of each fragment
+    first = np.zeros(len(table), dtype=np.int64)
+    length = np.zeros(len(table), dtype=np.int64)
+    used = np.unique(pairs.flat())
+    start, stop = corpus.tokens_many(
+        [table.names[c] for c in table.name_codes[used].tolist()],
+        [Interval(s, e) for s, e in izip(table.starts[used].tolist(),
+                                         table.ends[used].tolist())])
+    missing = start < 0
+    if np.any(missing):
+        # raise the error of the first fragment that is not found
+        i = used[np.argmax(missing)]
+        corpus.token_range(table.names[table.name_codes[i]],
+                           Interval(table.starts[i].item(),
+                                    table.ends[i].item()))
+    first[used] = start
+    length[used] = stop - start
+
+    # enumerate the substring pairs per combination of fragment lengths,
+    # each encoded as a single key (x * ntokens + y) * maxlength + length
+    len1, len2 = length[pairs.left], length[pairs.right]
+    base = length.max() + 1 if length.shape[0] else 1
+    shape = len1 * base + len2
+    order = np.argsort(shape, kind='mergesort')
+    bounds = np.concatenate(([0],
+                             np.nonzero(np.diff(shape[order]))[0] + 1,
+                             [order.shape[0]]))
+    keys = [np.zeros(0, dtype=np.int64)]
+    for lo, hi in izip(bounds[:-1], bounds[1:]):
+        if lo == hi:
+            continue
+        sel = order[lo:hi]
+        dx, dy, dl = _substring_offsets(len1[sel[0]], len2[sel[0]],
+                                        minlength, maxlength)
+        if dx.shape[0] == 0:
+            continue
+        x = first[pairs.left[sel]][:, np.newaxis] + dx
+        y = first[pairs.right[sel]][:, np.newaxis] + dy
+        keys.append(np.unique(((x * ntokens + y) * maxlength + dl).ravel()))
+    return np.unique(np.concatenate(keys))
+
+
+def substring_pairs(clsdict, corpus, minlength=3, maxlength=20, n_jobs=1):
+    """
+    Pairs of aligned substrings of the fragment pairs in a ClassDict.
+
+    Equivalent, as a set, to the substring completion of
+    `ClassDict.iter_pairs(within=True, order=True)` computed by
+    `acss.pairwise_substring_completion`: for every pair, all pairs of
+    substrings of at least `minlength` and less than `maxlength` phones at
+    the same offsets, sliding the shorter fragment along the longer one.
+
+    The substrings are enumerated as ranges of token positions in
+    `corpus.token_arrays`, so that no FragmentToken is built. The resulting
+    PairSet has one table entry per distinct substring; its marks are the
+    mark ids of `corpus.symbols`. Pairs are ordered by token position.
+
+    With several jobs, the classes are split into chunks with about the same
+    number of pairs, the substring pairs of each chunk are enumerated in
+    separate processes and their union is taken at the end. The enumeration
+    holds the GIL, so the chunks always run on the loky backend, even when
+    called from within a joblib worker.
+
+    Parameters
+    ----------
+    clsdict : ClassDict or FragmentTable
+    corpus : Corpus or SharedData
+        A Corpus, or a SharedData handle of one, whose dump the jobs then
+        reuse instead of dumping the corpus again.
+    minlength : int, optional
+        minimum number of phones for the substrings
+    maxlength : int, optional
+        maximum number of phones for the substrings (exclusive)
+    n_jobs : int, optional
+        number of jobs for the enumeration, as in joblib. Ignored for a
+        FragmentTable.
+
+    Returns
+    -------
+    PairSet
+
+    Raises
+    ------
+    KeyError, ValueError
+        If a fragment is not found in the corpus.
+
+    """
+    shared = corpus if isinstance(corpus, SharedData) else None
+    if shared is not None:
+        corpus = shared.get()
+    n_jobs = effective_n_jobs(n_jobs)
+    if n_jobs == 1 or isinstance(clsdict, FragmentTable):
+        keys = _substring_keys(clsdict, corpus, minlength, maxlength)
+    else:
+        cc = CompactClassDict.from_clsdict(clsdict)
+        class_codes = cc.class_codes
+        owned = shared is None
+        if owned:
+            shared = SharedData(corpus)
+        try:
+            keys = Parallel(n_jobs=n_jobs, backend='loky')\
+                (delayed(_chunk_substring_keys)(
+                    cc.take((class_codes >= lo) & (class_codes < hi)),
+                    shared, minlength, maxlength)
+                 for lo, hi in _class_chunks(cc.offsets, n_jobs))
+        finally:
+            if owned:
+                shared.close()
+        keys = np.unique(np.concatenate([np.zeros(0, dtype=np.int64)] +
+                                        keys))
+    names, name_codes, starts, ends, phone_ids = corpus.token_arrays()
+    symbols = corpus.symbols
+    ntokens = starts.shape[0]
+
+    sublength = keys % maxlength
+    xy = keys // maxlength
+    x, y = xy // ntokens, xy % ntokens
+
+    # distinct substrings, encoded as position * maxlength + length
+    fkeys, inverse = np.unique(np.concatenate((x * maxlength + sublength,
+                                               y * maxlength + sublength)),
+                               return_inverse=True)
+    left, right = inverse[:keys.shape[0]], inverse[keys.shape[0]:]
+    fx, fl = fkeys // maxlength, fkeys % maxlength
+    width = fl.max() if fl.shape[0] else 0
+    rows = np.full((fl.shape[0], width), -1, dtype=np.int32)
+    for k in xrange(width):
+        has = fl > k
+        rows[has, k] = phone_ids[fx[has] + k]
+    if fl.shape[0]:
+        types, type_codes = np.unique(rows, axis=0, return_inverse=True)
+    else:
+        types, type_codes = rows, np.zeros(0, dtype=np.int64)
+    phones = symbols.phones
+    type_ids = np.array([symbols.mark_id(tuple(phones[p] for p in row
+                                               if p >= 0))
+                         for row in types.tolist()] + [-1], dtype=np.int64)
+    subtable = FragmentTable(names, name_codes[fx],
+                             starts[fx], ends[fx + fl - 1],
+                             symbols.marks, type_ids[type_codes],
+                             np.array([0, fl.shape[0]], dtype=np.int64),
+                             np.arange(fl.shape[0], dtype=np.int64),
+                             symbols=symbols)
+    return PairSet(subtable, left, right)
@@ -16,10 +16,15 @@ annotation_cmp
 import collections
 from functools import cmp_to_key
 
+import numpy as np
+
 from tde.data.sorted_list import SortedList
-from tde.data.interval import Interval, interval_cmp
+from tde.data.interval import Interval, interval_cmp, interval_bisect
 from tde.data.fragment import token_cmp, FragmentToken
 
+# cmp_to_key builds a new class on every call
+_token_key = cmp_to_key(token_cmp)
+
 class SegmentAnnotation(collections.Sequence):
     """
     Annotation for contiguous time segment.
@@ -34,11 +39,16 @@ class SegmentAnnotation(collections.Sequence):
         Identifier for the annotation.
     tokens : list of Fragment objects
         The sequence of annotations.
+    presorted : bool, optional
+        Whether the tokens are already in temporal order, so that they need
+        not be sorted.
 
     Attributes
     ----------
     interval : Interval
         The temporal interval that is covered.
+    starts, ends : ndarray of floats
+        Bounds of the tokens, in temporal order.
 
     Raises
     ------
@@ -46,9 +56,12 @@ class SegmentAnnotation(collections.Sequence):
         If tokens are not contiguous or don't all have the same name.
 
     """
-    def __init__(self, name, tokens):
+    def __init__(self, name, tokens, presorted=False):
         self.name = name
-        self.tokens = SortedList(tokens, key=cmp_to_key(token_cmp))
+        if presorted:
+            self.tokens = SortedList.from_sorted(tokens, key=_token_key)
+        else:
+            self.tokens = SortedList(tokens, key=_token_key)
         if len(self.tokens) == 0:
             self.interval = None
         else:
@@ -57,6 +70,49 @@ class SegmentAnnotation(collections.Sequence):
         if not all(t1.interval.end == t2.interval.start
                    for t1, t2 in zip(self.tokens[:-1], self.tokens[1:])):
             raise ValueError('Non-contiguous tokens.')
+        self._bounds = None
+
+    @property
+    def starts(self):
+        return self.bounds()[0]
+
+    @property
+    def ends(self):
+        return self.bounds()[1]
+
+    def bounds(self):
+        """
+        Starts, ends and overlap parameters of the tokens.
+
+        Returns
+        -------
+        starts, ends : ndarray of floats
+        params : (float, float) or None
+            The `minimum_overlap` and `minimum_overlap_fraction` of the token
+            intervals, None if they differ between tokens.
+
+        """
+        if self._bounds is None:
+            intervals = [t.interval for t in self.tokens]
+            params = set((i.minimum_overlap, i.minimum_overlap_fraction)
+                         for i in intervals)
+            self._bounds = (
+                np.fromiter((i.start for i in intervals), dtype=np.double,
+                            count=len(intervals)),
+                np.fromiter((i.end for i in intervals), dtype=np.double,
+                            count=len(intervals)),
+                params.pop() if len(params) == 1 else None)
+        return self._bounds
+
+    def __getstate__(self):
+        # the sort key is not picklable; the tokens are stored in order
+        state = self.__dict__.copy()
+        state['tokens'] = list(self.tokens)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.tokens = SortedList.from_sorted(self.tokens, key=_token_key)
 
     def __len__(self):
         return len(self.tokens)
@@ -103,9 +159,13 @@ class SegmentAnnotation(collections.Sequence):
             New SegmentAnnotation object.
 
         """
+        covered = interval_db.is_covered_many(
+            [f.name for f in self.tokens],
+            [f.interval.start for f in self.tokens],
+            [f.interval.end for f in self.tokens])
         return SegmentAnnotation(self.name,
-                                 [f for f in self.tokens
-                                  if interval_db.is_covered(f.name, f.interval)])
+                                 [f for f, c in zip(self.tokens, covered)
+                                  if c])
 
     def annotation_at_interval(self, interval):
         """
@@ -139,6 +199,13 @@ class SegmentAnnotation(collections.Sequence):
             name = self.tokens[0].name
         else:
             return tuple()
+        starts, ends, params = self.bounds()
+        if params == (interval.minimum_overlap,
+                      interval.minimum_overlap_fraction):
+            found = interval_bisect(starts, ends, interval)
+            if found is not None:
+                start, stop = found
+                return tuple(self.tokens[start:stop])
         dummy_token = FragmentToken(name, interval, None)
         try:
             start = self.tokens.index_ge(dummy_token)
@@ -3,11 +3,12 @@
 """
 from __future__ import division
 
-from collections import Counter, defaultdict
+from collections import Counter
+
+import numpy as np
 
 from tde.util.functions import unique, iterator_length, flatten
-from tde.substrings.acss import pairwise_substring_completion
-from tde.data.classes import ClassDict
+from tde.data.pairs import PairSet, within_pairs, gold_pairs, substring_pairs
 
 def typeset(pairs):
     """
@@ -15,7 +16,7 @@ def typeset(pairs):
 
     Parameters
     ----------
-    pairs : Iterator over (FragmentToken, FragmentToken) pairs
+    pairs : PairSet or iterator over (FragmentToken, FragmentToken) pairs
 
     Returns
     -------
@@ -23,6 +24,8 @@ def typeset(pairs):
         Unique marks.
 
     """
+    if isinstance(pairs, PairSet):
+        return iter(pairs.typeset())
     return unique(f.mark for f in flatten(pairs))
 
 
@@ -32,13 +35,15 @@ def freqs(pairs):
 
     Parameters
     ----------
-    pairs : Iterator over (FragmentToken, FragmentToken) pairs
+    pairs : PairSet or iterator over (FragmentToken, FragmentToken) pairs
 
     Returns
     -------
     dict from string to int
         Counts of the marks.
     """
+    if isinstance(pairs, PairSet):
+        return pairs.freqs()
     return dict(Counter(f.mark for f in unique_flatten(pairs)))
 
 
@@ -48,13 +53,15 @@ def weights(pairs):
 
     Parameters
     ----------
-    pairs : Iterator over (FragmentToken, FragmentToken) pairs
+    pairs : PairSet or iterator over (FragmentToken, FragmentToken) pairs
 
     Returns
     -------
     dict from string to float
         Relative frequencies of the marks.
     """
+    if isinstance(pairs, PairSet):
+        return pairs.weights()
     total = iterator_length(unique_flatten(pairs))
     fs = freqs(pairs)
     return {t: fs[t] / total for t in fs}
@@ -101,20 +108,11 @@ def Pgoldclus(clsdict):
 
     Returns
     -------
-    Iterator (FragmentToken, FragmentToken) pairs
+    PairSet
+        Iterable over (FragmentToken, FragmentToken) pairs
 
     """
-    # partition the clsdict into fragments that have the same annotation
-    d = defaultdict(set)
-    for f in clsdict.iter_fragments():
-        d[f.mark].add(f)
-    d = ClassDict(dict(d))
-
-    return (tuple(sorted((f1, f2),
-                         key=lambda f: (f.name, f.interval.start)))
-            for f1, f2 in d.iter_pairs(within=True, order=False)
-            if not (f1.name == f2.name
-                    and f1.interval.overlap(f2.interval) > 0))
+    return gold_pairs(clsdict)
 
 
 def Pclus_single(clsdict):
@@ -134,10 +132,11 @@ def Pclus_single(clsdict):
 
     Returns
     -------
-    Iterator over FragmentToken pairs
+    PairSet
+        Iterable over (FragmentToken, FragmentToken) pairs
 
     """
-    return clsdict.iter_pairs(within=True, order=False)
+    return within_pairs(clsdict, order=False)
 
 
 def Pclus(clsdict):
@@ -155,10 +154,11 @@ def Pclus(clsdict):
 
     Returns
     -------
-    Iterator (FragmentToken, FragmentToken) pairs
+    PairSet
+        Iterable over (FragmentToken, FragmentToken) pairs
 
     """
-    return clsdict.iter_pairs(within=True, order=True)
+    return within_pairs(clsdict, order=True)
 
 
 def Fclus(clsdict):
@@ -187,7 +187,8 @@ def Pdisc(clsdict):
 
     Returns
     -------
-    iter : iterator (FragmentToken, FragmentToken) pairs
+    PairSet
+        Iterable over (FragmentToken, FragmentToken) pairs
 
     """
     return Pclus(clsdict)
@@ -201,8 +202,7 @@ def nmatch(pairs):
 
     Parameters
     ----------
-    pairs : iterable over (FragmentToken, FragmentToken) pairs
-    corpus : Corpus
+    pairs : PairSet or iterable over (FragmentToken, FragmentToken) pairs
 
     Returns
     -------
@@ -210,12 +210,14 @@ def nmatch(pairs):
         Annotation counts.
 
     """
+    if isinstance(pairs, PairSet):
+        return pairs.nmatch()
     return Counter(f.mark
                    for _, f in pairs)
 
 
 
-def Psubs(clsdict, corpus, minlength=3, maxlength=20):
+def Psubs(clsdict, corpus, minlength=3, maxlength=20, n_jobs=1):
     """
     Generate Psubs - the substring completion of a set of pairs.
 
@@ -224,19 +226,46 @@ def Psubs(clsdict, corpus, minlength=3, maxlength=20):
     Parameters
     ----------
     clsdict : ClassDict
-    corpus : Corpus
+    corpus : Corpus or SharedData
     minlength : int, optional
         minimum number of phones for the substrings
     maxlength : int, optional
         maximum number of phones for the substrings
+    n_jobs : int, optional
+        number of jobs, over which the classes are split
+
+    Returns
+    -------
+    PairSet
+        Iterates over (FragmentToken, FragmentToken) pairs.
+
+    """
+    return substring_pairs(clsdict, corpus, minlength, maxlength, n_jobs)
+
+
+def weighted_ratio(weights, hits, counts):
+    r"""
+    Weighted sum of the ratio of hits per mark.
+
+    .. math::
+       \sum_{t | \mathrm{counts}(t) > 0} w(t) \frac{\mathrm{hits}(t)}{\mathrm{counts}(t)}
+
+    Parameters
+    ----------
+    weights : ndarray of floats
+    hits, counts : ndarray of ints
+        All indexed by mark code.
 
     Returns
     -------
-    Iterator over (FragmentToken, FragmentToken) pairs
+    float
+        Weighted ratio, np.nan if all counts are zero.
 
     """
-    sub_pairs = (pairwise_substring_completion(f1, f2, corpus,
-                                               minlength,
-                                               maxlength)
-                 for f1, f2 in clsdict.iter_pairs(within=True, order=True))
-    return unique(flatten(sub_pairs))
+    n = max(weights.shape[0], hits.shape[0], counts.shape[0])
+    weights, hits, counts = [np.pad(a, (0, n - a.shape[0]), 'constant')
+                             for a in (weights, hits, counts)]
+    nz = counts > 0
+    if not np.any(nz):
+        return np.nan
+    return np.sum(weights[nz] * hits[nz] / counts[nz])
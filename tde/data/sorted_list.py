@@ -35,6 +35,16 @@ class SortedList(collections.Sequence):
                                 for e in zip(*sorted((self._key_func(x), x)
                                                      for x in iterable))]
 
+    @classmethod
+    def from_sorted(cls, iterable, key=None):
+        """Build a SortedList from elements that are already in order by `key`,
+        without sorting them.
+        """
+        r = cls(key=key)
+        r._v = list(iterable)
+        r._k = [r._key_func(x) for x in r._v]
+        return r
+
     def __getitem__(self, i):
         return self._v[i]
 
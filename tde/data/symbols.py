@@ -0,0 +1,127 @@
+"""
+Integer coding of phones and marks.
+
+Classes
+-------
+SymbolTable
+    Maps phones and marks (phone sequences) to small integers.
+
+"""
+
+import numpy as np
+
+
+class SymbolTable(object):
+    """
+    Maps phones and marks to small integers.
+
+    Phones are the symbols of a corpus annotation, marks are sequences of
+    phones (the annotation of a fragment). Phones are registered when the
+    table is built from a corpus; marks are interned as they are encountered,
+    so that the same mark always gets the same id.
+
+    Parameters
+    ----------
+    phones : iterable of strings, optional
+        Phones to register.
+
+    Attributes
+    ----------
+    phones : list of strings
+        Phone for each phone id.
+    marks : list of marks
+        Mark for each mark id.
+
+    """
+    def __init__(self, phones=None):
+        self.phones = []
+        self.marks = []
+        self._phone_ids = {}
+        self._mark_ids = {}
+        if phones is not None:
+            for phone in phones:
+                self.phone_id(phone)
+
+    def __repr__(self):
+        return '<SymbolTable {0} phones, {1} marks>'.format(
+            len(self.phones), len(self.marks))
+
+    def __eq__(self, other):
+        if not isinstance(other, SymbolTable):
+            return False
+        return self.phones == other.phones and self.marks == other.marks
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    def phone_id(self, phone):
+        """
+        Id of a phone, registering it if it is new.
+
+        Parameters
+        ----------
+        phone : string
+
+        Returns
+        -------
+        int
+
+        """
+        try:
+            return self._phone_ids[phone]
+        except KeyError:
+            i = len(self.phones)
+            self._phone_ids[phone] = i
+            self.phones.append(phone)
+            return i
+
+    def mark_id(self, mark):
+        """
+        Id of a mark, interning it if it is new.
+
+        Parameters
+        ----------
+        mark : tuple of strings
+
+        Returns
+        -------
+        int
+
+        """
+        try:
+            return self._mark_ids[mark]
+        except KeyError:
+            i = len(self.marks)
+            self._mark_ids[mark] = i
+            self.marks.append(mark)
+            return i
+
+    def mark_ids(self, marks):
+        """
+        Ids of a sequence of marks.
+
+        Parameters
+        ----------
+        marks : iterable of marks
+
+        Returns
+        -------
+        ndarray of ints
+
+        """
+        return np.fromiter((self.mark_id(m) for m in marks), dtype=np.int64)
+
+    def encode(self, mark):
+        """
+        Phone ids of a mark.
+
+        Parameters
+        ----------
+        mark : tuple of strings
+
+        Returns
+        -------
+        ndarray of ints
+
+        """
+        return np.fromiter((self.phone_id(p) for p in mark), dtype=np.int32)
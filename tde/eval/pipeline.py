@@ -0,0 +1,779 @@
+"""Evaluation pipeline shared by the dataset drivers in bin/.
+
+Each driver (`sample_eval2`, `english_eval2`, `xitsonga_eval2`) only names its
+dataset and resource directory and calls `main`; loading the resources,
+restricting the discovered classes to the folds, computing the measures and
+writing the results are done here.
+
+Functions
+---------
+main
+    Run an evaluation from the command line.
+parse_args
+    Parse the command line of a driver.
+evaluate
+    Evaluate one discovered class file.
+evaluate_systems
+    Evaluate several discovered class files over a process pool.
+
+"""
+
+from __future__ import division
+
+import argparse
+import os
+import os.path as path
+import sys
+import time
+import traceback
+from itertools import izip
+
+import numpy as np
+from joblib import Parallel, delayed, effective_n_jobs
+
+from tde.util.reader import load_corpus, load_split
+from tde.util.cache import load_classes_cached
+from tde.util.printing import verb_print, banner, pretty_score_f, \
+    pretty_score_nlp
+from tde.util.splits import truncate_intervals, check_intervals, \
+    FoldPartition
+from tde.util.functions import fscore
+
+from tde.measures.nlp import NED, coverage
+from tde.measures.group import evaluate_group
+from tde.measures.boundaries import Boundaries, eval_from_bounds
+from tde.measures.match import eval_from_psets, make_psubs
+from tde.measures.token_type import evaluate_token_type
+from tde.util.shared import SharedData
+from tde.goldset import PgoldFolds, pgold_digest, PGOLD_VERSION
+
+VERSION = "0.2.1"
+
+
+def _load_classes(fname, corpus, corpus_file, split_mapping=None,
+                  split_file=None, cache_dir=None):
+    return load_classes_cached(fname, corpus, corpus_file,
+                               split=split_mapping, split_file=split_file,
+                               cache_dir=cache_dir)
+
+
+def load_disc(fname, corpus, corpus_file, split_file, truncate, verbose,
+              cache_dir=None):
+    with verb_print('  loading discovered classes',
+                             verbose, True, True, True):
+        split_mapping = load_split(split_file)
+        disc, errors = _load_classes(fname, corpus, corpus_file,
+                                     split_mapping, split_file, cache_dir)
+        if not truncate:
+            errors_found = len(errors) > 0
+            if len(errors) > 100:
+                print 'There were more than 100 interval errors found.'
+                print 'Printing only the first 100.'
+                print
+                errors = errors[:100]
+            for fragment in sorted(errors, key=lambda x: (x.name, x.interval.start)):
+                print '  error: {0} [{1:.3f}, {2:.3f}]'.format(
+                    fragment.name, fragment.interval.start, fragment.interval.end)
+            if not truncate and errors_found:
+                print 'There were errors in {0}. Use option -f to'\
+                    ' automatically skip invalid intervals.'.format(fname)
+                sys.exit()
+
+    if truncate:
+        with verb_print('  checking discovered classes and truncating'):
+            disc, filename_errors, interval_errors = \
+                truncate_intervals(disc, corpus,
+                                   split_mapping)
+    else:
+        with verb_print('  checking discovered classes', verbose, True,
+                                 True, True):
+            filename_errors, interval_errors = \
+                check_intervals(disc, split_mapping)
+    if not truncate:
+        filename_errors = sorted(filename_errors,
+                                 key=lambda x: (x.name, x.interval.start))
+        interval_errors = sorted(interval_errors,
+                                 key=lambda x: (x.name, x.interval.start))
+        interval_error = len(interval_errors) > 0
+        filename_error = len(filename_errors) > 0
+        errors_found = filename_error or interval_error
+        if interval_error:
+            print banner('intervals found in {0} outside of valid'
+                                      ' splits'.format(fname))
+            if len(interval_errors) > 100:
+                print 'There were more than 100 interval errors found.'
+                print 'Printing only the first 100.'
+                print
+                interval_errors = interval_errors[:100]
+            for fragment in sorted(interval_errors,
+                                   key=lambda x: (x.name, x.interval.start)):
+                print '  error: {0} [{1:.3f}, {2:.3f}]'.format(
+                    fragment.name,
+                    fragment.interval.start, fragment.interval.end)
+        if filename_error:
+            print banner('unknown filenames found in {0}'
+                                      .format(fname))
+            if len(filename_errors) > 100:
+                print 'There were more than 100 filename errors found.'
+                print 'Printing only the first 100.'
+                print
+                filename_errors = filename_errors[:100]
+            for fragment in sorted(filename_errors,
+                                   key=lambda x: (x.name, x.interval.start)):
+                print '  error: {0}'.format(fragment.name)
+        if not truncate and errors_found:
+            print 'There were errors in {0}. Use option -f to automatically skip invalid intervals.'.format(fname)
+            sys.exit()
+    return disc
+
+
+# the measures in the order they are evaluated
+MEASURES = ['match', 'group', 'token/type', 'nlp', 'boundary']
+# the measures whose cost grows with the number of pairs in a class
+PAIR_MEASURES = ['match', 'group', 'nlp']
+
+
+def _pairs_fold(disc_all):
+    # the fragments of the fold that are in a class with another one
+    return disc_all.take(np.ones(disc_all.n_fragments(), dtype=np.bool),
+                         True)
+
+
+def _match_fold(disc_pairs, pgold_folds, phn_corpus, label, fold, n_jobs=1):
+    psubs = make_psubs(disc_pairs, phn_corpus, 3, 20, False, False,
+                       n_jobs=n_jobs)
+    return eval_from_psets(None, pgold_folds.pgold(label, fold), psubs)
+
+
+def _evaluate_fold(disc, pgold_folds, phn_corpus, wrd_corpus, gold, measures,
+                   label, fold, disc_positions, wrd_positions, gold_positions,
+                   n_threads):
+    # the first task of a worker loads the shared data, which is not timed
+    disc = disc.get()
+    if 'match' in measures:
+        phn_corpus, pgold_folds = phn_corpus.get(), pgold_folds.get()
+    if wrd_positions is not None:
+        wrd_corpus = wrd_corpus.get()
+    if gold_positions is not None:
+        gold = gold.get()
+    t0 = time.time()
+    # the fold is restricted once and shared by all the measures
+    disc_all = disc.take(disc_positions)
+    disc_pairs = _pairs_fold(disc_all)
+    if wrd_positions is not None:
+        wrd_fold = wrd_corpus.take(wrd_positions)
+    scores = {}
+    if 'match' in measures:
+        scores['match'] = _match_fold(disc_pairs, pgold_folds, phn_corpus,
+                                      label, fold)
+    if 'group' in measures:
+        scores['group'] = evaluate_group(disc_pairs)
+    if 'token/type' in measures:
+        scores['token/type'] = evaluate_token_type(disc_all, wrd_fold)
+    if 'nlp' in measures:
+        scores['nlp'] = (NED(disc_pairs, n_threads=n_threads),
+                         coverage(disc_all, gold.take(gold_positions)))
+    if 'boundary' in measures:
+        scores['boundary'] = eval_from_bounds(Boundaries(disc_all),
+                                              Boundaries(wrd_fold))
+    return scores, time.time() - t0
+
+
+def fold_costs(disc_clsdict, disc_folds, measures):
+    # estimated work per fold: the number of fragments, plus the number of
+    # pairs within the classes for the measures that enumerate them
+    class_codes = disc_clsdict.class_codes
+    costs = []
+    for i in xrange(len(disc_folds)):
+        positions = disc_folds.positions(i)
+        cost = positions.shape[0]
+        if any(m in measures for m in PAIR_MEASURES):
+            sizes = np.bincount(class_codes[positions])
+            cost += int((sizes * sizes).sum())
+        costs.append(cost)
+    return costs
+
+
+def evaluate_folds(disc, disc_folds, pgold_folds, phn_corpus, wrd_corpus,
+                   wrd_folds, gold, gold_folds, fragments_within,
+                   fragments_cross, measures, verbose, n_jobs, n_threads=1):
+    # one task per fold computes all the measures, so that the pool is
+    # started once and each fold is restricted once. The folds vary a lot in
+    # size: they are dispatched largest first, one at a time as the workers
+    # free up, so that a large fold does not start last
+    fragments = {'cross': fragments_cross, 'within': fragments_within}
+    costs = {label: fold_costs(disc.get(), disc_folds[label], measures)
+             for label in ('cross', 'within')}
+    tasks = sorted(((label, i) for label in ('cross', 'within')
+                    for i in xrange(len(fragments[label]))),
+                   key=lambda task: -costs[task[0]][task[1]])
+    if verbose:
+        for label in ('cross', 'within'):
+            print '  {2}: subsampled {0} files in {1} sets'\
+                .format(sum(map(len, fragments[label])),
+                        len(fragments[label]), label)
+    positions = lambda folds, label, i: \
+        None if folds is None else folds[label].positions(i)
+    # with fewer folds than jobs, one task per fold would leave jobs idle.
+    # The parent then computes the matching measure itself, a fold at a
+    # time, with the substring pairs of each fold split over all the jobs
+    match_jobs = effective_n_jobs(n_jobs)
+    parent_match = 'match' in measures and len(tasks) < match_jobs
+    fold_measures = [m for m in measures if not (parent_match and
+                                                 m == 'match')]
+    match_results = {}
+    if parent_match:
+        with verb_print('  calculating matching scores', verbose, False,
+                        True, False):
+            for label, i in tasks:
+                t0 = time.time()
+                disc_pairs = _pairs_fold(
+                    disc.get().take(positions(disc_folds, label, i)))
+                score = _match_fold(disc_pairs, pgold_folds.get(),
+                                    phn_corpus, label, i, match_jobs)
+                match_results[label, i] = score, time.time() - t0
+    if len(fold_measures) == 0:
+        results = [({}, 0.) for _ in tasks]
+    else:
+        with verb_print('  calculating scores', verbose, False, True, False):
+            results = Parallel(n_jobs=n_jobs,
+                               verbose=5 if verbose else 0,
+                               pre_dispatch='n_jobs', batch_size=1)\
+                (delayed(_evaluate_fold)(disc, pgold_folds, phn_corpus,
+                                         wrd_corpus, gold, fold_measures,
+                                         label, i,
+                                         positions(disc_folds, label, i),
+                                         positions(wrd_folds, label, i),
+                                         positions(gold_folds, label, i),
+                                         n_threads)
+                 for label, i in tasks)
+    for k, task in enumerate(tasks):
+        if task in match_results:
+            result, elapsed = results[k]
+            result['match'] = match_results[task][0]
+            results[k] = result, elapsed + match_results[task][1]
+    scores = {'cross': {m: [] for m in measures},
+              'within': {m: [] for m in measures}}
+    for (label, i), (result, _) in sorted(izip(tasks, results),
+                                               key=lambda x: x[0]):
+        for measure, score in result.iteritems():
+            scores[label][measure].append(score)
+    if verbose:
+        print '  time per fold, by decreasing cost:'
+        for (label, i), (_, elapsed) in izip(tasks, results):
+            print '    {0:<6} {1:>3d}: {2:8.3f}s  ({3} files, cost {4})'\
+                .format(label, i, elapsed, len(fragments[label][i]),
+                        costs[label][i])
+    return scores
+
+
+def _columns(scores, n):
+    return np.array(scores, dtype=np.double).reshape(-1, n).T
+
+
+def write_match(scores, fragments_within, fragments_cross, dest):
+    pc, rc = praggregate(*_columns(scores['cross']['match'], 2))
+    pw, rw = praggregate(*_columns(scores['within']['match'], 2))
+    fc = np.fromiter((fscore(pc[i], rc[i]) for i in xrange(pc.shape[0])), dtype=np.double)
+    fw = np.fromiter((fscore(pw[i], rw[i]) for i in xrange(pw.shape[0])), dtype=np.double)
+    with open(path.join(dest, 'matching'), 'w') as fid:
+        fid.write(pretty_score_f(pc, rc, fc, 'match total',
+                                 len(fragments_cross),
+                                 sum(map(len, fragments_cross))))
+        fid.write('\n')
+        fid.write(pretty_score_f(pw, rw, fw, 'match within-speaker only',
+                                 len(fragments_within),
+                                 sum(map(len, fragments_within))))
+
+
+def write_group(scores, fragments_within, fragments_cross, dest):
+    pc, rc = praggregate(*_columns(scores['cross']['group'], 2))
+    fc = np.fromiter((fscore(pc[i], rc[i]) for i in xrange(pc.shape[0])), dtype=np.double)
+
+    pw, rw = praggregate(*_columns(scores['within']['group'], 2))
+    fw = np.fromiter((fscore(pw[i], rw[i]) for i in xrange(pw.shape[0])), dtype=np.double)
+    with open(path.join(dest, 'group'), 'w') as fid:
+        fid.write(pretty_score_f(pc, rc, fc, 'group total',
+                                 len(fragments_cross),
+                                 sum(map(len, fragments_cross))))
+        fid.write('\n')
+        fid.write(pretty_score_f(pw, rw, fw, 'group within-speaker only',
+                                 len(fragments_within),
+                                 sum(map(len, fragments_within))))
+
+
+def write_token_type(scores, fragments_within, fragments_cross, dest):
+    ptoc, rtoc, ptyc, rtyc = _columns(scores['cross']['token/type'], 4)
+    ptoc, rtoc = praggregate(ptoc, rtoc)
+    ptyc, rtyc = praggregate(ptyc, rtyc)
+    ftoc = np.fromiter((fscore(ptoc[i], rtoc[i]) for i in xrange(ptoc.shape[0])),
+                       dtype=np.double)
+    ftyc = np.fromiter((fscore(ptyc[i], rtyc[i]) for i in xrange(ptyc.shape[0])),
+                       dtype=np.double)
+
+    ptow, rtow, ptyw, rtyw = _columns(scores['within']['token/type'], 4)
+    ptow, rtow = praggregate(ptow, rtow)
+    ptyw, rtyw = praggregate(ptyw, rtyw)
+    ftow = np.fromiter((fscore(ptow[i], rtow[i]) for i in xrange(ptow.shape[0])),
+                       dtype=np.double)
+    ftyw = np.fromiter((fscore(ptyw[i], rtyw[i]) for i in xrange(rtyw.shape[0])),
+                       dtype=np.double)
+    with open(path.join(dest, 'token_type'), 'w') as fid:
+        fid.write(pretty_score_f(ptoc, rtoc, ftoc, 'token total',
+                                 len(fragments_cross),
+                                 sum(map(len, fragments_cross))))
+        fid.write('\n')
+        fid.write(pretty_score_f(ptyc, rtyc, ftyc, 'type total',
+                                 len(fragments_cross),
+                                 sum(map(len, fragments_cross))))
+        fid.write('\n')
+        fid.write(pretty_score_f(ptow, rtow, ftow, 'token within-speaker only',
+                                 len(fragments_within),
+                                 sum(map(len, fragments_within))))
+        fid.write('\n')
+        fid.write(pretty_score_f(ptyw, rtyw, ftyw, 'type within-speaker only',
+                                 len(fragments_within),
+                                 sum(map(len, fragments_within))))
+
+
+def write_nlp(scores, fragments_within, fragments_cross, dest):
+    # don't replace nan's by 1, but ignore them, unless all values in ned_score
+    # are nan
+    nc, cc = _columns(scores['cross']['nlp'], 2)
+    nc, cc = aggregate(nc, 1), aggregate(cc)
+    nw, cw = _columns(scores['within']['nlp'], 2)
+    nw, cw = aggregate(nw, 1), aggregate(cw)
+    with open(path.join(dest, 'nlp'), 'w') as fid:
+        fid.write(pretty_score_nlp(nc, cc, 'NLP total',
+                                       len(fragments_within),
+                                       sum(map(len, fragments_within))))
+        fid.write('\n')
+        fid.write(pretty_score_nlp(nw, cw, 'NLP within-speaker only',
+                                       len(fragments_cross),
+                                       sum(map(len, fragments_cross))))
+
+
+def write_boundary(scores, fragments_within, fragments_cross, dest):
+    pc, rc = praggregate(*_columns(scores['cross']['boundary'], 2))
+    fc = np.fromiter((fscore(pc[i], rc[i]) for i in xrange(pc.shape[0])), dtype=np.double)
+    pw, rw = praggregate(*_columns(scores['within']['boundary'], 2))
+    fw = np.fromiter((fscore(pw[i], rw[i]) for i in xrange(pw.shape[0])), dtype=np.double)
+    with open(path.join(dest, 'boundary'), 'w') as fid:
+        fid.write(pretty_score_f(pc, rc, fc, 'boundary total',
+                                 len(fragments_cross),
+                                 sum(map(len, fragments_cross))))
+        fid.write('\n')
+        fid.write(pretty_score_f(pw, rw, fw, 'boundary within-speaker only',
+                                 len(fragments_within),
+                                 sum(map(len, fragments_within))))
+
+
+WRITERS = {'match': write_match,
+           'group': write_group,
+           'token/type': write_token_type,
+           'nlp': write_nlp,
+           'boundary': write_boundary}
+
+
+def aggregate(array, default_score=0.):
+    array = np.array(array)
+    array = array[np.logical_not(np.isnan(array))]
+    if array.shape[0] == 0:
+        array = np.array([default_score])
+    return array
+
+def praggregate(p_array, r_array, default_score=0.):
+    p_array, r_array = np.array(p_array), np.array(r_array)
+    p_index = np.logical_not(np.isnan(p_array))
+    r_index = np.logical_not(np.isnan(r_array))
+    index = np.logical_and(p_index, r_index)
+    p_array, r_array = p_array[index], r_array[index]
+    if not np.any(index):
+        p_array, r_array = np.array([default_score]), np.array([default_score])
+    return p_array, r_array
+
+def _load_corpus(fname):
+    return load_corpus(fname)
+
+def load_wrd_corpus(wrd_corpus_file, verbose):
+    with verb_print('  loading word corpus file',
+                             verbose, True, True, True):
+        wrd_corpus = _load_corpus(wrd_corpus_file)
+    return wrd_corpus
+
+def load_phn_corpus(phn_corpus_file, verbose):
+    with verb_print('  loading phone corpus file',
+                             verbose, True, True, True):
+        phn_corpus = _load_corpus(phn_corpus_file)
+    return phn_corpus
+
+def load_fragments_cross(fname, verbose):
+    with verb_print('  loading folds cross',
+                             verbose, True, True, True):
+        fragments = load_split(fname, multiple=True)
+    return fragments
+
+def load_fragments_within(fname, verbose):
+    with verb_print('  loading folds within',
+                             verbose, True, True, True):
+        fragments = load_split(fname, multiple=True)
+    return fragments
+
+def partition_folds(fragments_within, fragments_cross, clsdict=None,
+                    corpus=None):
+    # each fragment or token is assigned to its folds once, and every
+    # measure restricts to a fold by position instead of re-scanning it
+    if corpus is None:
+        build = lambda folds: FoldPartition.from_clsdict(folds, clsdict)
+    else:
+        build = lambda folds: FoldPartition.from_corpus(folds, corpus)
+    return {'cross': build(fragments_cross),
+            'within': build(fragments_within)}
+
+def load_gold(fname, corpus, corpus_file, verbose, cache_dir=None):
+    with verb_print('  loading gold classes',
+                             verbose, True, True, True):
+        gold, _ = _load_classes(fname, corpus, corpus_file,
+                                cache_dir=cache_dir)
+    return gold
+
+def load_pgold(fname, gold, fragments_within, fragments_cross, digest,
+               verbose, cache_dir=None):
+    # the gold pairs only depend on the dataset: read them from the resource
+    # directory (see make_pgold.py) or else from the cache, and only compute
+    # them if neither is up to date
+    candidates = [fname]
+    cached = None
+    if cache_dir is not None:
+        cached = path.join(cache_dir, 'pgold_v{0}_{1}.pkl'.format(
+            PGOLD_VERSION, digest))
+        candidates.append(cached)
+    with verb_print('  loading gold pairs', verbose, True, True, True):
+        for candidate in candidates:
+            if path.exists(candidate):
+                try:
+                    return SharedData.from_file(
+                        candidate, PgoldFolds.load(candidate, digest))
+                except (IOError, ValueError, KeyError, EOFError):
+                    pass  # stale or unreadable, try the next one
+    with verb_print('  constructing gold pairs', verbose, True, True, True):
+        pgold_folds = PgoldFolds.build(gold.get(),
+                                       {'cross': fragments_cross,
+                                        'within': fragments_within},
+                                       digest)
+    if cached is None:
+        return SharedData(pgold_folds)
+    if not path.isdir(cache_dir):
+        os.makedirs(cache_dir)
+    pgold_folds.save(cached)
+    return SharedData.from_file(cached, pgold_folds)
+
+
+def evaluate(disc_clsfile, dest, phn, wrd, gold, pgold, fragments_within,
+             fragments_cross, phn_corpus_file, split_file, measures,
+             truncate, verbose, n_jobs, n_threads=1, cache_dir=None,
+             wrd_folds=None, gold_folds=None):
+    disc_clsdict = load_disc(disc_clsfile, phn.get(), phn_corpus_file,
+                             split_file, truncate, verbose, cache_dir)
+
+    try:
+        os.makedirs(dest)
+    except OSError:
+        pass
+
+    with open(path.join(dest, 'VERSION_{0}'.format(VERSION)), 'w') as fid:
+        fid.write('')
+
+    measures = [m for m in MEASURES if len(measures) == 0 or m in measures]
+    # the workers load the data memory-mapped once each, instead of
+    # receiving a pickled copy with every fold
+    with SharedData(disc_clsdict.compact()) as disc:
+        with verb_print('  assigning fragments to folds',
+                        verbose, True, True, True):
+            disc_folds = partition_folds(fragments_within, fragments_cross,
+                                         clsdict=disc.get())
+            if wrd_folds is None and ('token/type' in measures or
+                                      'boundary' in measures):
+                wrd_folds = partition_folds(fragments_within,
+                                            fragments_cross,
+                                            corpus=wrd.get())
+            if gold_folds is None and 'nlp' in measures:
+                gold_folds = partition_folds(fragments_within,
+                                             fragments_cross,
+                                             clsdict=gold.get())
+        if verbose:
+            print banner('EVALUATION')
+        scores = evaluate_folds(disc, disc_folds, pgold, phn, wrd, wrd_folds,
+                                gold, gold_folds, fragments_within,
+                                fragments_cross, measures, verbose, n_jobs,
+                                n_threads)
+    for measure in measures:
+        WRITERS[measure](scores, fragments_within, fragments_cross, dest)
+
+
+def _evaluate_system(disc_clsfile, dest, phn, wrd, gold, pgold, folds,
+                     phn_corpus_file, split_file, measures, truncate,
+                     n_threads, cache_dir):
+    fragments_within, fragments_cross, wrd_folds, gold_folds = folds.get()
+    try:
+        evaluate(disc_clsfile, dest, phn, wrd, gold, pgold, fragments_within,
+                 fragments_cross, phn_corpus_file, split_file, measures,
+                 truncate, False, 1, n_threads, cache_dir, wrd_folds,
+                 gold_folds)
+    except (Exception, SystemExit):
+        # one broken system must not take down the rest of the batch
+        return traceback.format_exc()
+    return None
+
+
+def evaluate_systems(disc_clsfiles, dests, phn, wrd, gold, pgold,
+                     fragments_within, fragments_cross, phn_corpus_file,
+                     split_file, measures, truncate, verbose, n_jobs,
+                     n_threads=1, cache_dir=None):
+    # the systems are spread over the processes, each evaluating its folds
+    # serially; the resources are loaded and assigned to the folds once and
+    # shared memory-mapped
+    wrd_folds = partition_folds(fragments_within, fragments_cross,
+                                corpus=wrd.get())
+    gold_folds = partition_folds(fragments_within, fragments_cross,
+                                 clsdict=gold.get())
+    with SharedData((fragments_within, fragments_cross, wrd_folds,
+                     gold_folds)) as folds:
+        errors = Parallel(n_jobs=n_jobs, verbose=5 if verbose else 0)\
+            (delayed(_evaluate_system)(disc_clsfile, dest, phn, wrd, gold,
+                                       pgold, folds, phn_corpus_file,
+                                       split_file, measures, truncate,
+                                       n_threads, cache_dir)
+             for disc_clsfile, dest in izip(disc_clsfiles, dests))
+    return [(disc_clsfile, error)
+            for disc_clsfile, error in izip(disc_clsfiles, errors)
+            if error is not None]
+
+
+def parse_args(prog, dataset, argv=None):
+    parser = argparse.ArgumentParser(
+        prog=prog,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        description='Evaluate spoken term discovery on the {0} dataset'
+        .format(dataset),
+        epilog="""Example usage:
+
+$ ./{0} my_{1}.classes resultsdir/
+
+evaluates STD output `my_{1}.classes` on the {1} dataset and stores the
+output in `resultsdir/`.
+
+$ ./{0} --systems run1.classes run2.classes -j 4 -o resultsdir/
+
+loads the dataset once and evaluates the two class files in 4 processes,
+storing the output in `resultsdir/run1.classes/` and `resultsdir/run2.classes/`.
+
+Classfiles must be formatted like this:
+
+Class 1 (optional_name)
+fileID starttime endtime
+fileID starttime endtime
+...
+
+Class 2 (optional_name)
+fileID starttime endtime
+...
+""".format(prog, dataset))
+    parser.add_argument('disc_clsfile', metavar='DISCCLSFILE',
+                        nargs='?',
+                        help='discovered classes')
+    parser.add_argument('destination', metavar='DESTINATION',
+                        nargs='?',
+                        help='location for the evaluation results')
+    parser.add_argument('-o', '--outdir',
+                        action='store',
+                        dest='outdir',
+                        default=None,
+                        metavar='DESTINATION',
+                        help='location for the evaluation results, in place '
+                        'of the positional DESTINATION; required with '
+                        '--systems')
+    parser.add_argument('--systems',
+                        action='store',
+                        nargs='+',
+                        dest='systems',
+                        default=None,
+                        metavar='DISCCLSFILE',
+                        help='evaluate several discovered class files, '
+                        'in place of DISCCLSFILE, over -j processes; '
+                        'the results of each are stored in '
+                        'DESTINATION/<file name>')
+    parser.add_argument('-f', '--force-truncate',
+                        action='store_true',
+                        dest='truncate',
+                        default=True,
+                        help='force truncation of discovered fragments '
+                        'outside of splits')
+    parser.add_argument('-m', '--measures',
+                        action='store',
+                        nargs='*',
+                        dest='measures',
+                        default=[],
+                        choices=['boundary', 'group', 'match', 'nlp',
+                                 'token/type'],
+                        help='select individual measures to perform')
+    parser.add_argument('-v', '--verbose',
+                        action='store_true',
+                        dest='verbose',
+                        default=False,
+                        help='display progress')
+    parser.add_argument('-j', '--n-jobs',
+                        action='store',
+                        type=int,
+                        dest='n_jobs',
+                        default=1,
+                        help='number of cores to use')
+    parser.add_argument('-t', '--n-threads',
+                        action='store',
+                        type=int,
+                        dest='n_threads',
+                        default=1,
+                        help='number of threads per process for the '
+                        'edit distances in nlp')
+    parser.add_argument('--cache-dir',
+                        action='store',
+                        dest='cache_dir',
+                        default=None,
+                        help='directory in which to keep the annotated '
+                        'class files and gold pairs, reused while the '
+                        'inputs are unchanged (default: no cache)')
+    parser.add_argument('-V', '--version', action='version',
+                        version="%(prog)s version {version}".format(version=VERSION))
+    args = vars(parser.parse_args(argv))
+    systems = args['systems']
+    if systems is None:
+        if args['disc_clsfile'] is None:
+            parser.error('give either DISCCLSFILE or --systems')
+        if (args['destination'] is None) == (args['outdir'] is None):
+            parser.error('give DESTINATION either as a positional argument '
+                         'or with -o')
+        if args['outdir'] is None:
+            args['outdir'] = args['destination']
+    else:
+        # --systems takes all the arguments that follow it, so the
+        # destination must be given with -o
+        if args['disc_clsfile'] is not None or \
+           args['destination'] is not None:
+            parser.error('with --systems, give the destination with -o and '
+                         'no positional arguments')
+        if args['outdir'] is None:
+            parser.error('--systems requires -o DESTINATION')
+        if not all(systems):
+            parser.error('empty file name given to --systems')
+        if len(set(map(path.basename, systems))) < len(systems):
+            parser.error('the files given to --systems must have distinct '
+                         'names')
+    del args['destination']
+    return args
+
+
+
+
+def main(prog, dataset, resource_dir, argv=None):
+    """
+    Run an evaluation from the command line of a driver.
+
+    Parameters
+    ----------
+    prog : string
+        name of the driver, for the help and the version
+    dataset : string
+        name of the dataset; its files in `resource_dir` are named
+        `<dataset>.phn`, `<dataset>.wrd`, `<dataset>.classes`, ...
+    resource_dir : string
+    argv : list of strings, optional
+        command line arguments, by default `sys.argv[1:]`
+
+    """
+    args = parse_args(prog, dataset, argv)
+
+    verbose = args['verbose']
+    n_jobs = args['n_jobs']
+    n_threads = args['n_threads']
+
+    dest = args['outdir']
+    if args['systems'] is None:
+        disc_clsfiles = [args['disc_clsfile']]
+        dests = [dest]
+    else:
+        disc_clsfiles = args['systems']
+        dests = [path.join(dest, path.basename(disc_clsfile))
+                 for disc_clsfile in disc_clsfiles]
+
+    resource = lambda ext: path.join(resource_dir,
+                                     '{0}.{1}'.format(dataset, ext))
+    fragments_cross_file  = resource('intervals.cross')
+    fragments_within_file = resource('intervals.within')
+    gold_clsfile          = resource('classes')
+    phn_corpus_file       = resource('phn')
+    wrd_corpus_file       = resource('wrd')
+    split_file            = resource('split')
+    pgold_file            = resource('pgold')
+
+    if verbose:
+        header = '{0} version {1}'.format(prog, VERSION)
+        print header
+        print '-' * len(header)
+        print 'dataset:     {0}'.format(dataset)
+        if args['systems'] is None:
+            print 'inputfile:   {0}'.format(disc_clsfiles[0])
+        else:
+            print 'systems:     {0} files'.format(len(disc_clsfiles))
+        print 'destination: {0}'.format(dest)
+        print
+
+    if verbose:
+        print banner('LOADING FILES')
+
+    wrd_corpus = load_wrd_corpus(wrd_corpus_file, verbose)
+    phn_corpus = load_phn_corpus(phn_corpus_file, verbose)
+
+    fragments_cross = load_fragments_cross(fragments_cross_file, verbose)
+    fragments_within = load_fragments_within(fragments_within_file, verbose)
+
+    truncate = args['truncate']
+    cache_dir = args['cache_dir']
+    gold_clsdict = load_gold(gold_clsfile, phn_corpus, phn_corpus_file,
+                             verbose, cache_dir)
+
+    measures = set(args['measures'])
+    gold = SharedData(gold_clsdict.compact())
+    phn = SharedData(phn_corpus)
+    wrd = SharedData(wrd_corpus)
+    pgold = None
+    try:
+        if len(measures) == 0 or 'match' in measures:
+            pgold = load_pgold(pgold_file, gold, fragments_within,
+                               fragments_cross,
+                               pgold_digest(gold_clsfile, phn_corpus_file,
+                                            fragments_cross_file,
+                                            fragments_within_file),
+                               verbose, cache_dir)
+        if args['systems'] is None:
+            evaluate(disc_clsfiles[0], dest, phn, wrd, gold, pgold,
+                     fragments_within, fragments_cross, phn_corpus_file,
+                     split_file, measures, truncate, verbose, n_jobs,
+                     n_threads, cache_dir)
+            failed = []
+        else:
+            failed = evaluate_systems(disc_clsfiles, dests, phn, wrd, gold,
+                                      pgold, fragments_within,
+                                      fragments_cross, phn_corpus_file,
+                                      split_file, measures, truncate,
+                                      verbose, n_jobs, n_threads, cache_dir)
+    finally:
+        for shared in (gold, phn, wrd, pgold):
+            if shared is not None:
+                shared.close()
+    for disc_clsfile, error in failed:
+        print banner('evaluation of {0} failed'.format(disc_clsfile))
+        print error
+    if failed:
+        sys.exit(1)
+    if verbose:
+        print 'All done. Results stored in {0}'.format(dest)
@@ -2,15 +2,28 @@
 
 """
 
-from itertools import combinations, chain, izip, izip_longest
+from itertools import izip
+import os
+import os.path as path
 import sys
+import tempfile
 import time
+import warnings
 
+import numpy as np
+import joblib
 from joblib import Parallel, delayed
 
 from tde.substrings.acss import allcommonsubstrings
+from tde.substrings.suffix_array import suffix_array, repeat_pairs
 from tde.data.fragment import FragmentToken
 from tde.data.interval import Interval
+from tde.data.pairs import PairIndex, PairSet
+from tde.data.sets import Pclus
+from tde.util.cache import file_digest
+
+# bump when the format of PgoldFolds changes
+PGOLD_VERSION = 1
 
 
 def extract_batch(tokens, ixs, minlength, maxlength):
@@ -88,54 +101,270 @@ def extract_single(tokens1, tokens2, minlength, maxlength, same):
     return r
 
 
+def _length_pairs(sa, lcp, utterance, length):
+    """Oriented position pairs of the repeated substrings of one length."""
+    first, second = repeat_pairs(sa, lcp, length)
+    # pairs within an utterance are found in both orders, as by
+    # `extract_single` with `same`
+    same = utterance[first] == utterance[second]
+    return (np.concatenate((first, second[same])),
+            np.concatenate((second, first[same])),
+            np.concatenate((same, np.ones(np.count_nonzero(same),
+                                          dtype=np.bool))))
+
+
 def extract_gold_fragments(tokenlists, minlength=3, maxlength=20,
-                           verbose=False, n_jobs=1, batch_size=10000):
+                           verbose=False, n_jobs=1, batch_size=None):
     """Extract the gold fragments.
 
+    Finds the same pairs as `extract_single` over all combinations of two
+    token lists and each token list with itself, but in one pass: the phone
+    sequences are concatenated, with a distinct separator after each, and
+    the repeated substrings of every length are read off a suffix array of
+    the concatenation.
+
     Parameters
     ----------
     tokenlists : list of lists of FragmentTokens
     minlength : int, optional
         Minimum length of fragments
+    maxlength : int, optional
+        Maximum length of fragments
     verbose : boolean
         Print information during processing.
+    n_jobs : int, optional
+        Number of parallel jobs, over the fragment lengths.
+    batch_size : int, optional
+        Deprecated and ignored; passing it issues a DeprecationWarning.
 
     Returns
     -------
-    l : list of (string, string, list of (list of string, Interval, Interval))
-        A list consisting of tuples of two filename identifiers and a list of
-        a phonesequence and the intervals in the two filenames
-
-    l : list of FragmentTokens
-
-    returns a list of (id1, id2, list of (phonseq, interval1, interval2)) tuples
-    where id1, id2 are wavfile identifiers, phonseq is the fragment as a list
-    of phones and interval1, interval2 are the time intervals in wavfile1 and
-    wavfile2 respectively
+    l : list of (FragmentToken, FragmentToken)
+        Pairs of fragments with the same phone sequence, in the order of the
+        combinations of token lists, then by position and length.
 
     """
-    # combinations of all tokens in fragment_type plus each token with itself
-    combos = chain(combinations(xrange(len(tokenlists)), r=2),
-                   izip(xrange(len(tokenlists)), xrange(len(tokenlists))))
+    if batch_size is not None:
+        warnings.warn('batch_size is ignored and will be removed',
+                      DeprecationWarning, stacklevel=2)
+    tokenlists = [tokens for tokens in tokenlists if len(tokens) > 0]
     if verbose:
-        total = sum(xrange(len(tokenlists)+1))
-        print 'Found {0} sequences. Extracting fragments from {1} combinations'.format(
-            len(tokenlists), total)
-        if verbose:
-            t0 = time.time()
+        print 'Found {0} sequences. Extracting fragments from {1} phones'\
+            .format(len(tokenlists), sum(map(len, tokenlists)))
+        t0 = time.time()
         sys.stdout.flush()
 
-    r = list(chain.from_iterable(Parallel(n_jobs=n_jobs,
-                                          pre_dispatch='2*n_jobs',
-                                          verbose=5 if verbose else 0)
-                                 (delayed(extract_batch)(tokenlists,
-                                                         ixs,
-                                                         minlength,
-                                                         maxlength)
-                                  for ixs in izip_longest(*([iter(combos)]
-                                                            * batch_size)))))
+    # one symbol per phone, one separator (negative) after each list
+    symbol_ids = {}
+    tokens = []
+    symbols = []
+    utterance = []
+    for u, tokenlist in enumerate(tokenlists):
+        for token in tokenlist:
+            tokens.append(token)
+            symbols.append(symbol_ids.setdefault(token.mark,
+                                                 len(symbol_ids)))
+            utterance.append(u)
+        tokens.append(None)
+        symbols.append(-(u + 1))
+        utterance.append(u)
+    symbols = np.array(symbols, dtype=np.int64)
+    utterance = np.array(utterance, dtype=np.int64)
+
+    sa, lcp = suffix_array(symbols, maxlength)
+    r = Parallel(n_jobs=n_jobs, verbose=5 if verbose else 0)\
+        (delayed(_length_pairs)(sa, lcp, utterance, length)
+         for length in xrange(minlength, maxlength + 1))
+    first = np.concatenate([np.zeros(0, dtype=np.int64)] +
+                           [x[0] for x in r])
+    second = np.concatenate([np.zeros(0, dtype=np.int64)] +
+                            [x[1] for x in r])
+    same = np.concatenate([np.zeros(0, dtype=np.bool)] + [x[2] for x in r])
+    lengths = np.concatenate([np.zeros(0, dtype=np.int64)] +
+                             [np.repeat(length, x[0].shape[0])
+                              for length, x in izip(xrange(minlength,
+                                                           maxlength + 1),
+                                                    r)])
+    order = np.lexsort((lengths, second, first,
+                        utterance[second], utterance[first], same))
+
+    fragments = {}
+    def fragment(position, length):
+        try:
+            return fragments[position, length]
+        except KeyError:
+            first_token = tokens[position]
+            f = FragmentToken(first_token.name,
+                              Interval(first_token.interval.start,
+                                       tokens[position+length-1].interval.end),
+                              tuple(t.mark
+                                    for t in tokens[position:position+length]))
+            fragments[position, length] = f
+            return f
+
+    r = [(fragment(p, l), fragment(q, l))
+         for p, q, l in izip(first[order].tolist(), second[order].tolist(),
+                             lengths[order].tolist())]
     if verbose:
         print '\rDone. Took {0:.3f} seconds.                           '.format(
             time.time() - t0)
-    r = [t for t in r if not t == []]
     return r
+
+
+def pgold_digest(gold_clsfile, corpus_file, cross_file, within_file):
+    """Digest of the inputs of the gold pairs of a dataset.
+
+    Parameters
+    ----------
+    gold_clsfile, corpus_file : string
+        Gold classes and the phone corpus they are annotated with.
+    cross_file, within_file : string
+        Folds.
+
+    Returns
+    -------
+    string
+
+    """
+    return file_digest([gold_clsfile, corpus_file, cross_file, within_file])
+
+
+class PgoldFolds(object):
+    """Gold pairs of every fold of a dataset, with their counts.
+
+    The gold pairs of a fold, their nmatch counts and their weights only
+    depend on the gold classes and the folds of a dataset, not on the
+    evaluated system. They are computed once per dataset with `build`, can be
+    stored with `save` and loaded memory-mapped with `load`, and `pgold`
+    hands them out as PairSets with the counts filled in, so that the
+    matching measure only has to count the discovered pairs.
+
+    Use `build` or `load` to construct.
+
+    Parameters
+    ----------
+    index : PairIndex
+        Index on the gold pairs of the whole dataset.
+    selections : dict from string to list of ndarray of ints
+        For each label of a list of folds, the positions in `index` of the
+        pairs of each fold.
+    nmatch_counts, weights : dict from string to list of ndarrays
+        For each label of a list of folds, the nmatch counts and weights of
+        the pairs of each fold, indexed by mark code.
+    digest : string, optional
+        Identifies the inputs the pairs were built from.
+
+    """
+    def __init__(self, index, selections, nmatch_counts, weights,
+                 digest=None):
+        self.version = PGOLD_VERSION
+        self.index = index
+        self.selections = selections
+        self.nmatch_counts = nmatch_counts
+        self.weights = weights
+        self.digest = digest
+
+    @classmethod
+    def build(cls, gold_clsdict, folds, digest=None, verbose=False):
+        """Compute the gold pairs of every fold.
+
+        Parameters
+        ----------
+        gold_clsdict : ClassDict
+        folds : dict from string to list of IntervalDB
+            Lists of folds, by label.
+        digest : string, optional
+        verbose : bool, optional
+
+        Returns
+        -------
+        PgoldFolds
+
+        """
+        index = PairIndex(Pclus(gold_clsdict))
+        selections, nmatch_counts, weights = {}, {}, {}
+        for label, interval_dbs in folds.iteritems():
+            if verbose:
+                print 'Counting the gold pairs of {0} {1} folds'.format(
+                    len(interval_dbs), label)
+            selections[label] = []
+            nmatch_counts[label] = []
+            weights[label] = []
+            for interval_db in interval_dbs:
+                pgold = index.restrict(interval_db)
+                selections[label].append(
+                    np.searchsorted(index.keys, pgold.sorted_keys()))
+                nmatch_counts[label].append(pgold.nmatch_counts())
+                weights[label].append(pgold.weight_array())
+        return cls(index, selections, nmatch_counts, weights, digest)
+
+    def pgold(self, label, fold):
+        """Gold pairs of a fold.
+
+        Parameters
+        ----------
+        label : string
+        fold : int
+            Position of the fold in its list.
+
+        Returns
+        -------
+        PairSet
+            Pairs in the table of the index, with this index, and with their
+            nmatch counts and weights precomputed.
+
+        """
+        index = self.index
+        selection = self.selections[label][fold]
+        pairs = PairSet(index.table, index.left[selection],
+                        index.right[selection], index)
+        pairs._sorted_keys = index.keys[selection]
+        pairs._nmatch_counts = self.nmatch_counts[label][fold]
+        pairs._weight_array = self.weights[label][fold]
+        return pairs
+
+    def save(self, fname):
+        """Write the pairs to a file.
+
+        The file is written to a temporary name first, so that readers never
+        see a partial file.
+
+        """
+        fd, tmpname = tempfile.mkstemp(suffix='.pgold',
+                                       dir=path.dirname(path.abspath(fname)))
+        os.close(fd)
+        try:
+            joblib.dump(self, tmpname)
+            os.rename(tmpname, fname)
+        except:
+            os.remove(tmpname)
+            raise
+
+    @classmethod
+    def load(cls, fname, digest=None, mmap=True):
+        """Read pairs written by `save`.
+
+        Parameters
+        ----------
+        fname : string
+        digest : string, optional
+            If given, the digest the pairs must have been built with.
+        mmap : bool, optional
+            Memory-map the arrays instead of reading them.
+
+        Returns
+        -------
+        PgoldFolds
+
+        Raises
+        ------
+        ValueError
+            If the file was written by another version, or for other inputs.
+
+        """
+        pgold_folds = joblib.load(fname, mmap_mode='r' if mmap else None)
+        if getattr(pgold_folds, 'version', None) != PGOLD_VERSION:
+            raise ValueError('version mismatch in {0}'.format(fname))
+        if digest is not None and pgold_folds.digest != digest:
+            raise ValueError('{0} was built from other inputs'.format(fname))
+        return pgold_folds
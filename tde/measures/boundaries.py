@@ -4,11 +4,21 @@ from collections import defaultdict
 
 import numpy as np
 
-from tde.util.functions import flatten
 
 class Boundaries(object):
     def __init__(self, container, threshold=0.03):
         self.threshold = threshold
+        if hasattr(container, 'token_arrays'):
+            # a Corpus: read the bounds off its arrays, by name
+            names, name_codes, starts, ends, _ = container.token_arrays()
+            codes = np.unique(name_codes)
+            lo = np.searchsorted(name_codes, codes, side='left')
+            hi = np.searchsorted(name_codes, codes, side='right')
+            self.length = name_codes.shape[0]
+            self.bounds = {
+                names[c]: np.unique(np.concatenate((starts[l:h], ends[l:h])))
+                for c, l, h in zip(codes.tolist(), lo.tolist(), hi.tolist())}
+            return
         if hasattr(container, 'iter_fragments'):
             iterator = container.iter_fragments()
         else:
@@ -17,14 +27,13 @@ class Boundaries(object):
         bounds = defaultdict(list)
         length = 0
         for fragment in iterator:
-            bounds[fragment.name].append(fragment.interval)
+            interval = fragment.interval
+            bounds[fragment.name].extend((interval.start, interval.end))
             length += 1
         self.length = length
         self.bounds = {}
-        for name, intervals in bounds.iteritems():
-            points = set(flatten((interval.start, interval.end)
-                                  for interval in intervals))
-            self.bounds[name] = np.sort(np.array(list(points)))
+        for name, points in bounds.iteritems():
+            self.bounds[name] = np.unique(np.array(points, dtype=np.double))
 
     def __len__(self):
         return self.length
@@ -46,27 +55,57 @@ class Boundaries(object):
             b = np.abs(found_point - query_point) < self.threshold
         return b
 
+    def has_close_many(self, name, query_points):
+        """
+        Vectorized `has_close` over the query points of a file.
+
+        Parameters
+        ----------
+        name : string
+        query_points : ndarray of floats
+
+        Returns
+        -------
+        ndarray of bools
+            Whether a boundary of `name` lies within the threshold of each
+            query point.
+
+        """
+        query_points = np.asarray(query_points, dtype=np.double)
+        if not name in self.bounds:
+            return np.zeros(query_points.shape, dtype=np.bool)
+        points = self.bounds[name]
+        ix = np.searchsorted(points, query_points, side='left')
+        # distance to the neighbours on either side, infinite past the ends
+        left = np.full(query_points.shape, np.inf)
+        right = np.full(query_points.shape, np.inf)
+        has_left = ix > 0
+        has_right = ix < points.shape[0]
+        left[has_left] = query_points[has_left] - points[ix[has_left] - 1]
+        right[has_right] = points[ix[has_right]] - query_points[has_right]
+        return np.minimum(left, right) < self.threshold
+
     def __iter__(self):
         for name, points in self.bounds.iteritems():
             for point in points:
                 yield name, point
 
+def _close_fraction(queries, reference):
+    """Fraction of the boundaries in `queries` close to one in `reference`.
+    """
+    close = 0
+    total = 0
+    for name, points in queries.bounds.iteritems():
+        close += np.count_nonzero(reference.has_close_many(name, points))
+        total += points.shape[0]
+    if total > 0:
+        return np.double(close) / total
+    return np.nan
+
+
 def eval_from_bounds(disc, gold):
-    gold_close = np.fromiter((gold.has_close(n, p)
-                              for n, p in disc),
-                             dtype=np.bool)
-    if gold_close.shape[0] > 0:
-        prec = gold_close.mean()
-    else:
-        prec = np.nan
-
-    disc_close = np.fromiter((disc.has_close(n, p)
-                              for n, p in gold),
-                             dtype=np.bool)
-    if disc_close.shape[0] > 0:
-        rec = disc_close.mean()
-    else:
-        rec = np.nan
+    prec = _close_fraction(disc, gold)
+    rec = _close_fraction(gold, disc)
     return prec, rec
 
 
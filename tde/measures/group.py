@@ -17,17 +17,13 @@
 from __future__ import division
 from pprint import pformat
 
-import numpy as np
-
-from tde.data.sets import Pclus_single, Pgoldclus, typeset, weights, nmatch
+from tde.data.sets import Pclus_single, Pgoldclus, typeset, weighted_ratio
+from tde.data.pairs import FragmentTable
 from tde.util.printing import verb_print, banner, pretty_pairs
-from tde.util.functions import intersection
 
 def make_pclus(disc_clsdict, verbose, debug):
     with verb_print('constructing pclus', verbose, True, True):
-        pclus = list(tuple(sorted((f1, f2),
-                             key=lambda f: (f.name, f.interval.start)))
-                     for f1, f2 in Pclus_single(disc_clsdict))
+        pclus = Pclus_single(disc_clsdict)
     if debug:
         print banner('PCLUS ({0})'.format(len(pclus)))
         print pretty_pairs(pclus)
@@ -36,9 +32,8 @@ def make_pclus(disc_clsdict, verbose, debug):
 
 def make_pgoldclus(disc_clsdict, verbose, debug):
     with verb_print('constructing pgoldclus', verbose, True, True):
-        pgoldclus = list(Pgoldclus(disc_clsdict))
+        pgoldclus = Pgoldclus(disc_clsdict)
     if debug:
-        pgoldclus = list(pgoldclus)
         print banner('PGOLDCLUS ({0})'.format(len(pgoldclus)))
         print pretty_pairs(pgoldclus)
         print
@@ -55,47 +50,51 @@ def make_typeset(pclus, verbose, debug):
 
 def make_weights(pclus, verbose, debug):
     with verb_print('constructing weights', verbose, True, True):
-        ws = weights(pclus)
+        ws = pclus.weight_array()
     if debug:
         print banner('WEIGHTS')
-        print pformat(ws)
+        print pformat(pclus.table.label_counts(ws))
         print
     return ws
 
 def make_pclus_pgoldclus_nmatch(pclus, pgoldclus, verbose, debug):
     with verb_print('making pclus/pgoldclus nmatch', verbose, True, True):
-        pclus_pgoldclus_intersect = list(intersection(pclus, pgoldclus))
-        pclus_pgoldclus_nmatch = nmatch(pclus_pgoldclus_intersect)
+        pclus_pgoldclus_intersect = pgoldclus.intersection(pclus)
+        pclus_pgoldclus_nmatch = pclus_pgoldclus_intersect.nmatch_counts()
     if debug:
         print banner('NMATCH(PCLUS/PGOLDCLUS)')
-        print pformat(pclus_pgoldclus_nmatch)
+        print pformat(pgoldclus.table.label_counts(pclus_pgoldclus_nmatch))
         print
     return pclus_pgoldclus_nmatch
 
 def make_pclus_nmatch(pclus, verbose, debug):
     with verb_print('constructing pclus nmatch', verbose, True, True):
-        pclus_nmatch = nmatch(pclus)
+        pclus_nmatch = pclus.nmatch_counts()
     if debug:
         print banner('NMATCH(PCLUS)')
-        print pformat(pclus_nmatch)
+        print pformat(pclus.table.label_counts(pclus_nmatch))
         print
     return pclus_nmatch
 
 def make_pgoldclus_nmatch(pgoldclus, verbose, debug):
     with verb_print('constructing pgoldclus_nmatch', verbose, True, True):
-        pgoldclus_nmatch = nmatch(pgoldclus)
+        pgoldclus_nmatch = pgoldclus.nmatch_counts()
     if debug:
         print banner('NMATCH(PGOLDCLUS)')
-        print pformat(pgoldclus_nmatch)
+        print pformat(pgoldclus.table.label_counts(pgoldclus_nmatch))
         print
     return pgoldclus_nmatch
 
 def evaluate_group(disc_clsdict, verbose=False, debug=False):
-    pclus = make_pclus(disc_clsdict, verbose, debug)
-    pgoldclus = make_pgoldclus(disc_clsdict, verbose, debug)
+    # pclus and pgoldclus share one fragment table, so that their mark codes
+    # line up and the scores reduce to sums over arrays indexed by mark code
+    table = FragmentTable.from_clsdict(disc_clsdict)
+    pclus = make_pclus(table, verbose, debug)
+    pgoldclus = make_pgoldclus(table, verbose, debug)
 
-    ts_disc = make_typeset(pclus, verbose, debug)
-    ts_gold = make_typeset(pgoldclus, verbose, debug)
+    if debug:
+        make_typeset(pclus, verbose, debug)
+        make_typeset(pgoldclus, verbose, debug)
 
     pclus_pgoldclus_nmatch = make_pclus_pgoldclus_nmatch(pclus,
                                                          pgoldclus,
@@ -107,16 +106,7 @@ def evaluate_group(disc_clsdict, verbose=False, debug=False):
     ws_disc = make_weights(pclus, verbose, debug)
     ws_gold = make_weights(pgoldclus, verbose, debug)
 
-    if len(pclus_nmatch) == 0:
-        prec = np.nan
-    else:
-        prec = sum(ws_disc[t] * pclus_pgoldclus_nmatch[t] / pclus_nmatch[t]
-                   for t in ts_disc if pclus_nmatch[t] > 0)
-
-    if len(pgoldclus_nmatch) == 0:
-        rec = np.nan
-    else:
-        rec = sum(ws_gold[t] * pclus_pgoldclus_nmatch[t] / pgoldclus_nmatch[t]
-                  for t in ts_gold if pgoldclus_nmatch[t] > 0)
+    prec = weighted_ratio(ws_disc, pclus_pgoldclus_nmatch, pclus_nmatch)
+    rec = weighted_ratio(ws_gold, pclus_pgoldclus_nmatch, pgoldclus_nmatch)
 
     return prec, rec
@@ -8,14 +8,16 @@ from pprint import pformat
 
 import numpy as np
 
-from tde.data.sets import Pclus, Psubs, nmatch, typeset, weights
+from tde.data.sets import Pclus, Psubs, nmatch, typeset, weights, \
+    weighted_ratio
+from tde.data.pairs import PairSet, PairIndex
 from tde.util.printing import banner, verb_print, pretty_pairs
 from tde.util.functions import intersection
 
 
 def make_pgold(gold_clsdict, verbose, debug):
     with verb_print('constructing pgold set', verbose, True, True):
-        pgold = list(Pclus(gold_clsdict))
+        pgold = Pclus(gold_clsdict)
     if debug:
         print banner('PGOLD ({0})'.format(len(pgold)))
         print pretty_pairs(pgold)
@@ -23,9 +25,18 @@ def make_pgold(gold_clsdict, verbose, debug):
     return pgold
 
 
+def make_pgold_index(gold_clsdict, verbose, debug):
+    with verb_print('constructing pgold index', verbose, True, True):
+        pgold_index = PairIndex(Pclus(gold_clsdict))
+    if debug:
+        print banner('PGOLD INDEX ({0})'.format(len(pgold_index)))
+        print
+    return pgold_index
+
+
 def make_pdisc(disc_clsdict, verbose, debug):
     with verb_print('constructing pdisc set', verbose, True, True):
-        pdisc = list(Pclus(disc_clsdict))
+        pdisc = Pclus(disc_clsdict)
     if debug:
         print banner('PDISC ({0})'.format(len(pdisc)))
         print pretty_pairs(pdisc)
@@ -34,10 +45,10 @@ def make_pdisc(disc_clsdict, verbose, debug):
 
 
 def make_psubs(disc_clsdict, corpus, minlength, maxlength,
-               verbose, debug):
+               verbose, debug, n_jobs=1):
     with verb_print('constructing psubs set', verbose, True, True):
-        psubs = list(Psubs(disc_clsdict, corpus, minlength=minlength,
-                           maxlength=maxlength))
+        psubs = Psubs(disc_clsdict, corpus, minlength=minlength,
+                      maxlength=maxlength, n_jobs=n_jobs)
     if debug:
         print banner('PSUBS ({0})'.format(len(psubs)))
         print pretty_pairs(psubs)
@@ -96,7 +107,77 @@ def make_pgold_nmatch(pgold, verbose, debug):
             print k, v
     return nmatch_gold
 
+def make_intersection_nmatch(pairs, other, name, verbose, debug):
+    with verb_print('making {0} nmatch'.format(name.lower()),
+                    verbose, True, True):
+        nmatch_counts = pairs.intersection(other).nmatch_counts()
+    if debug:
+        print banner('NMATCH({0})'.format(name))
+        print pformat(pairs.table.label_counts(nmatch_counts))
+        print
+    return nmatch_counts
+
+
+def make_nmatch_counts(pairs, name, verbose, debug):
+    with verb_print('making {0} nmatch'.format(name.lower()),
+                    verbose, True, True):
+        nmatch_counts = pairs.nmatch_counts()
+    if debug:
+        print banner('NMATCH({0})'.format(name))
+        print pformat(pairs.table.label_counts(nmatch_counts))
+        print
+    return nmatch_counts
+
+
+def make_weight_array(pairs, name, verbose, debug):
+    with verb_print('making weights', verbose, True, True):
+        ws = pairs.weight_array()
+    if debug:
+        print banner('WEIGHTS({0})'.format(name))
+        print pformat(pairs.table.label_counts(ws))
+        print
+    return ws
+
+
+def eval_from_pairsets(pgold, psubs, verbose=False, debug=False):
+    """
+    Matching score from PairSets.
+
+    All counts are arrays indexed by mark code. The intersection of psubs
+    and pgold is counted twice, in the mark codes of psubs for the precision
+    and in those of pgold for the recall, so the two tables need not share
+    their marks.
+
+    Parameters
+    ----------
+    pgold, psubs : PairSet
+
+    Returns
+    -------
+    prec, rec : float
+        np.nan if the respective set is empty.
+
+    """
+    psubs_pgold_nmatch = make_intersection_nmatch(psubs, pgold, 'PSUBS/PGOLD',
+                                                  verbose, debug)
+    pgold_psubs_nmatch = make_intersection_nmatch(pgold, psubs, 'PGOLD/PSUBS',
+                                                  verbose, debug)
+
+    psubs_nmatch = make_nmatch_counts(psubs, 'PSUBS', verbose, debug)
+    pgold_nmatch = make_nmatch_counts(pgold, 'PGOLD', verbose, debug)
+
+    ws_disc = make_weight_array(psubs, 'PSUBS', verbose, debug)
+    ws_gold = make_weight_array(pgold, 'PGOLD', verbose, debug)
+
+    prec = weighted_ratio(ws_disc, psubs_pgold_nmatch, psubs_nmatch)
+    rec = weighted_ratio(ws_gold, pgold_psubs_nmatch, pgold_nmatch)
+    return prec, rec
+
+
 def eval_from_psets(pdisc, pgold, psubs, verbose=False, debug=False):
+    if isinstance(pgold, PairSet) and isinstance(psubs, PairSet):
+        return eval_from_pairsets(pgold, psubs, verbose, debug)
+
     ts_disc = make_typeset(psubs, verbose, debug)
     ts_gold = make_typeset(pgold, verbose, debug)
 
@@ -9,13 +9,15 @@ from pprint import pformat
 import numpy as np
 
 from tde.data.sets import Pclus, Psubs, nmatch, typeset, weights
+from tde.data.pairs import PairSet
+from tde.measures.match import eval_from_pairsets
 from tde.util.printing import banner, verb_print, pretty_pairs
 from tde.util.functions import intersection
 
 
 def make_pgold(gold_clsdict, verbose, debug):
     with verb_print('constructing pgold set', verbose, True, True):
-        pgold = list(Pclus(gold_clsdict))
+        pgold = Pclus(gold_clsdict)
     if debug:
         print banner('PGOLD ({0})'.format(len(pgold)))
         print pretty_pairs(pgold)
@@ -25,7 +27,7 @@ def make_pgold(gold_clsdict, verbose, debug):
 
 def make_pdisc(disc_clsdict, verbose, debug):
     with verb_print('constructing pdisc set', verbose, True, True):
-        pdisc = list(Pclus(disc_clsdict))
+        pdisc = Pclus(disc_clsdict)
     if debug:
         print banner('PDISC ({0})'.format(len(pdisc)))
         print pretty_pairs(pdisc)
@@ -36,8 +38,8 @@ def make_pdisc(disc_clsdict, verbose, debug):
 def make_psubs(disc_clsdict, corpus, minlength, maxlength,
                verbose, debug):
     with verb_print('constructing psubs set', verbose, True, True):
-        psubs = list(Psubs(disc_clsdict, corpus, minlength=minlength,
-                           maxlength=maxlength))
+        psubs = Psubs(disc_clsdict, corpus, minlength=minlength,
+                      maxlength=maxlength)
     if debug:
         print banner('PSUBS ({0})'.format(len(psubs)))
         print pretty_pairs(psubs)
@@ -97,6 +99,14 @@ def make_pgold_nmatch(pgold, verbose, debug):
     return nmatch_gold
 
 def eval_from_psets(pdisc, pgold, psubs, verbose=False, debug=False):
+    if isinstance(pgold, PairSet) and isinstance(psubs, PairSet):
+        prec, rec = eval_from_pairsets(pgold, psubs, verbose, debug)
+        if not np.isfinite(prec):
+            prec = 0.
+        if not np.isfinite(rec):
+            rec = 0.
+        return prec, rec
+
     ts_disc = make_typeset(psubs, verbose, debug)
     ts_gold = make_typeset(pgold, verbose, debug)
 
@@ -1,59 +1,95 @@
 from __future__ import division
 
-from collections import defaultdict
-
 import numpy as np
 
-from tde.substrings.levenshtein import distance
+from tde.substrings.levenshtein import distance, distance_batch
+from tde.data.classes import CompactClassDict
 from tde.data.interval import Interval
+from tde.data.pairs import within_pairs
 
-def NED(clsdict):
-    neds = np.fromiter((ned(f1.mark, f2.mark)
-                        for f1, f2 in clsdict.iter_pairs(within=True,
-                                                         order=False)),
-                       dtype=np.double)
-    if len(neds) == 0:
-        r = np.nan
-    else:
-        r = neds.mean()
-    return r
+def NED(clsdict, n_threads=1):
+    """Mean normalized edit distance between the marks of the pairs in
+    `clsdict.iter_pairs(within=True, order=False)`.
 
-class Node(object):
-    def __init__(self, value):
-        self.value = value
-        self.links = set()
+    The distinct marks are encoded once into a flat symbol buffer and the
+    distances of all pairs are computed in a single call to
+    `distance_batch`.
 
-    def add_link(self, other):
-        self.links.add(other)
-        other.links.add(self)
+    Parameters
+    ----------
+    clsdict : ClassDict
+    n_threads : int, optional
+        Number of threads for the edit distances.
 
-def connected(nodes):
+    Returns
+    -------
+    float
+        np.nan if there are no pairs.
+
+    """
+    pairs = within_pairs(clsdict, order=False)
+    if len(pairs) == 0:
+        return np.nan
+    table = pairs.table
+    codes, inverse = np.unique(np.concatenate((
+        table.mark_codes[pairs.left], table.mark_codes[pairs.right])),
+                               return_inverse=True)
+    symbol2ix = {}
+    marks = [[symbol2ix.setdefault(s, len(symbol2ix))
+              for s in table.marks[c]]
+             for c in codes.tolist()]
+    lengths = np.fromiter((len(m) for m in marks), dtype=np.int64,
+                          count=len(marks))
+    offsets = np.concatenate(([0], np.cumsum(lengths)))
+    symbols = np.fromiter((s for m in marks for s in m), dtype=np.uint32,
+                          count=offsets[-1])
+    left, right = inverse[:len(pairs)], inverse[len(pairs):]
+    neds = distance_batch(symbols, offsets, left, right, n_threads) / \
+        np.maximum(lengths[left], lengths[right])
+    return neds.mean()
+
+def collapse_arrays(name_codes, starts, ends):
     """
-    Yield connected groups in a set of nodes.
+    Compute the union of the intervals of several files.
 
-    Simple linked-list implementation of Connected-Components (CLSR p.564)
+    The intervals are sorted by file and start, then swept once: an interval
+    joins the current union if it starts before the furthest end seen so far
+    in its file, or is adjacent to it, with the tolerance of
+    `Interval.is_adjacent`.
 
     Parameters
     ----------
-    nodes : list of Nodes
+    name_codes : ndarray of ints
+        File of each interval.
+    starts, ends : ndarray of floats
 
     Returns
     -------
-    Iterator over lists of Nodes
+    name_codes, starts, ends : ndarrays
+        The union of the intervals of each file, sorted by file and start.
+
     """
-    nodes = set(nodes)
-    while nodes:
-        n = nodes.pop()
-        group = {n}
-        queue = [n]
-        while queue:
-            n = queue.pop(0)
-            neighbors = n.links
-            neighbors -= group
-            nodes -= neighbors
-            group.update(neighbors)
-            queue.extend(neighbors)
-        yield group
+    name_codes = np.asarray(name_codes, dtype=np.int64)
+    starts = np.asarray(starts, dtype=np.double)
+    ends = np.asarray(ends, dtype=np.double)
+    if name_codes.shape[0] == 0:
+        return name_codes, starts, ends
+    order = np.lexsort((starts, name_codes))
+    name_codes, starts, ends = name_codes[order], starts[order], ends[order]
+    # running maximum of the ends within each file, on the ranks of the ends
+    # offset by file so that it does not carry over from the previous file
+    values, ranks = np.unique(ends, return_inverse=True)
+    _, files = np.unique(name_codes, return_inverse=True)
+    offsets = files.astype(np.int64) * values.shape[0]
+    furthest = values[np.maximum.accumulate(offsets + ranks) - offsets]
+    first = np.ones(starts.shape[0], dtype=np.bool)
+    first[1:] = (name_codes[1:] != name_codes[:-1]) | \
+        ~((starts[1:] <= furthest[:-1]) |
+          np.isclose(furthest[:-1], starts[1:]))
+    heads = np.flatnonzero(first)
+    return name_codes[heads], starts[heads], \
+        np.maximum.reduceat(ends, heads)
+
 
 def collapse(intervals):
     """
@@ -61,6 +97,7 @@ def collapse(intervals):
 
     The union of intervals is defined as the set-theoretic union
     for intervals that overlap and concatenation for intervals that don't.
+    Intervals that are adjacent, as in `Interval.is_adjacent`, are merged.
 
     Parameters
     ----------
@@ -69,23 +106,14 @@ def collapse(intervals):
     Returns
     -------
     list of Intervals
+        Sorted by start.
 
     """
-    intervals = sorted(intervals, key=lambda x: x.start)
-    nodes = [Node(i) for i in intervals]
-    for i in xrange(len(intervals)):
-        for j in xrange(i+1, len(intervals)):
-            i1 = intervals[i]
-            i2 = intervals[j]
-            if not i2.is_right_adjacent_to(i1) and i2.start > i1.end:
-                break
-            if i1.overlap(i2) > 0 or i1.is_adjacent(i2):
-                nodes[i].add_link(nodes[j])
-    r = []
-    for c in connected(nodes):
-        starts, ends = zip(*(node.value for node in c))
-        r.append(Interval(min(starts), max(ends)))
-    return sorted(r, key=lambda x: x.start)
+    _, starts, ends = collapse_arrays(
+        np.zeros(len(intervals), dtype=np.int64),
+        [i.start for i in intervals], [i.end for i in intervals])
+    return [Interval(start, end)
+            for start, end in zip(starts.tolist(), ends.tolist())]
 
 
 def cover(clsdict):
@@ -100,11 +128,17 @@ def cover(clsdict):
     float
         Absolute coverage
     """
-    c = defaultdict(list)
-    for f in clsdict.iter_fragments():
-        c[f.name].append(f.interval)
-    c = {k: collapse(v) for k, v in c.iteritems()}
-    return sum(interval.length() for v in c.itervalues() for interval in v)
+    if isinstance(clsdict, CompactClassDict):
+        name_codes, starts, ends = \
+            clsdict.name_codes, clsdict.starts, clsdict.ends
+    else:
+        codes = {}
+        fragments = list(clsdict.iter_fragments())
+        name_codes = [codes.setdefault(f.name, len(codes)) for f in fragments]
+        starts = [f.interval.start for f in fragments]
+        ends = [f.interval.end for f in fragments]
+    _, starts, ends = collapse_arrays(name_codes, starts, ends)
+    return (ends - starts).sum()
 
 
 def coverage(disc_clsdict, gold_clsdict):
@@ -2,37 +2,75 @@
 
 from __future__ import division
 
+from itertools import izip
+
 import numpy as np
 
+from tde.data.classes import CompactClassDict
+from tde.data.interval import Interval
 from tde.util.printing import verb_print
-from tde.util.functions import unique, iterator_length
+
+# maximum distance in seconds between the bounds of a discovered fragment
+# and those of the word it hits
+TOLERANCE = 0.03
+
+
+def _fragment_arrays(clsdict):
+    """Names and intervals of the fragments of a ClassDict."""
+    if isinstance(clsdict, CompactClassDict):
+        # a fragment listed in several classes counts once, as in
+        # `iter_fragments`
+        keys = (clsdict.mark_codes, clsdict.ends, clsdict.starts,
+                clsdict.name_codes)
+        order = np.lexsort(keys)
+        new = np.ones(order.shape[0], dtype=np.bool)
+        if order.shape[0] > 0:
+            new[1:] = False
+            for key in keys:
+                key = key[order]
+                new[1:] |= key[1:] != key[:-1]
+        first = np.sort(order[new])
+        names = [clsdict.names[c] for c in clsdict.name_codes[first].tolist()]
+        starts, ends = clsdict.starts[first], clsdict.ends[first]
+    else:
+        fragments = list(clsdict.iter_fragments())
+        names = [f.name for f in fragments]
+        starts = np.fromiter((f.interval.start for f in fragments),
+                             dtype=np.double, count=len(fragments))
+        ends = np.fromiter((f.interval.end for f in fragments),
+                           dtype=np.double, count=len(fragments))
+    return names, starts, ends
+
 
 def evaluate_token_type(disc_clsdict, wrd_corpus,
                         verbose=False, debug=False):
-    n_word_tokens = iterator_length(unique(wrd_corpus.iter_fragments()))
-    word_types = set(f.mark for f in wrd_corpus.iter_fragments())
-    n_word_types = len(word_types)
-    n_disc_fragments = iterator_length(disc_clsdict.iter_fragments())
+    n_word_tokens, n_word_types = wrd_corpus.token_counts()
+    names, disc_starts, disc_ends = _fragment_arrays(disc_clsdict)
+    n_disc_fragments = len(names)
 
     with verb_print('querying words', verbose, True, True, True):
-        types_hit = set()
-        types_seen = set()
-        hits = 0
-        for disc_fragment in disc_clsdict.iter_fragments():
-            disc_start = disc_fragment.interval.start
-            disc_end = disc_fragment.interval.end
-            wrd_tokens = wrd_corpus.tokens(disc_fragment.name,
-                                           disc_fragment.interval)
-            types_seen.add(tuple(f.mark for f in wrd_tokens))
-            if len(wrd_tokens) != 1:
-                continue
-            goldtok = wrd_tokens[0]
-            if abs(goldtok.interval.start - disc_start) > 0.03:
-                continue
-            if abs(goldtok.interval.end - disc_end) > 0.03:
-                continue
-            types_hit.add(goldtok.mark)
-            hits += 1
+        _, _, wrd_starts, wrd_ends, wrd_ids = wrd_corpus.token_arrays()
+        start, stop = wrd_corpus.tokens_many(
+            names, [Interval(s, e) for s, e in izip(disc_starts.tolist(),
+                                                    disc_ends.tolist())])
+        missing = start < 0
+        if np.any(missing):
+            # raise the error of the first fragment that is not found
+            i = np.argmax(missing)
+            wrd_corpus.tokens(names[i], Interval(disc_starts[i].item(),
+                                                 disc_ends[i].item()))
+        ids = wrd_ids.tolist()
+        types_seen = set(tuple(ids[lo:hi])
+                         for lo, hi in izip(start.tolist(), stop.tolist()))
+
+        # fragments covering a single word with both bounds within tolerance
+        single = np.nonzero(stop - start == 1)[0]
+        goldtok = start[single]
+        hit = (np.abs(wrd_starts[goldtok] - disc_starts[single])
+               <= TOLERANCE) & \
+            (np.abs(wrd_ends[goldtok] - disc_ends[single]) <= TOLERANCE)
+        hits = int(hit.sum())
+        types_hit = np.unique(wrd_ids[goldtok[hit]])
 
     if n_disc_fragments == 0:
         token_prec = np.nan
@@ -1,28 +1,97 @@
 import numpy as np
 cimport numpy as np
 cimport cython
+from cython.parallel import prange, threadid
 ITYPE=np.uint32
 ctypedef np.uint32_t ITYPE_t
+OTYPE=np.int64
+ctypedef np.int64_t OTYPE_t
 
-cdef inline ITYPE_t int_min(ITYPE_t a, ITYPE_t b): return a if a <= b else b
-cdef inline ITYPE_t int_min3(ITYPE_t a, ITYPE_t b, ITYPE_t c):
+cdef inline ITYPE_t int_min(ITYPE_t a, ITYPE_t b) nogil: return a if a <= b else b
+cdef inline ITYPE_t int_min3(ITYPE_t a, ITYPE_t b, ITYPE_t c) nogil:
     return int_min(int_min(a, b), c)
 
+
 @cython.boundscheck(False)
-def distance(np.ndarray[ITYPE_t, ndim=1] XA, np.ndarray[ITYPE_t, ndim=1] XB):
-    cdef ITYPE_t mA, mB, i, j
-    mA = XA.shape[0]
-    mB = XB.shape[0]
-    cdef np.ndarray[ITYPE_t, ndim=2] H = np.zeros((mA+1, mB+1), dtype=ITYPE)
-    H[:, 0] = np.arange(0, mA+1)
-    H[0, :] = np.arange(0, mB+1)
-
-    for i in xrange(1, mA+1):
-        for j in xrange(1, mB+1):
+@cython.wraparound(False)
+cdef ITYPE_t _distance(ITYPE_t* XA, Py_ssize_t mA,
+                       ITYPE_t* XB, Py_ssize_t mB,
+                       ITYPE_t* row) nogil:
+    # levenshtein distance with a single row of length mB+1; `diag` holds
+    # the previous row's value at j-1
+    cdef Py_ssize_t i, j
+    cdef ITYPE_t diag, up
+    for j in range(mB+1):
+        row[j] = j
+    for i in range(1, mA+1):
+        diag = row[0]
+        row[0] = i
+        for j in range(1, mB+1):
+            up = row[j]
             if XA[i-1] == XB[j-1]:
-                H[i, j] = H[i-1, j-1]
+                row[j] = diag
             else:
-                H[i, j] = int_min3(H[i-1, j] + 1,
-                                   H[i, j-1] + 1,
-                                   H[i-1, j-1] + 1)
-    return H[mA, mB]
+                row[j] = int_min3(up, row[j-1], diag) + 1
+            diag = up
+    return row[mB]
+
+
+def distance(np.ndarray[ITYPE_t, ndim=1] XA, np.ndarray[ITYPE_t, ndim=1] XB):
+    XA = np.ascontiguousarray(XA)
+    XB = np.ascontiguousarray(XB)
+    cdef np.ndarray[ITYPE_t, ndim=1] row = np.empty(XB.shape[0]+1,
+                                                    dtype=ITYPE)
+    return _distance(<ITYPE_t*>XA.data, XA.shape[0],
+                     <ITYPE_t*>XB.data, XB.shape[0],
+                     <ITYPE_t*>row.data)
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+def distance_batch(ITYPE_t[::1] symbols, OTYPE_t[::1] offsets,
+                   OTYPE_t[::1] left, OTYPE_t[::1] right,
+                   int n_threads=1):
+    """Levenshtein distances between many pairs of sequences.
+
+    Parameters
+    ----------
+    symbols : ndarray of uint32
+        All sequences, concatenated.
+    offsets : ndarray of int64
+        Sequence k is symbols[offsets[k]:offsets[k+1]].
+    left, right : ndarray of int64
+        Sequence indices of the pairs.
+    n_threads : int, optional
+        Number of OpenMP threads.
+
+    Returns
+    -------
+    ndarray of uint32
+        Distance for each pair.
+
+    """
+    cdef Py_ssize_t n, k, a, b, maxlen
+    n = left.shape[0]
+    if right.shape[0] != n:
+        raise ValueError('left and right must have the same length')
+    if n_threads < 1:
+        raise ValueError('n_threads must be positive')
+    cdef np.ndarray[ITYPE_t, ndim=1] r = np.zeros(n, dtype=ITYPE)
+    if n == 0:
+        return r
+    if (min(np.min(left), np.min(right)) < 0 or
+            max(np.max(left), np.max(right)) >= offsets.shape[0] - 1):
+        raise IndexError('sequence index out of range')
+    maxlen = np.max(np.diff(offsets)) if offsets.shape[0] > 1 else 0
+    cdef ITYPE_t[::1] out = r
+    # one row buffer per thread
+    cdef ITYPE_t[:, ::1] rows = np.empty((n_threads, maxlen+1), dtype=ITYPE)
+    cdef ITYPE_t* buf = &symbols[0] if symbols.shape[0] > 0 else NULL
+    for k in prange(n, nogil=True, num_threads=n_threads,
+                    schedule='guided'):
+        a = left[k]
+        b = right[k]
+        out[k] = _distance(buf + offsets[a], offsets[a+1] - offsets[a],
+                           buf + offsets[b], offsets[b+1] - offsets[b],
+                           &rows[threadid(), 0])
+    return r
@@ -0,0 +1,132 @@
+"""Repeated substrings from a suffix array.
+
+Functions
+---------
+suffix_array
+    Suffix array and longest common prefixes of a sequence of symbols.
+repeats
+    Groups of positions at which the same substring occurs.
+repeat_pairs
+    Pairs of positions at which the same substring occurs.
+
+"""
+
+import numpy as np
+
+
+def suffix_array(s, depth):
+    """
+    Suffix array and longest common prefixes of a sequence of symbols.
+
+    Suffixes are sorted on their first `depth` symbols only, by prefix
+    doubling, and the common prefixes are capped at `depth`, which is all
+    that is needed to find repeated substrings of at most `depth` symbols.
+
+    Parameters
+    ----------
+    s : ndarray of ints
+        Symbols.
+    depth : int
+        Number of symbols to sort on.
+
+    Returns
+    -------
+    sa : ndarray of ints
+        Start positions of the suffixes, in sorted order.
+    lcp : ndarray of ints
+        Length of the common prefix of the suffixes at sa[i-1] and sa[i],
+        capped at `depth`. lcp[0] is 0.
+
+    """
+    s = np.asarray(s)
+    n = s.shape[0]
+    if n == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    _, rank = np.unique(s, return_inverse=True)
+    rank = rank.astype(np.int64)
+    k = 1
+    while k < depth and rank.max() < n - 1:
+        nxt = np.full(n, -1, dtype=np.int64)
+        nxt[:n-k] = rank[k:]
+        order = np.lexsort((nxt, rank))
+        new = np.ones(n, dtype=np.bool)
+        new[1:] = ((np.diff(rank[order]) != 0) |
+                   (np.diff(nxt[order]) != 0))
+        rank[order] = np.cumsum(new) - 1
+        k *= 2
+    sa = np.argsort(rank, kind='mergesort')
+
+    lcp = np.zeros(n, dtype=np.int64)
+    a, b = sa[:-1], sa[1:]
+    alive = np.ones(n - 1, dtype=np.bool)
+    for k in xrange(depth):
+        alive &= (a + k < n) & (b + k < n)
+        alive[alive] = s[a[alive] + k] == s[b[alive] + k]
+        if not np.any(alive):
+            break
+        lcp[1:] += alive
+    return sa, lcp
+
+
+def repeats(sa, lcp, length):
+    """
+    Groups of positions at which the same substring occurs.
+
+    Parameters
+    ----------
+    sa, lcp : ndarray of ints
+        Output of `suffix_array`, with a depth of at least `length`.
+    length : int
+        Length of the substrings.
+
+    Returns
+    -------
+    positions : ndarray of ints
+        Start positions of the repeated substrings of `length` symbols,
+        grouped by substring and in increasing order within a group.
+    offsets : ndarray of ints
+        Group boundaries in `positions`.
+
+    """
+    group = np.cumsum(lcp < length) - 1
+    repeated = np.bincount(group)[group] > 1 if group.shape[0] > 0 \
+        else np.zeros(0, dtype=np.bool)
+    group, positions = group[repeated], sa[repeated]
+    if group.shape[0] == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(1, dtype=np.int64)
+    order = np.lexsort((positions, group))
+    group, positions = group[order], positions[order]
+    offsets = np.concatenate(([0],
+                              np.nonzero(np.diff(group))[0] + 1,
+                              [group.shape[0]]))
+    return positions, offsets
+
+
+def repeat_pairs(sa, lcp, length):
+    """
+    Pairs of positions at which the same substring occurs.
+
+    Parameters
+    ----------
+    sa, lcp : ndarray of ints
+        Output of `suffix_array`, with a depth of at least `length`.
+    length : int
+        Length of the substrings.
+
+    Returns
+    -------
+    first, second : ndarray of ints
+        Start positions of every two occurrences of a substring of `length`
+        symbols, with first < second.
+
+    """
+    positions, offsets = repeats(sa, lcp, length)
+    sizes = np.diff(offsets)
+    first = [np.zeros(0, dtype=np.int64)]
+    second = [np.zeros(0, dtype=np.int64)]
+    for n in np.unique(sizes):
+        base = offsets[:-1][sizes == n][:, np.newaxis]
+        i, j = np.triu_indices(n, 1)
+        first.append(positions[(base + i).ravel()])
+        second.append(positions[(base + j).ravel()])
+    return np.concatenate(first), np.concatenate(second)
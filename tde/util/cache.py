@@ -0,0 +1,229 @@
+"""On-disk cache of annotated class files.
+
+Annotating a class file against a corpus is the slowest part of loading the
+inputs of an evaluation. The results are stored as arrays in a cache
+directory, keyed by a hash of the contents of the input files, so that they
+are recomputed only when an input changes.
+
+Functions
+---------
+file_digest
+    Hash of the contents of files.
+save_classes
+    Write annotated classes and errors in the cache format.
+load_classes
+    Read annotated classes and errors in the cache format.
+load_classes_cached
+    Load and annotate a class file, through the cache.
+
+"""
+
+import hashlib
+import os
+import os.path as path
+import tempfile
+
+import numpy as np
+
+from tde.data.classes import ClassID, CompactClassDict
+from tde.data.fragment import FragmentToken
+from tde.data.interval import Interval
+from tde.util.reader import load_classes_txt
+
+# bump when the annotation or the cache format changes
+CACHE_VERSION = 1
+
+
+def file_digest(fnames):
+    """
+    Hash of the contents of files.
+
+    Parameters
+    ----------
+    fnames : list of strings or None
+        None stands for an absent file.
+
+    Returns
+    -------
+    string
+        Hexadecimal SHA-1 digest.
+
+    """
+    h = hashlib.sha1()
+    for fname in fnames:
+        if fname is None:
+            h.update('\0none\0')
+            continue
+        h.update('\0file\0')
+        with open(fname, 'rb') as fid:
+            for block in iter(lambda: fid.read(1 << 20), ''):
+                h.update(block)
+    return h.hexdigest()
+
+
+def _str_array(strings):
+    return np.array(list(strings), dtype=np.str_) if len(strings) > 0 \
+        else np.zeros(0, dtype='S1')
+
+
+def save_classes(fname, clsdict, errors):
+    """
+    Write annotated classes and errors in the cache format.
+
+    The file is an uncompressed .npz archive of the CompactClassDict arrays.
+    Marks are stored as sequences of phones, so that they can be interned
+    again in the symbol table of the corpus they are loaded with. The file is
+    written to a temporary name first, so that readers never see a partial
+    file.
+
+    Parameters
+    ----------
+    fname : string
+    clsdict : ClassDict
+    errors : list of FragmentToken
+
+    """
+    clsdict = CompactClassDict.from_clsdict(clsdict)
+    # the marks that are used, renumbered
+    used = np.unique(clsdict.mark_codes[clsdict.mark_codes >= 0])
+    local = np.full(len(clsdict.marks), -1, dtype=np.int32)
+    local[used] = np.arange(used.shape[0], dtype=np.int32)
+    marks = [clsdict.marks[i] for i in used]
+    phones = sorted(set(p for mark in marks for p in mark))
+    phone_index = {p: i for i, p in enumerate(phones)}
+    mark_offsets = np.zeros(len(marks) + 1, dtype=np.int64)
+    np.cumsum([len(mark) for mark in marks], out=mark_offsets[1:])
+    arrays = dict(
+        version=np.array([CACHE_VERSION]),
+        class_ids=np.array([c.ID for c in clsdict.classes], dtype=np.int64),
+        class_has_mark=np.array([c.mark is not None for c in clsdict.classes],
+                                dtype=np.bool),
+        class_marks=_str_array([c.mark or '' for c in clsdict.classes]),
+        offsets=clsdict.offsets,
+        names=_str_array(clsdict.names),
+        name_codes=clsdict.name_codes,
+        starts=clsdict.starts,
+        ends=clsdict.ends,
+        mark_codes=np.where(clsdict.mark_codes >= 0,
+                            local[np.maximum(clsdict.mark_codes, 0)],
+                            -1).astype(np.int32),
+        phones=_str_array(phones),
+        mark_offsets=mark_offsets,
+        mark_phones=np.array([phone_index[p] for mark in marks for p in mark],
+                             dtype=np.int32),
+        error_names=_str_array([f.name for f in errors]),
+        error_starts=np.array([f.interval.start for f in errors],
+                              dtype=np.double),
+        error_ends=np.array([f.interval.end for f in errors],
+                            dtype=np.double))
+    dirname = path.dirname(path.abspath(fname))
+    fd, tmpname = tempfile.mkstemp(suffix='.npz', dir=dirname)
+    try:
+        with os.fdopen(fd, 'wb') as fid:
+            np.savez(fid, **arrays)
+        os.rename(tmpname, fname)
+    except:
+        os.remove(tmpname)
+        raise
+
+
+def load_classes(fname, symbols):
+    """
+    Read annotated classes and errors in the cache format.
+
+    Parameters
+    ----------
+    fname : string
+    symbols : SymbolTable
+        Symbol table of the corpus, in which the marks are interned.
+
+    Returns
+    -------
+    CompactClassDict
+    errors : list of FragmentToken
+
+    Raises
+    ------
+    ValueError
+        If the file was written by another version of the cache.
+
+    """
+    with np.load(fname) as f:
+        arrays = dict(f.items())
+    if arrays['version'][0] != CACHE_VERSION:
+        raise ValueError('cache version mismatch in {0}'.format(fname))
+    phones = arrays['phones'].tolist()
+    mark_phones = arrays['mark_phones'].tolist()
+    mark_offsets = arrays['mark_offsets'].tolist()
+    mark_ids = symbols.mark_ids(
+        tuple(phones[p] for p in mark_phones[lo:hi])
+        for lo, hi in zip(mark_offsets[:-1], mark_offsets[1:]))
+    mark_codes = arrays['mark_codes']
+    mark_codes = np.where(mark_codes >= 0,
+                          mark_ids[np.maximum(mark_codes, 0)]
+                          if mark_ids.shape[0] > 0 else -1,
+                          -1)
+    classes = [ClassID(i, m if has_mark else None)
+               for i, has_mark, m in zip(arrays['class_ids'].tolist(),
+                                         arrays['class_has_mark'].tolist(),
+                                         arrays['class_marks'].tolist())]
+    clsdict = CompactClassDict(classes, arrays['offsets'],
+                               arrays['names'].tolist(),
+                               arrays['name_codes'],
+                               arrays['starts'], arrays['ends'],
+                               None, mark_codes, symbols=symbols)
+    errors = [FragmentToken(n, Interval(s, e), None)
+              for n, s, e in zip(arrays['error_names'].tolist(),
+                                 arrays['error_starts'].tolist(),
+                                 arrays['error_ends'].tolist())]
+    return clsdict, errors
+
+
+def load_classes_cached(filename, corpus, corpus_file, split=None,
+                        split_file=None, cache_dir=None):
+    """
+    Load and annotate a class file, through the cache.
+
+    The cache entry is keyed by the contents of the class file, the corpus
+    file and the split file, so that it is recomputed whenever one of them
+    changes.
+
+    Parameters
+    ----------
+    filename : string
+        Class file.
+    corpus : Corpus
+        Corpus loaded from `corpus_file`.
+    corpus_file : string
+    split : IntervalDB, optional
+        Split loaded from `split_file`.
+    split_file : string, optional
+    cache_dir : string, optional
+        Cache directory, created if needed. Without it, the classes are
+        loaded with `load_classes_txt` every time.
+
+    Returns
+    -------
+    CompactClassDict
+        Annotated classes, as from `load_classes_txt`.
+    errors : list of FragmentToken
+
+    """
+    if cache_dir is None:
+        clsdict, errors = load_classes_txt(filename, corpus, split=split)
+        return CompactClassDict.from_clsdict(clsdict), errors
+    key = file_digest([filename, corpus_file,
+                       split_file if split is not None else None])
+    fname = path.join(cache_dir,
+                      'classes_v{0}_{1}.npz'.format(CACHE_VERSION, key))
+    if path.exists(fname):
+        try:
+            return load_classes(fname, corpus.symbols)
+        except (IOError, ValueError, KeyError):
+            pass  # unreadable entry, recompute it
+    clsdict, errors = load_classes_txt(filename, corpus, split=split)
+    clsdict = CompactClassDict.from_clsdict(clsdict)
+    if not path.isdir(cache_dir):
+        os.makedirs(cache_dir)
+    save_classes(fname, clsdict, errors)
+    return clsdict, errors
@@ -0,0 +1,126 @@
+"""Bounded in-memory cache.
+
+Classes
+-------
+LRUCache
+    Mapping that evicts its least recently used entries.
+
+"""
+
+import sys
+import threading
+from collections import OrderedDict, namedtuple
+
+CacheInfo = namedtuple('CacheInfo',
+                       ['hits', 'misses', 'maxsize', 'maxbytes', 'currsize',
+                        'nbytes'])
+
+
+class LRUCache(object):
+    """
+    Mapping that evicts its least recently used entries.
+
+    The cache is bounded in number of entries, in bytes, or both. The size of
+    an entry is estimated with `sys.getsizeof` on its key and value, which
+    does not include the objects they refer to; that is the memory the cache
+    itself keeps alive when the values are views on shared data, like tuples
+    of the tokens of a Corpus.
+
+    Lookups with `get` are counted as hits and misses. The cache can be used
+    from several threads; the lock is not pickled.
+
+    Parameters
+    ----------
+    maxsize : int, optional
+        Maximum number of entries, None for no limit.
+    maxbytes : int, optional
+        Maximum estimated size in bytes, None for no limit.
+
+    Attributes
+    ----------
+    hits, misses : int
+    nbytes : int
+        Estimated size of the entries.
+
+    """
+    def __init__(self, maxsize=None, maxbytes=None):
+        self.maxsize = maxsize
+        self.maxbytes = maxbytes
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.nbytes = 0
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def __repr__(self):
+        return '<LRUCache {0} entries>'.format(len(self))
+
+    def get(self, key, default=None):
+        """The value for `key`, marked as most recently used."""
+        with self._lock:
+            try:
+                value, size = self._entries.pop(key)
+            except KeyError:
+                self.misses += 1
+                return default
+            self._entries[key] = (value, size)
+            self.hits += 1
+            return value
+
+    def __setitem__(self, key, value):
+        size = sys.getsizeof(key) + sys.getsizeof(value)
+        with self._lock:
+            if key in self._entries:
+                self.nbytes -= self._entries.pop(key)[1]
+            self._entries[key] = (value, size)
+            self.nbytes += size
+            self._evict()
+
+    def _evict(self):
+        entries = self._entries
+        while entries and \
+              ((self.maxsize is not None and len(entries) > self.maxsize) or
+               (self.maxbytes is not None and self.nbytes > self.maxbytes)):
+            self.nbytes -= entries.popitem(last=False)[1][1]
+
+    def resize(self, maxsize=None, maxbytes=None):
+        """Change the limits, evicting entries as needed."""
+        with self._lock:
+            self.maxsize = maxsize
+            self.maxbytes = maxbytes
+            self._evict()
+
+    def clear(self):
+        """Remove all entries. The counters are kept."""
+        with self._lock:
+            self._entries.clear()
+            self.nbytes = 0
+
+    def info(self):
+        """
+        Counters and limits of the cache.
+
+        Returns
+        -------
+        CacheInfo
+            Named tuple of hits, misses, maxsize, maxbytes, currsize and
+            nbytes.
+
+        """
+        return CacheInfo(self.hits, self.misses, self.maxsize, self.maxbytes,
+                         len(self), self.nbytes)
@@ -1,20 +1,31 @@
 """Functions for reading corpus and class files.
 """
+import os
+import os.path as path
 import re
 from collections import defaultdict
+from itertools import izip
 
+import numpy as np
 
 from tde.data.corpus import Corpus
 from tde.data.fragment import FragmentToken
 from tde.data.segment_annotation import SegmentAnnotation
 from tde.data.interval import Interval, IntervalDB
 from tde.data.classes import ClassID, ClassDict
+from tde.data.symbols import SymbolTable
 
 
 class ReadError(Exception):
     pass
 
 
+_CLASS_HEADER = re.compile(r"^Class (?P<classID>\d+)(?: (?P<mark>.+))?$")
+
+# number of fragments annotated at once by `annotate_classes`
+_ANNOTATE_CHUNKSIZE = 10000
+
+
 def read_split_single(s):
     mapping = defaultdict(list)
     for line in s.split('\n'):
@@ -44,61 +55,175 @@ def load_classfile(fname):
     return read_classfile(contents)
 
 
-def read_classfile(contents):
-    """Read in class file.
+def _split_fields(contents, nfields):
+    """Split text into fields in one pass, if it is regular.
+
+    The text is regular if every non-empty line holds exactly `nfields`
+    fields separated by single spaces, without other whitespace.
 
     Parameters
     ----------
     contents : string
+    nfields : int
 
     Returns
     -------
-    r : dict from ClassID to list of FragmentToken
+    list of strings or None
+        All fields in order, or None if the text is not regular.
 
     """
-    classp = re.compile(r"^Class (?P<classID>\d+)(?: (?P<mark>.+))?$")
-    r = {}
-    curr = []  # list of FragmentTokens without mark
+    if '  ' in contents or any(c in contents for c in '\t\r\x0b\x0c'):
+        return None
+    text = np.frombuffer(contents, dtype=np.uint8)
+    newlines = np.flatnonzero(text == ord('\n'))
+    lo = np.concatenate(([0], newlines + 1))
+    hi = np.concatenate((newlines, [text.shape[0]]))
+    nonempty = hi > lo
+    lo, hi = lo[nonempty], hi[nonempty]
+    if np.any(text[lo] == ord(' ')) or np.any(text[hi - 1] == ord(' ')):
+        return None
+    spaces = np.flatnonzero(text == ord(' '))
+    nspaces = np.searchsorted(spaces, hi) - np.searchsorted(spaces, lo)
+    if np.any(nspaces != nfields - 1):
+        return None
+    return contents.split()
+
+
+def _parse_floats(fields):
+    """Convert strings to an array of floats.
+
+    Raises ValueError, as `float` does, if a string is not a number.
+    """
+    try:
+        return np.array(fields, dtype=np.str_).astype(np.double)
+    except ValueError:
+        return np.array(map(float, fields), dtype=np.double)
+
+
+def read_classfile_arrays(contents):
+    """Read in class file as arrays.
+
+    Parameters
+    ----------
+    contents : string
+
+    Returns
+    -------
+    classes : list of ClassID
+        In the order of the file.
+    offsets : ndarray of ints
+        The fragments of classes[i] are at positions offsets[i]:offsets[i+1].
+    names : list of strings
+    starts, ends : ndarray of floats
+
+    """
+    classes = []
+    offsets = [0]
+    rows = []  # interval lines
     curr_class = None
 
-    for lineno, line in enumerate(contents.split('\n')):
-        m = re.match(classp, line)
-        if m:  # on a line with a class label
-            if curr_class is None:
-                curr_class = ClassID(int(m.group('classID')),
-                                     m.group('mark'))
-            else:
-                raise ValueError('new class while reading class')
-        else:  # on an interval line or a whitespace line
-            if len(line.strip()) > 0:
-                split = line.strip().split(' ')
-                name = split[0]
-                start = float(split[1])
-                end = float(split[2])
-                interval = Interval(start, end)
-                curr.append(FragmentToken(name, interval, None))
-            else:  # whitespace line, reset
+    for line in contents.split('\n'):
+        if line.startswith('Class '):
+            m = _CLASS_HEADER.match(line)
+            if m:  # on a line with a class label
                 if curr_class is None:
+                    curr_class = ClassID(int(m.group('classID')),
+                                         m.group('mark'))
                     continue
-                    # if lineno == 0:
-                    #     continue
-                    # print lineno, line
-                    # raise ValueError('attempting to end reading class '
-                    #                  'while not reading class in line {0}'
-                    #                  .format(lineno))
-                r[curr_class] = tuple(curr)
+                else:
+                    raise ValueError('new class while reading class')
+        line = line.strip()
+        if len(line) > 0:  # on an interval line
+            rows.append(line)
+        elif curr_class is not None:  # whitespace line, end of class
+            classes.append(curr_class)
+            offsets.append(len(rows))
+            curr_class = None
+    if not curr_class is None:
+        classes.append(curr_class)
+        offsets.append(len(rows))
+    # intervals after the last class are dropped
+    rows = rows[:offsets[-1]]
+
+    fields = _split_fields('\n'.join(rows), 3)
+    if fields is None:
+        fields = [field for row in rows for field in row.split(' ')[:3]]
+        if len(fields) != 3 * len(rows):
+            raise IndexError('interval line with less than 3 fields')
+    starts, ends = _parse_floats(fields[1::3]), _parse_floats(fields[2::3])
+    return (classes, np.array(offsets, dtype=np.int64), fields[0::3],
+            starts, ends)
+
+
+def iter_classfile(fname):
+    """Iterate over the classes in a class file.
+
+    The file is read line by line, so that only the class being read is held
+    in memory. The classes are those of `read_classfile`, in the order of the
+    file.
+
+    Parameters
+    ----------
+    fname : string
+
+    Returns
+    -------
+    iterator over (ClassID, tuple of FragmentToken)
+
+    """
+    curr = []  # list of FragmentTokens without mark
+    curr_class = None
+    with open(fname, 'r') as fid:
+        for line in fid:
+            line = line.rstrip('\n')
+            m = _CLASS_HEADER.match(line) if line.startswith('Class ') \
+                else None
+            if m:  # on a line with a class label
+                if curr_class is None:
+                    curr_class = ClassID(int(m.group('classID')),
+                                         m.group('mark'))
+                else:
+                    raise ValueError('new class while reading class')
+            elif len(line.strip()) > 0:  # on an interval line
+                split = line.strip().split(' ')
+                curr.append(FragmentToken(split[0],
+                                          Interval(float(split[1]),
+                                                   float(split[2])),
+                                          None))
+            elif curr_class is not None:  # whitespace line, end of class
+                yield curr_class, tuple(curr)
                 curr = []
                 curr_class = None
     if not curr_class is None:
-        r[curr_class] = tuple(curr)
+        yield curr_class, tuple(curr)
+
+
+def read_classfile(contents):
+    """Read in class file.
+
+    Parameters
+    ----------
+    contents : string
+
+    Returns
+    -------
+    r : dict from ClassID to list of FragmentToken
+
+    """
+    classes, offsets, names, starts, ends = read_classfile_arrays(contents)
+    starts, ends = starts.tolist(), ends.tolist()
+    r = {}
+    for i, classID in enumerate(classes):
+        r[classID] = tuple(FragmentToken(names[j],
+                                         Interval(starts[j], ends[j]),
+                                         None)
+                           for j in xrange(offsets[i], offsets[i+1]))
     return r
 
 
-def read_annotation(contents):
-    ID_prev = None
-    interval_prev = None
-    r = []
-    tokenlist_curr = []
+def _read_annotation_lines(contents):
+    # line by line, to find the line that makes the file invalid
+    names, starts, ends, marks = [], [], [], []
     for line_idx, line in enumerate(contents.split('\n')):
         if line == '':
             continue
@@ -114,28 +239,74 @@ def read_annotation(contents):
             raise ReadError('could not convert string to float in line {1}: {0}'
                             .format(line, line_idx))
         try:
-            interval_curr = Interval(start, stop)
+            Interval(start, stop)
         except ValueError:
             raise ReadError('invalid interval in line {0}: ({1:.3f} {2:.3f})'
                             .format(line_idx, start, stop))
+        names.append(ID_curr)
+        starts.append(start)
+        ends.append(stop)
+        marks.append(mark)
+    return (names, np.array(starts, dtype=np.double),
+            np.array(ends, dtype=np.double), marks)
+
+
+def read_annotation_arrays(contents):
+    """Read in annotation as arrays.
+
+    The whole text is tokenized at once; only if it turns out to be invalid
+    is it parsed again line by line, to report the offending line.
 
-        token = FragmentToken(ID_curr, interval_curr, mark)
-
-        if ID_prev is None:
-            tokenlist_curr = [token]
-            ID_prev = ID_curr
-        elif ID_prev == ID_curr:
-            if interval_prev.is_left_adjacent_to(interval_curr):
-                tokenlist_curr.append(token)
-            else:
-                r.append(tokenlist_curr)
-                tokenlist_curr = [token]
-        else:  # ID_prev != ID_curr
-            r.append(tokenlist_curr)
-            tokenlist_curr = [token]
-            ID_prev = ID_curr
-        interval_prev = interval_curr
-    r.append(tokenlist_curr)
+    Parameters
+    ----------
+    contents : string
+
+    Returns
+    -------
+    names : list of strings
+    starts, ends : ndarray of floats
+    marks : list of strings
+
+    Raises
+    ------
+    ReadError
+        If a line is badly formatted or holds an invalid interval.
+
+    """
+    fields = _split_fields(contents, 4)
+    if fields is None:
+        return _read_annotation_lines(contents)
+    try:
+        starts = _parse_floats(fields[1::4])
+        ends = _parse_floats(fields[2::4])
+    except ValueError:
+        return _read_annotation_lines(contents)
+    if np.any((ends < starts) | (starts < 0) | (ends < 0)):
+        return _read_annotation_lines(contents)
+    return fields[0::4], starts, ends, fields[3::4]
+
+
+def _segment_offsets(names, starts, ends):
+    """Offsets of the runs of adjacent tokens with the same name."""
+    n = len(names)
+    if n == 0:
+        return np.zeros(1, dtype=np.int64)
+    new = np.ones(n, dtype=np.bool)
+    new[1:] = ((np.array(names[1:], dtype=np.str_) !=
+                np.array(names[:-1], dtype=np.str_)) |
+               ~np.isclose(ends[:-1], starts[1:]))
+    return np.append(np.flatnonzero(new), n).astype(np.int64)
+
+
+def read_annotation(contents):
+    names, starts, ends, marks = read_annotation_arrays(contents)
+    offsets = _segment_offsets(names, starts, ends).tolist()
+    starts, ends = starts.tolist(), ends.tolist()
+    r = [[FragmentToken(names[i], Interval(starts[i], ends[i]), marks[i])
+          for i in xrange(lo, hi)]
+         for lo, hi in zip(offsets[:-1], offsets[1:])]
+    if len(r) == 0:
+        r = [[]]
     return r
 
 
@@ -176,8 +347,152 @@ def load_corpus_txt(filename):
     -------
     c : Corpus
 
+    Raises
+    ------
+    ReadError
+        If a line is badly formatted or holds an invalid interval, or if
+        segments of the same identifier overlap.
+
+    """
+    with open(filename, 'r') as fid:
+        contents = fid.read()
+    names, starts, ends, marks = read_annotation_arrays(contents)
+    offsets = _segment_offsets(names, starts, ends)
+    # lay out the segments by name, then in temporal order
+    name_list, name_codes = np.unique(np.array(names, dtype=np.str_),
+                                      return_inverse=True)
+    phones, phone_ids = np.unique(np.array(marks, dtype=np.str_),
+                                  return_inverse=True)
+    first, lengths = offsets[:-1], np.diff(offsets)
+    order = np.lexsort((starts[first], name_codes[first]))
+    new_offsets = np.zeros(len(order) + 1, dtype=np.int64)
+    np.cumsum(lengths[order], out=new_offsets[1:])
+    perm = np.repeat(first[order] - new_offsets[:-1], lengths[order]) + \
+        np.arange(len(names))
+    try:
+        return Corpus.from_arrays(name_list.tolist(),
+                                  name_codes[perm].astype(np.int32),
+                                  starts[perm], ends[perm],
+                                  phone_ids[perm].astype(np.int32),
+                                  new_offsets,
+                                  SymbolTable(phones.tolist()))
+    except ValueError as e:
+        raise ReadError('invalid annotation in {0}: {1}'.format(filename, e))
+
+
+# arrays of the compiled corpus format, see `save_corpus_bin`
+CORPUS_BIN_ARRAYS = ('names', 'phones', 'name_codes', 'starts', 'ends',
+                     'phone_ids', 'offsets')
+
+
+def save_corpus_bin(corpus, dirname):
+    """Write a Corpus in the compiled format.
+
+    The compiled format is a directory of .npy arrays, with the tokens laid
+    out as in `Corpus.token_arrays`:
+
+    names.npy       sorted identifiers
+    phones.npy      symbol table, the phone of each symbol id
+    name_codes.npy  index into names for each token
+    starts.npy      start time of each token
+    ends.npy        end time of each token
+    phone_ids.npy   symbol id of each token
+    offsets.npy     segment i holds the tokens offsets[i]:offsets[i+1]
+
+    Parameters
+    ----------
+    corpus : Corpus
+    dirname : string
+        Output directory, created if it does not exist.
+
     """
-    return tokenlists_to_corpus(load_annotation(filename))
+    names, name_codes, starts, ends, phone_ids = corpus.token_arrays()
+    lengths = [len(fa)
+               for name in names
+               for fa in corpus.segment_annotations[name]]
+    offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+    arrays = {'names': np.array(names, dtype=np.str_),
+              'phones': np.array(corpus.symbols.phones, dtype=np.str_),
+              'name_codes': name_codes,
+              'starts': starts,
+              'ends': ends,
+              'phone_ids': phone_ids,
+              'offsets': offsets}
+    if not path.isdir(dirname):
+        os.makedirs(dirname)
+    for key in CORPUS_BIN_ARRAYS:
+        np.save(path.join(dirname, key + '.npy'), arrays[key])
+
+
+def load_corpus_bin(dirname, mmap=True):
+    """Read a Corpus in the compiled format written by `save_corpus_bin`.
+
+    Parameters
+    ----------
+    dirname : string
+    mmap : bool, optional
+        Memory-map the token arrays instead of reading them into memory.
+
+    Returns
+    -------
+    c : Corpus
+
+    Raises
+    ------
+    ReadError
+        If an array is missing or the arrays are inconsistent.
+
+    """
+    arrays = {}
+    for key in CORPUS_BIN_ARRAYS:
+        fname = path.join(dirname, key + '.npy')
+        try:
+            arrays[key] = np.load(fname, mmap_mode='r' if mmap else None)
+        except IOError:
+            raise ReadError('could not read {0}'.format(fname))
+    names = arrays['names'].tolist()
+    symbols = SymbolTable(arrays['phones'].tolist())
+    if len(symbols.phones) != arrays['phones'].shape[0]:
+        raise ReadError('duplicate phones in {0}'.format(dirname))
+    try:
+        return Corpus.from_arrays(names,
+                                  arrays['name_codes'],
+                                  arrays['starts'],
+                                  arrays['ends'],
+                                  arrays['phone_ids'],
+                                  arrays['offsets'],
+                                  symbols)
+    except (ValueError, IndexError) as e:
+        raise ReadError('invalid corpus in {0}: {1}'.format(dirname, e))
+
+
+def load_corpus(filename):
+    """Read a corpus annotation file, from its compiled version if possible.
+
+    If `filename` + '.bin' holds the compiled corpus (see `save_corpus_bin`
+    and bin/compile_corpus.py) and it is not older than `filename`, it is
+    loaded with `load_corpus_bin`, otherwise the text file is parsed with
+    `load_corpus_txt`.
+
+    Parameters
+    ----------
+    filename : string
+
+    Returns
+    -------
+    c : Corpus
+
+    """
+    dirname = filename + '.bin'
+    try:
+        compiled = min(path.getmtime(path.join(dirname, key + '.npy'))
+                       for key in CORPUS_BIN_ARRAYS)
+    except OSError:
+        compiled = None
+    if compiled is not None and compiled >= path.getmtime(filename):
+        return load_corpus_bin(dirname)
+    return load_corpus_txt(filename)
 
 
 def tokenlists_to_corpus(tokenlists):
@@ -224,40 +539,104 @@ def load_classes_txt(filename, corpus, split=None):
         Annotated classes.
 
     """
-    raw = load_classfile(filename)  # without annotation
+    raw = iter_classfile(filename)  # without annotation
     # add mark annotation
     return annotate_classes(raw, corpus, split=split)
 
 
+def _chunk_classes(items, size):
+    """Group (ClassID, fragments) pairs into lists of about `size` fragments."""
+    chunk = []
+    nfragments = 0
+    for item in items:
+        chunk.append(item)
+        nfragments += len(item[1])
+        if nfragments >= size:
+            yield chunk
+            chunk = []
+            nfragments = 0
+    if len(chunk) > 0:
+        yield chunk
+
+
 def annotate_classes(clsdict, corpus, split=None):
+    """Annotate the fragments of classes according to a corpus.
+
+    The classes are consumed in chunks, so that an iterator like
+    `iter_classfile` is read lazily and never held in memory at once.
+
+    Parameters
+    ----------
+    clsdict : dict from ClassID to tuple of FragmentToken, or iterable over
+              (ClassID, tuple of FragmentToken) pairs
+    corpus : Corpus
+    split : IntervalDB, optional
+        Fragments not covered by the split are reported as errors and
+        truncated to the split interval with the largest overlap.
+
+    Returns
+    -------
+    ClassDict
+        Annotated classes. Fragments that can not be annotated are left out,
+        as are classes without fragments.
+    errors : list of FragmentToken
+        Fragments not covered by the split.
+
+    """
     new = {}  # with annotation
     errors = []
+    items = clsdict.iteritems() if hasattr(clsdict, 'iteritems') \
+        else iter(clsdict)
+    for chunk in _chunk_classes(items, _ANNOTATE_CHUNKSIZE):
+        _annotate_chunk(chunk, corpus, split, new, errors)
+    return ClassDict(new, symbols=corpus.symbols), errors
+
+
+def _annotate_chunk(items, corpus, split, new, errors):
     check_split = not (split is None)
-    for classID, tokenlist in clsdict.iteritems():
-        newtokens = []
+    if check_split:
+        flat = [token for _, tokenlist in items for token in tokenlist]
+        names = [token.name for token in flat]
+        starts = [token.interval.start for token in flat]
+        ends = [token.interval.end for token in flat]
+        covered = split.is_covered_many(names, starts, ends)
+        fstarts, fends = split.largest_overlap_many(names, starts, ends)
+    # the intervals to annotate, truncated to the split
+    queries = []
+    offset = 0
+    for classID, tokenlist in items:
+        intervals = []
         for token in tokenlist:
-            filename = token.name
             interval = token.interval
-            if check_split and not split.is_covered(filename, interval):
+            ix = offset
+            offset += 1
+            if check_split and not covered[ix]:
                 errors.append(token)
-                try:
-                    finterval = split.largest_overlap(filename, interval)
-                    qstart, qend = interval
-                    fstart, fend = finterval
-                    if fstart != qstart or fstart != qend:
-                        newstart = max(fstart, qstart)
-                        newend = min(fend, qend)
-                        interval = Interval(newstart, newend)
-                except KeyError:
-                    continue
-                except ValueError:
+                if np.isnan(fstarts[ix]):
                     continue
-            try:
-                annot = tuple(corpus.annotation(filename, interval))
-            except:
+                qstart, qend = interval
+                interval = Interval(max(float(fstarts[ix]), qstart),
+                                    min(float(fends[ix]), qend))
+            intervals.append((token.name, interval))
+        queries.append(intervals)
+    flat = [q for intervals in queries for q in intervals]
+    starts, stops = corpus.tokens_many([name for name, _ in flat],
+                                       [interval for _, interval in flat])
+    phone_ids = corpus.token_arrays()[4]
+    phones = corpus.symbols.phones
+    offset = 0
+    for (classID, _), intervals in izip(items, queries):
+        newtokens = []
+        for filename, interval in intervals:
+            start, stop = starts[offset], stops[offset]
+            offset += 1
+            if start < 0:
                 continue
+            annot = tuple(phones[p] for p in phone_ids[start:stop].tolist())
             newtokens.append(FragmentToken(filename, interval, annot))
         if len(newtokens) > 0:
             newtokens = tuple(newtokens)
             new[classID] = newtokens
-    return ClassDict(new), errors
+        else:
+            # a later class with the same ID replaces an earlier one
+            new.pop(classID, None)
@@ -0,0 +1,100 @@
+"""Share read-only data with joblib workers.
+
+Classes
+-------
+SharedData
+    Handle to an object that worker processes load memory-mapped.
+
+"""
+
+import os.path as path
+import shutil
+import tempfile
+
+import joblib
+
+# objects loaded in this process, by filename. A loky worker outlives the
+# handles it loads, so entries whose dump was removed are dropped on the
+# next load, and `close` drops the entry of its own process
+_loaded = {}
+
+
+class SharedData(object):
+    """
+    Handle to an object that worker processes load memory-mapped.
+
+    Pass the handle instead of the object to functions that run in joblib
+    workers and call `get` there. The first time the handle is pickled, the
+    object is dumped once with joblib in a temporary folder; every worker
+    process then loads it at most once, with the numpy arrays in it
+    memory-mapped read-only, so that large arrays are shared between the
+    workers instead of being copied into each task. In the process that
+    created the handle, `get` returns the object itself.
+
+    Use as a context manager, or call `close`, to remove the dump.
+
+    Parameters
+    ----------
+    obj : object
+        Must not be modified in place by the workers.
+
+    """
+    def __init__(self, obj):
+        self._obj = obj
+        self.folder = None
+        self.filename = None
+
+    @classmethod
+    def from_file(cls, filename, obj=None):
+        """
+        Handle to an object that was already dumped with joblib.
+
+        The workers load `filename` directly, and `close` leaves it in place.
+
+        Parameters
+        ----------
+        filename : string
+        obj : object, optional
+            The object in `filename`, if it is already loaded in this process.
+
+        """
+        shared = cls(obj)
+        shared.filename = filename
+        return shared
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __getstate__(self):
+        if self.filename is None:
+            self.folder = tempfile.mkdtemp(prefix='tde_shared_')
+            self.filename = path.join(self.folder, 'data.pkl')
+            joblib.dump(self._obj, self.filename)
+        state = self.__dict__.copy()
+        state['_obj'] = None
+        return state
+
+    def get(self):
+        """The shared object."""
+        if self._obj is None:
+            try:
+                self._obj = _loaded[self.filename]
+            except KeyError:
+                for filename in [f for f in _loaded if not path.exists(f)]:
+                    del _loaded[filename]
+                self._obj = joblib.load(self.filename, mmap_mode='r')
+                _loaded[self.filename] = self._obj
+        return self._obj
+
+    def close(self):
+        """Remove the dump, if it was made by this handle, and forget the
+        object loaded from it in this process."""
+        if self.filename is not None:
+            _loaded.pop(self.filename, None)
+        if self.folder is not None:
+            shutil.rmtree(self.folder, ignore_errors=True)
+            self.folder = None
+            self.filename = None
@@ -1,25 +1,152 @@
-from tde.data.interval import Interval
+from collections import defaultdict
+
+import numpy as np
+
+from tde.data.interval import Interval, _group_by_name
 from tde.data.fragment import FragmentToken
-from tde.data.classes import ClassDict
+from tde.data.classes import ClassDict, CompactClassDict
+
+class FoldPartition(object):
+    """
+    Assignment of items (fragments or tokens) to the folds that cover them.
+
+    Every item is checked once against the folds that hold its filename, so
+    that restricting to all the folds costs a single pass over the items
+    instead of one per fold. The restriction to fold k is then given by
+    `positions(k)`, to pass to `CompactClassDict.take` or `Corpus.take`.
+
+    Use `from_clsdict` or `from_corpus` to construct.
+
+    Parameters
+    ----------
+    folds : list of IntervalDB
+    names : sequence of strings
+    starts, ends : sequences of floats
+        Filename and bounds of each item.
+
+    Attributes
+    ----------
+    n_items : int
+    offsets : ndarray of ints
+        The items covered by fold k are at offsets[k]:offsets[k+1] in `items`.
+    items : ndarray of ints
+        Positions of the items, by fold, in increasing order within a fold.
+
+    """
+    def __init__(self, folds, names, starts, ends):
+        starts = np.asarray(starts, dtype=np.double)
+        ends = np.asarray(ends, dtype=np.double)
+        self.n_items = starts.shape[0]
+        folds_by_name = defaultdict(list)
+        for k, fold in enumerate(folds):
+            for fname in fold.starts:
+                folds_by_name[fname].append(k)
+        fold_ix = [np.zeros(0, dtype=np.int64)]
+        item_ix = [np.zeros(0, dtype=np.int64)]
+        for fname, ix in _group_by_name(names):
+            for k in folds_by_name.get(fname, []):
+                covered = ix[folds[k]._covered(fname, starts[ix], ends[ix])]
+                item_ix.append(covered)
+                fold_ix.append(np.repeat(k, covered.shape[0]))
+        fold_ix = np.concatenate(fold_ix)
+        item_ix = np.concatenate(item_ix)
+        order = np.lexsort((item_ix, fold_ix))
+        self.items = item_ix[order]
+        self.offsets = np.searchsorted(fold_ix[order],
+                                       np.arange(len(folds) + 1))
+
+    @classmethod
+    def from_clsdict(cls, folds, clsdict):
+        """
+        Assign the fragments of a ClassDict to folds.
+
+        Parameters
+        ----------
+        folds : list of IntervalDB
+        clsdict : ClassDict
+            The positions refer to the fragment arrays of
+            `CompactClassDict.from_clsdict(clsdict)`.
+
+        Returns
+        -------
+        FoldPartition
+
+        """
+        clsdict = CompactClassDict.from_clsdict(clsdict)
+        return cls(folds, [clsdict.names[c]
+                           for c in clsdict.name_codes.tolist()],
+                   clsdict.starts, clsdict.ends)
+
+    @classmethod
+    def from_corpus(cls, folds, corpus):
+        """
+        Assign the tokens of a Corpus to folds.
+
+        Parameters
+        ----------
+        folds : list of IntervalDB
+        corpus : Corpus
+            The positions refer to `corpus.token_arrays()`.
+
+        Returns
+        -------
+        FoldPartition
+
+        """
+        names, name_codes, starts, ends, _ = corpus.token_arrays()
+        return cls(folds, [names[c] for c in name_codes.tolist()],
+                   starts, ends)
+
+    def __len__(self):
+        return self.offsets.shape[0] - 1
+
+    def positions(self, k):
+        """
+        Positions of the items covered by a fold.
+
+        Parameters
+        ----------
+        k : int
+            Index of the fold.
+
+        Returns
+        -------
+        ndarray of ints
+
+        """
+        return self.items[self.offsets[k]:self.offsets[k+1]]
+
+    def sizes(self):
+        """Number of items covered by each fold."""
+        return np.diff(self.offsets)
+
 
 def truncate_intervals(clsdict, corpus, mapping):
     disc = {}
     interval_errors = []
     filename_errors = []
-    for class_id in clsdict:
+    items = [(class_id, clsdict[class_id]) for class_id in clsdict]
+    flat = [fragment for _, fragments in items for fragment in fragments]
+    fstarts, fends = mapping.largest_overlap_many(
+        [fragment.name for fragment in flat],
+        [fragment.interval.start for fragment in flat],
+        [fragment.interval.end for fragment in flat])
+    ix = 0
+    for class_id, class_fragments in items:
         fragments = []
-        for fragment in clsdict[class_id]:
+        for fragment in class_fragments:
+            fstart, fend = fstarts[ix], fends[ix]
+            ix += 1
             qname = fragment.name
             qstart = fragment.interval.start
             qend = fragment.interval.end
-            try:
-                finterval = mapping.largest_overlap(qname, fragment.interval)
-            except KeyError:
-                filename_errors.append(fragment.name)
+            if np.isnan(fstart):
+                if qname in mapping.starts:
+                    interval_errors.append(fragment)
+                else:
+                    filename_errors.append(fragment.name)
                 continue
-            except ValueError:
-                interval_errors.append(fragment)
-            fstart, fend = finterval
+            fstart, fend = float(fstart), float(fend)
             if qstart != fstart or qend != fend:
                 newstart = max(qstart, fstart)
                 newend = min(qend, fend)
@@ -30,7 +157,8 @@ def truncate_intervals(clsdict, corpus, mapping):
                                          newmark)
             fragments.append(fragment)
         disc[class_id] = tuple(fragments)
-    return ClassDict(disc), filename_errors, interval_errors
+    return ClassDict(disc, symbols=clsdict.symbols), filename_errors, \
+        interval_errors
 
 def check_intervals(clsdict, interval_db):
     """
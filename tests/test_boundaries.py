@@ -0,0 +1,37 @@
+import numpy as np
+
+from tde.data.fragment import FragmentToken
+from tde.data.interval import Interval
+from tde.measures.boundaries import Boundaries, eval_from_bounds
+
+
+def fragments(name, bounds):
+    return [FragmentToken(name, Interval(s, e), None) for s, e in bounds]
+
+
+class TestBoundaries(object):
+    gold = Boundaries(fragments('a', [(0.0, 1.0), (1.0, 2.0), (2.0, 3.5)]) +
+                      fragments('b', [(0.5, 1.5)]))
+    disc = Boundaries(fragments('a', [(0.01, 0.98), (2.1, 3.48)]) +
+                      fragments('c', [(0.0, 1.0)]))
+
+    def test_bounds(self):
+        assert (len(self.gold) == 4)
+        assert (self.gold.bounds['a'].tolist() == [0.0, 1.0, 2.0, 3.5])
+
+    def test_has_close_many(self):
+        queries = np.array([-1.0, 0.0, 0.02, 0.5, 0.98, 1.5, 1.971, 3.52,
+                            10.0])
+        for name in ['a', 'b', 'c']:
+            expected = [self.gold.has_close(name, q) for q in queries]
+            assert (self.gold.has_close_many(name, queries).tolist() ==
+                    expected)
+        assert (self.gold.has_close_many('a', []).shape == (0,))
+
+    def test_eval_from_bounds(self):
+        prec, rec = eval_from_bounds(self.disc, self.gold)
+        assert (prec == 3 / 6.)
+        assert (rec == 3 / 6.)
+        prec, rec = eval_from_bounds(Boundaries([]), self.gold)
+        assert (np.isnan(prec))
+        assert (rec == 0.0)
@@ -0,0 +1,149 @@
+import os
+
+import numpy as np
+
+from tde.data.classes import ClassID, ClassDict
+from tde.data.fragment import FragmentToken
+from tde.data.interval import Interval
+from tde.data.symbols import SymbolTable
+from tde.util.cache import file_digest, save_classes, load_classes, \
+    load_classes_cached
+import tde.util.cache
+from tde.util.reader import load_corpus_txt, load_classes_txt, load_split
+
+
+classes = """Class 0
+f1 0.000 4.000
+f2 0.000 4.000
+
+Class 1 named
+f1 1.000 4.000
+f2 1.000 4.500
+
+Class 2
+f1 0.000 3.000
+f3 0.000 3.000
+
+"""
+
+corpus = """f1 0.000 1.000 a
+f1 1.000 2.000 b
+f1 2.000 3.000 c
+f1 3.000 4.000 d
+f2 0.000 1.000 a
+f2 1.000 2.000 b
+f2 2.000 3.000 c
+f2 3.000 4.000 d
+"""
+
+split = """f1 0.000 4.000
+f2 0.000 4.000
+"""
+
+
+def write_files(tmpdir):
+    fnames = []
+    for name, contents in [('disc.classes', classes), ('corpus.phn', corpus),
+                           ('corpus.split', split)]:
+        fname = str(tmpdir.join(name))
+        with open(fname, 'w') as fid:
+            fid.write(contents)
+        fnames.append(fname)
+    return fnames
+
+
+def test_file_digest(tmpdir):
+    classfile, corpusfile, splitfile = write_files(tmpdir)
+    d = file_digest([classfile, corpusfile, None])
+    assert (d == file_digest([classfile, corpusfile, None]))
+    assert (d != file_digest([classfile, corpusfile, splitfile]))
+    assert (d != file_digest([corpusfile, classfile, None]))
+    with open(classfile, 'a') as fid:
+        fid.write('\n')
+    assert (d != file_digest([classfile, corpusfile, None]))
+
+
+def test_save_load(tmpdir):
+    symbols = SymbolTable(['a', 'b'])
+    symbols.mark_id(('b',))
+    tokens = [FragmentToken('f1', Interval(0.0, 1.0), ('a', 'b')),
+              FragmentToken('f2', Interval(0.5, 1.5), ('a', 'b')),
+              FragmentToken('f2', Interval(2.0, 3.0), ('b', 'a', 'a'))]
+    clsdict = ClassDict({ClassID(0, None): tuple(tokens[:2]),
+                         ClassID(3, 'mark'): tuple(tokens[2:])},
+                        symbols=symbols)
+    errors = [FragmentToken('f3', Interval(0.0, 1.0), None)]
+    fname = str(tmpdir.join('classes.npz'))
+    save_classes(fname, clsdict, errors)
+
+    new_symbols = SymbolTable(['b', 'a'])
+    loaded, loaded_errors = load_classes(fname, new_symbols)
+    assert (loaded == clsdict)
+    assert (loaded.symbols is new_symbols)
+    assert (sorted(new_symbols.marks) == [('a', 'b'), ('b', 'a', 'a')])
+    assert (loaded_errors == errors)
+
+
+def test_save_load_empty(tmpdir):
+    fname = str(tmpdir.join('classes.npz'))
+    save_classes(fname, ClassDict({}), [])
+    loaded, errors = load_classes(fname, SymbolTable())
+    assert (len(loaded) == 0)
+    assert (errors == [])
+
+
+def test_cached(tmpdir):
+    classfile, corpusfile, splitfile = write_files(tmpdir)
+    cache_dir = str(tmpdir.join('cache'))
+    c = load_corpus_txt(corpusfile)
+    s = load_split(splitfile)
+    expected, expected_errors = load_classes_txt(classfile, c, split=s)
+    assert (len(expected_errors) == 2)
+    key = lambda t: (t.name, t.interval.start)
+    for _ in range(2):
+        clsdict, errors = load_classes_cached(classfile, c, corpusfile,
+                                              split=s, split_file=splitfile,
+                                              cache_dir=cache_dir)
+        assert (clsdict == expected)
+        assert (sorted(errors, key=key) == sorted(expected_errors, key=key))
+        assert (len(os.listdir(cache_dir)) == 1)
+    # without split, a new entry
+    clsdict, errors = load_classes_cached(classfile, c, corpusfile,
+                                          cache_dir=cache_dir)
+    assert (clsdict == load_classes_txt(classfile, c)[0])
+    assert (errors == [])
+    assert (len(os.listdir(cache_dir)) == 2)
+    # changed input, a new entry
+    with open(classfile, 'a') as fid:
+        fid.write('Class 4\nf1 0.000 2.000\nf2 0.000 2.000\n')
+    clsdict, _ = load_classes_cached(classfile, c, corpusfile,
+                                     cache_dir=cache_dir)
+    assert (ClassID(4, None) in clsdict)
+    assert (len(os.listdir(cache_dir)) == 3)
+
+
+def test_cached_version(tmpdir, monkeypatch):
+    classfile, corpusfile, _ = write_files(tmpdir)
+    cache_dir = str(tmpdir.join('cache'))
+    c = load_corpus_txt(corpusfile)
+    load_classes_cached(classfile, c, corpusfile, cache_dir=cache_dir)
+    fname = os.listdir(cache_dir)[0]
+    monkeypatch.setattr(tde.util.cache, 'CACHE_VERSION', 2)
+    # an entry of another version under the current name is recomputed
+    os.rename(os.path.join(cache_dir, fname),
+              os.path.join(cache_dir, fname.replace('_v1_', '_v2_')))
+    clsdict, _ = load_classes_cached(classfile, c, corpusfile,
+                                     cache_dir=cache_dir)
+    assert (clsdict == load_classes_txt(classfile, c)[0])
+    with np.load(os.path.join(cache_dir,
+                              fname.replace('_v1_', '_v2_'))) as f:
+        assert (f['version'][0] == 2)
+
+
+def test_no_cache(tmpdir):
+    classfile, corpusfile, _ = write_files(tmpdir)
+    c = load_corpus_txt(corpusfile)
+    clsdict, errors = load_classes_cached(classfile, c, corpusfile)
+    assert (clsdict == load_classes_txt(classfile, c)[0])
+    assert (sorted(os.listdir(str(tmpdir))) ==
+            ['corpus.phn', 'corpus.split', 'disc.classes'])
@@ -1,4 +1,8 @@
-from tde.data.classes import ClassDict, ClassID
+import pickle
+
+import numpy as np
+
+from tde.data.classes import ClassDict, ClassID, CompactClassDict
 from tde.data.interval import Interval, IntervalDB
 from tde.data.fragment import FragmentToken
 
@@ -127,6 +131,70 @@ class TestClassDict(object):
                      (self.tokens[4], self.tokens[3])]))
 
 
+class TestCompactClassDict(object):
+    tokens = TestClassDict.tokens
+    id0 = TestClassDict.id0
+    id1 = TestClassDict.id1
+    c1 = TestClassDict.c1
+    c2 = TestClassDict.c2
+    c3 = TestClassDict.c3
+    c4 = TestClassDict.c4
+
+    def test_roundtrip(self):
+        for c in [self.c1, self.c2, self.c3, self.c4]:
+            cc = c.compact()
+            assert (isinstance(cc, CompactClassDict))
+            assert (cc == c)
+            assert (c == cc)
+            assert (len(cc) == len(c))
+            assert (set(cc) == set(c))
+
+    def test_getitem(self):
+        cc = self.c4.compact()
+        assert (cc[self.id1] == (self.tokens[3], self.tokens[4]))
+        assert (self.id0 in cc)
+        assert (cc.fragment(1) == self.tokens[2])
+        assert (cc.n_fragments() == 4)
+
+    def test_iter_fragments(self):
+        assert (list(self.c4.compact().iter_fragments()) ==
+                list(self.c4.iter_fragments()))
+        assert (list(self.c4.compact().iter_fragments(with_class=True)) ==
+                list(self.c4.iter_fragments(with_class=True)))
+
+    def test_iter_pairs(self):
+        for within in [True, False]:
+            for order in [True, False]:
+                assert (set(self.c4.compact().iter_pairs(within, order)) ==
+                        set(self.c4.iter_pairs(within, order)))
+
+    def test_restrict(self):
+        db2 = IntervalDB({'a': [Interval(0, 1)],
+                          'c': [Interval(0, 3)]})
+        cc = self.c4.compact()
+        assert (isinstance(cc.restrict(db2), CompactClassDict))
+        assert (cc.restrict(db2) == self.c4.restrict(db2))
+        assert (cc.restrict(db2, remove_singletons=True) ==
+                self.c4.restrict(db2, remove_singletons=True))
+        assert (self.c3.compact().restrict(db2) == ClassDict({}))
+
+    def test_take(self):
+        cc = self.c4.compact()
+        assert (cc.take(np.array([True, False, True, True])) ==
+                ClassDict({self.id0: (self.tokens[0],),
+                           self.id1: (self.tokens[3], self.tokens[4])}))
+        assert (cc.take(np.array([True, False, True, True]),
+                        remove_singletons=True) ==
+                ClassDict({self.id1: (self.tokens[3], self.tokens[4])}))
+
+    def test_str(self):
+        cc = self.c4.compact()
+        assert (str(cc) == repr(cc) ==
+                '<CompactClassDict 2 classes, 4 fragments>')
+
+    def test_pickle(self):
+        cc = self.c4.compact()
+        assert (pickle.loads(pickle.dumps(cc, pickle.HIGHEST_PROTOCOL)) == cc)
 
 
 class TestClassID(object):
@@ -1,9 +1,13 @@
+import pickle
+
+import numpy as np
 import pytest
 
 from tde.data.corpus import Corpus
 from tde.data.segment_annotation import SegmentAnnotation
 from tde.data.interval import Interval, IntervalDB
 from tde.data.fragment import FragmentToken
+from tde.measures.boundaries import Boundaries
 
 class TestCorpus(object):
     segment_annotations = [SegmentAnnotation('a', [
@@ -70,3 +74,159 @@ class TestCorpus(object):
                Corpus([self.segment_annotations[0],
                        SegmentAnnotation('a',
                                          self.segment_annotations[1][:3])]))
+
+    def test_pickle(self):
+        self.ca.tokens('a', Interval(0.0, 0.3))
+        ca = pickle.loads(pickle.dumps(self.ca, pickle.HIGHEST_PROTOCOL))
+        assert (ca == self.ca)
+        assert (len(ca._cache) == 0)
+        assert (ca.tokens('a', Interval(0.7, 0.9)) ==
+                self.ca.tokens('a', Interval(0.7, 0.9)))
+
+    def test_cache(self):
+        ca = Corpus(self.segment_annotations, cache_size=2)
+        for _ in range(2):
+            ca.tokens('a', Interval(0.0, 0.3))
+        ca.tokens('a', Interval(0.7, 0.9))
+        ca.tokens('b', Interval(0.2, 0.5))
+        info = ca.cache_info()
+        assert ((info.hits, info.misses, info.currsize) == (1, 3, 2))
+        # the least recently used lookup was evicted
+        assert (ca.tokens('a', Interval(0.0, 0.3)) ==
+                self.ca.tokens('a', Interval(0.0, 0.3)))
+        assert (ca.cache_info().misses == 4)
+        ca.set_cache_size(None, 0)
+        assert (ca.cache_info().currsize == 0)
+        assert (ca.restrict(IntervalDB({'a': [(0.0, 1.3)]}))
+                .cache_info().maxbytes == 0)
+
+    def test_tokens_many(self):
+        queries = [('a', Interval(0.0, 0.3)), ('a', Interval(0.75, 1.2)),
+                   ('b', Interval(0.2, 0.5)), ('a', Interval(0.55, 0.65)),
+                   ('a', Interval(10, 20)), ('c', Interval(0.0, 1.0)),
+                   ('a', Interval(0.0, 0.3, minimum_overlap=0.1))]
+        start, stop = self.ca.tokens_many([n for n, _ in queries],
+                                          [i for _, i in queries])
+        for (name, interval), i, j in zip(queries, start, stop):
+            try:
+                expected = self.ca.token_range(name, interval)
+            except (KeyError, ValueError):
+                expected = (-1, -1)
+            assert ((i, j) == expected)
+        assert (stop[:3] - start[:3]).tolist() == [3, 5, 3]
+        assert (start[4:6].tolist() == [-1, -1])
+
+    def test_token_counts(self):
+        assert (self.ca.token_counts() == (16, 7))
+        dup = Corpus(self.segment_annotations + self.segment_annotations[2:])
+        assert (dup.token_counts() == (16, 7))
+
+    def test_from_arrays(self):
+        arrays = self.ca.token_arrays() + (self.ca._segment_offsets,
+                                           self.ca.symbols)
+        ca = Corpus.from_arrays(*arrays)
+        assert (ca == self.ca)
+        # the segments are not pickled, only the arrays they are built from
+        assert ('FragmentToken' not in pickle.dumps(ca, 0))
+        restored = pickle.loads(pickle.dumps(ca, pickle.HIGHEST_PROTOCOL))
+        assert (restored == self.ca)
+        assert (restored.tokens('a', Interval(0.7, 0.9)) ==
+                self.ca.tokens('a', Interval(0.7, 0.9)))
+        rng = np.random.RandomState(0)
+        offsets = self.ca._segment_offsets.tolist()
+        for _ in range(10):
+            # a contiguous run of tokens from each segment, maybe empty
+            positions = np.concatenate([
+                np.arange(*sorted(rng.randint(lo, hi + 1, size=2)))
+                for lo, hi in zip(offsets[:-1], offsets[1:])])
+            assert (ca.take(positions) == self.ca.take(positions))
+        bounds = Boundaries(ca).bounds
+        expected = Boundaries(self.ca.iter_fragments()).bounds
+        assert (sorted(bounds) == sorted(expected))
+        for name, points in bounds.iteritems():
+            assert (np.all(points == expected[name]))
+
+
+def _baseline_tokens(corpus, name, interval):
+    """`Corpus.tokens` as it bisects the SortedLists, without the arrays."""
+    dummy_token = FragmentToken(name, interval, None)
+    fa = corpus[name].find_le(dummy_token)
+    if not fa.interval.overlap(interval) > 0:
+        raise ValueError('interval not found')
+    try:
+        start = fa.tokens.index_ge(dummy_token)
+    except ValueError:
+        return ()
+    try:
+        stop = fa.tokens.index_gt(dummy_token)
+    except ValueError:
+        stop = len(fa.tokens)
+    return tuple(fa.tokens[start:stop])
+
+
+class TestTokensMany(object):
+    def _corpus(self, rng):
+        # times on a 10ms grid, so that queries can hit token bounds exactly
+        segments = []
+        for name in ['a', 'b', 'c']:
+            t = rng.randint(0, 5)
+            for _ in range(rng.randint(1, 5)):
+                tokens = []
+                for _ in range(rng.randint(1, 8)):
+                    d = rng.randint(1, 10)
+                    tokens.append(FragmentToken(
+                        name, Interval(t * 0.01, (t + d) * 0.01),
+                        'p{0}'.format(d)))
+                    t += d
+                segments.append(SegmentAnnotation(name, tokens))
+                t += rng.randint(0, 10)
+        return Corpus(segments)
+
+    def _queries(self, rng, corpus, n):
+        bounds = sorted(set(x for fa in corpus.iter_segments()
+                            for t in fa for x in (t.interval.start,
+                                                  t.interval.end)))
+        names, intervals = [], []
+        for _ in range(n):
+            kind = rng.randint(4)
+            if kind == 0:
+                # both ends on token bounds
+                s, e = sorted(rng.choice(bounds, 2, replace=False))
+            elif kind == 1:
+                # one end on a token bound
+                s, e = sorted([rng.choice(bounds),
+                               rng.rand() * (bounds[-1] + 0.1)])
+            elif kind == 2:
+                # just off the token bounds
+                s, e = sorted(rng.choice(bounds, 2, replace=False) +
+                              rng.choice([-1e-3, 1e-3], 2))
+                s = max(s, 0.)
+            else:
+                s, e = sorted(rng.rand(2) * (bounds[-1] + 0.1))
+            if not e > s:
+                continue
+            if rng.rand() < 0.1:
+                interval = Interval(s, e, minimum_overlap=0.01)
+            else:
+                interval = Interval(s, e)
+            names.append(['a', 'b', 'c', 'd'][rng.randint(4)])
+            intervals.append(interval)
+        return names, intervals
+
+    def test_random(self):
+        rng = np.random.RandomState(42)
+        for _ in range(20):
+            corpus = self._corpus(rng)
+            names, intervals = self._queries(rng, corpus, 200)
+            start, stop = corpus.tokens_many(names, intervals)
+            _, _, starts, ends, _ = corpus.token_arrays()
+            for name, interval, i, j in zip(names, intervals, start, stop):
+                try:
+                    expected = _baseline_tokens(corpus, name, interval)
+                except (KeyError, ValueError):
+                    assert ((i, j) == (-1, -1))
+                    continue
+                assert ([(t.interval.start, t.interval.end)
+                         for t in expected] ==
+                        zip(starts[i:j].tolist(), ends[i:j].tolist()))
+                assert (corpus.tokens(name, interval) == expected)
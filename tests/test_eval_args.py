@@ -0,0 +1,48 @@
+import pytest
+
+from tde.eval.pipeline import parse_args
+
+
+def _parse(argv):
+    return parse_args('sample_eval2', 'sample', argv)
+
+
+class TestParseArgs(object):
+    def test_single(self):
+        args = _parse(['run.classes', 'resultsdir/'])
+        assert (args['disc_clsfile'] == 'run.classes')
+        assert (args['systems'] is None)
+        assert (args['outdir'] == 'resultsdir/')
+        assert (args['cache_dir'] is None)
+        assert (_parse(['run.classes', '-o', 'resultsdir/']) == args)
+        assert (_parse(['run.classes', 'resultsdir/', '--cache-dir',
+                        'cache/'])['cache_dir'] == 'cache/')
+
+    def test_systems(self):
+        args = _parse(['--systems', 'a.classes', 'b,c.classes', '-o',
+                       'resultsdir/'])
+        assert (args['systems'] == ['a.classes', 'b,c.classes'])
+        assert (args['disc_clsfile'] is None)
+        assert (args['outdir'] == 'resultsdir/')
+        assert (_parse(['-o', 'resultsdir/', '-j', '4', '--systems',
+                        'a.classes', 'b,c.classes'])['systems'] ==
+                ['a.classes', 'b,c.classes'])
+
+    def test_systems_destination(self):
+        # a positional destination after --systems would be read as a system
+        with pytest.raises(SystemExit):
+            _parse(['--systems', 'a.classes', 'b.classes', 'resultsdir/'])
+        with pytest.raises(SystemExit):
+            _parse(['resultsdir/', '--systems', 'a.classes', 'b.classes'])
+
+    def test_errors(self):
+        with pytest.raises(SystemExit):
+            _parse(['run.classes'])
+        with pytest.raises(SystemExit):
+            _parse(['run.classes', 'resultsdir/', '-o', 'resultsdir/'])
+        with pytest.raises(SystemExit):
+            _parse(['run.classes', '--systems', 'a', 'b', '-o', 'out/'])
+        with pytest.raises(SystemExit):
+            _parse(['--systems', 'x/a', 'y/a', '-o', 'out/'])
+        with pytest.raises(SystemExit):
+            _parse(['--systems', 'a', '', '-o', 'out/'])
@@ -1,7 +1,14 @@
+import warnings
+
+import numpy as np
 import pytest
 
-from tde.corpus import FragmentToken, Interval
-from tde.goldset import extract_single, extract_batch, extract_gold_fragments
+from tde.data.classes import ClassDict, ClassID
+from tde.data.fragment import FragmentToken
+from tde.data.interval import Interval, IntervalDB
+from tde.data.sets import Pclus
+from tde.goldset import extract_single, extract_batch, \
+    extract_gold_fragments, PgoldFolds
 
 class TestExtractSingle(object):
     fragments = [[FragmentToken('wavfile1', Interval(0.0,0.1), 'a'),
@@ -69,6 +76,16 @@ class TestExtractGoldFragments(object):
               FragmentToken('wavfile2', Interval(0.1,0.4), ('w', 'o', 'r')))]
         assert (extract_gold_fragments(self.fragments, 3, 20, False) == r)
 
+    def test_batch_size(self):
+        expected = extract_gold_fragments(self.fragments, 3, 20, False)
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter('always')
+            extract_gold_fragments(self.fragments, 3, 20, False)
+        assert (caught == [])
+        with pytest.deprecated_call():
+            assert (extract_gold_fragments(self.fragments, 3, 20, False,
+                                           batch_size=100) == expected)
+
 class TestExtractBatch(object):
     fragments = [[FragmentToken('wavfile1', Interval(0.0,0.1), 'a'),
                   FragmentToken('wavfile1', Interval(0.1,0.2), 'r'),
@@ -115,3 +132,40 @@ class TestExtractBatch(object):
         assert (extract_batch(self.fragments, [(1,2), None], 3, 20) ==
                 [(FragmentToken('wavfile1', Interval(0.7,1.0), ('w', 'o', 'r')),
                   FragmentToken('wavfile2', Interval(0.1,0.4), ('w', 'o', 'r')))])
+
+
+class TestPgoldFolds(object):
+    tokens = [FragmentToken('a', Interval(0.0, 1.0), ('x', 'y')),
+              FragmentToken('a', Interval(2.0, 3.0), ('x', 'y')),
+              FragmentToken('b', Interval(4.0, 5.0), ('x', 'y')),
+              FragmentToken('b', Interval(6.0, 7.0), ('x', 'z')),
+              FragmentToken('c', Interval(8.0, 9.0), ('x', 'z'))]
+    gold = ClassDict({ClassID(0, None): tuple(tokens[:3]),
+                      ClassID(1, None): tuple(tokens[3:])})
+    folds = {'cross': [IntervalDB({'a': [(0.0, 3.0)], 'b': [(4.0, 5.0)]}),
+                       IntervalDB({'b': [(4.0, 7.0)], 'c': [(8.0, 9.0)]})],
+             'within': [IntervalDB({'d': [(0.0, 1.0)]})]}
+
+    def check(self, pgold_folds):
+        for label, dbs in self.folds.iteritems():
+            for i, db in enumerate(dbs):
+                pgold = pgold_folds.pgold(label, i)
+                expected = Pclus(self.gold.restrict(db, True))
+                assert (set(pgold) == set(expected))
+                assert (pgold.nmatch() == expected.nmatch())
+                assert (pgold.weights() == expected.weights())
+                assert (np.all(pgold.sorted_keys() ==
+                               np.sort(pgold.left * len(pgold.table) +
+                                       pgold.right)))
+
+    def test_build(self):
+        self.check(PgoldFolds.build(self.gold, self.folds))
+
+    def test_save_load(self, tmpdir):
+        fname = str(tmpdir.join('sample.pgold'))
+        PgoldFolds.build(self.gold, self.folds, digest='abc').save(fname)
+        pgold_folds = PgoldFolds.load(fname, digest='abc')
+        assert (isinstance(pgold_folds.selections['cross'][0], np.memmap))
+        self.check(pgold_folds)
+        with pytest.raises(ValueError):
+            PgoldFolds.load(fname, digest='def')
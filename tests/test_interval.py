@@ -1,7 +1,11 @@
+from bisect import bisect_left, bisect_right
+from functools import cmp_to_key
+
 import pytest
 
 import numpy as np
-from tde.data.interval import Interval, interval_cmp, IntervalDB
+from tde.data.interval import Interval, interval_cmp, IntervalDB, \
+    interval_bisect, IntervalIndex
 
 class TestInterval(object):
     # This looks stupid, but it's good to test the wonky (in-)equalities that
@@ -178,3 +182,100 @@ class TestIntervalDB(object):
         assert (self.m.is_covered('a', self.q10) == False)
 
         assert (self.m.is_covered('b', None) == False)
+
+    def test_is_covered_many(self):
+        qs = [self.q1, self.q2, self.q3, self.q4, self.q5,
+              self.q6, self.q7, self.q8, self.q9, self.q10]
+        names = ['a'] * len(qs) + ['b']
+        starts = [q.start for q in qs] + [0.0]
+        ends = [q.end for q in qs] + [1.0]
+        expected = [self.m.is_covered('a', q) for q in qs] + [False]
+        assert (self.m.is_covered_many(names, starts, ends).tolist() ==
+                expected)
+
+    def test_largest_overlap_many(self):
+        names = ['a', 'a', 'a', 'a', 'b']
+        starts = [0.5, 0.0, 1.1, 1.5, 0.0]
+        ends = [1.5, 3.0, 1.9, 5.0, 1.0]
+        ostarts, oends = self.m.largest_overlap_many(names, starts, ends)
+        assert (ostarts[:2].tolist() == [0.0, 0.0])
+        assert (oends[:2].tolist() == [1.0, 1.0])
+        assert (np.isnan(ostarts[2]) and np.isnan(oends[2]))
+        assert (ostarts[3] == 2.0 and oends[3] == 3.0)
+        assert (np.isnan(ostarts[4]) and np.isnan(oends[4]))
+
+    def test_overlapping_db(self):
+        m = IntervalDB({'a': [(0.0, 10.0), (1.0, 2.0), (3.0, 4.0)]})
+        assert (m.is_covered('a', Interval(5.0, 6.0)))
+        assert (list(m.find('a', Interval(5.0, 6.0))) == [Interval(0.0, 10.0)])
+        assert (m.largest_overlap('a', Interval(3.5, 4.5)) ==
+                Interval(0.0, 10.0))
+
+    def test_largest_overlap_nested(self):
+        # every interval overlaps with most of the others
+        intervals = [(i * 0.5, i * 0.5 + 40.0) for i in range(100)] + \
+                    [(i + 0.25, i + 1.0) for i in range(50)]
+        m = IntervalDB({'a': intervals})
+        queries = [Interval(a, a + length)
+                   for a in np.arange(0.0, 60.0, 0.75).tolist()
+                   for length in (0.5, 3.0, 20.0, 45.0)]
+        ostarts, oends = m.largest_overlap_many(
+            ['a'] * len(queries), [q.start for q in queries],
+            [q.end for q in queries])
+        for q, ostart, oend in zip(queries, ostarts, oends):
+            candidates = list(m.find('a', q))
+            if len(candidates) == 0:
+                assert (np.isnan(ostart))
+                continue
+            # max keeps the earliest interval on ties
+            expected = max(candidates, key=lambda i: i.overlap(q))
+            assert (m.largest_overlap('a', q) == expected)
+            assert ((ostart, oend) == (expected.start, expected.end))
+
+
+class TestIntervalBisect(object):
+    bounds = [0.0, 0.1, 0.2, 0.25, 0.4, 0.41, 0.5]
+    starts = np.array(bounds[:-1])
+    ends = np.array(bounds[1:])
+    queries = [Interval(a, b)
+               for a in [0.0, 0.05, 0.1, 0.1 + 1e-9, 0.23, 0.4, 0.5, 0.7]
+               for b in [0.0, 0.1, 0.1 + 1e-9, 0.12, 0.205, 0.405, 0.5, 0.9]
+               if a <= b]
+
+    def expected(self, interval):
+        key = cmp_to_key(interval_cmp)
+        keys = [key(Interval(s, e)) for s, e in zip(self.bounds[:-1],
+                                                     self.bounds[1:])]
+        return (bisect_left(keys, key(interval)),
+                bisect_right(keys, key(interval)))
+
+    def test_interval_bisect(self):
+        for q in self.queries:
+            assert (interval_bisect(self.starts, self.ends, q) ==
+                    self.expected(q))
+
+    def test_unordered(self):
+        # a zero-length interval compares greater than itself
+        starts = np.array([0.0, 0.1])
+        ends = np.array([0.1, 0.1])
+        assert (interval_bisect(starts, ends, Interval(0.1, 0.1)) is None)
+
+    def test_index(self):
+        groups = np.array([0] * len(self.starts) + [1] * len(self.starts))
+        index = IntervalIndex(groups, np.tile(self.starts, 2),
+                              np.tile(self.ends, 2))
+        n = len(self.starts)
+        for group in [0, 1]:
+            left, right, valid = index.bisect(
+                np.repeat(group, len(self.queries)),
+                [q.start for q in self.queries],
+                [q.end for q in self.queries])
+            assert (np.all(valid))
+            assert (zip((left - group * n).tolist(),
+                        (right - group * n).tolist()) ==
+                    [self.expected(q) for q in self.queries])
+
+    def test_index_unsorted(self):
+        with pytest.raises(ValueError):
+            IntervalIndex(np.array([0, 0]), np.array([0.5, 0.0]),
+                          np.array([1.0, 0.5]))
@@ -0,0 +1,95 @@
+from __future__ import division
+
+import random
+
+import numpy as np
+
+from tde.data.classes import ClassDict, ClassID
+from tde.data.fragment import FragmentToken
+from tde.data.interval import Interval
+from tde.measures.nlp import NED, ned
+from tde.substrings.levenshtein import distance, distance_batch
+
+
+def levenshtein(s1, s2):
+    d = range(len(s2) + 1)
+    for i, c1 in enumerate(s1):
+        prev, d = d, [i + 1]
+        for j, c2 in enumerate(s2):
+            d.append(min(prev[j + 1] + 1, d[j] + 1, prev[j] + (c1 != c2)))
+    return d[-1]
+
+
+def encode(seqs):
+    offsets = np.cumsum([0] + [len(s) for s in seqs]).astype(np.int64)
+    symbols = np.array([c for s in seqs for c in s], dtype=np.uint32)
+    return symbols, offsets
+
+
+def test_distance():
+    kitten = np.array([ord(c) for c in 'kitten'], dtype=np.uint32)
+    sitting = np.array([ord(c) for c in 'sitting'], dtype=np.uint32)
+    empty = np.zeros(0, dtype=np.uint32)
+    assert (distance(kitten, sitting) == 3)
+    assert (distance(kitten, empty) == 6)
+    assert (distance(empty, sitting) == 7)
+    assert (distance(empty, empty) == 0)
+
+
+def test_distance_batch():
+    random.seed(0)
+    seqs = [[random.randint(0, 3) for _ in xrange(random.randint(0, 12))]
+            for _ in xrange(30)]
+    symbols, offsets = encode(seqs)
+    left = np.array([random.randint(0, 29) for _ in xrange(200)],
+                    dtype=np.int64)
+    right = np.array([random.randint(0, 29) for _ in xrange(200)],
+                     dtype=np.int64)
+    r = distance_batch(symbols, offsets, left, right)
+    assert (r.tolist() == [levenshtein(seqs[i], seqs[j])
+                           for i, j in zip(left, right)])
+    empty = np.zeros(0, dtype=np.int64)
+    assert (distance_batch(symbols, offsets, empty, empty).shape[0] == 0)
+
+
+def test_distance_batch_index():
+    symbols, offsets = encode([[0, 1], [1]])
+    try:
+        distance_batch(symbols, offsets, np.array([0], dtype=np.int64),
+                       np.array([2], dtype=np.int64))
+    except IndexError:
+        pass
+    else:
+        assert False
+
+
+def test_NED():
+    random.seed(1)
+    classes = {}
+    for c in xrange(10):
+        classes[ClassID(c, None)] = tuple(
+            FragmentToken('f{0}'.format(c), Interval(i, i + 0.5),
+                          tuple(random.choice('abc')
+                                for _ in xrange(random.randint(1, 6))))
+            for i in xrange(random.randint(1, 5)))
+    clsdict = ClassDict(classes)
+    neds = [ned(f1.mark, f2.mark)
+            for f1, f2 in clsdict.iter_pairs(within=True, order=False)]
+    assert (np.isclose(NED(clsdict), np.mean(neds)))
+    assert (NED(clsdict, n_threads=3) == NED(clsdict))
+    assert (np.isnan(NED(ClassDict({}))))
+
+
+def test_distance_batch_threads():
+    random.seed(2)
+    seqs = [[random.randint(0, 3) for _ in xrange(random.randint(0, 15))]
+            for _ in xrange(50)]
+    symbols, offsets = encode(seqs)
+    left = np.array([random.randint(0, 49) for _ in xrange(1000)],
+                    dtype=np.int64)
+    right = np.array([random.randint(0, 49) for _ in xrange(1000)],
+                     dtype=np.int64)
+    expected = distance_batch(symbols, offsets, left, right)
+    for n_threads in [2, 4]:
+        assert (np.all(distance_batch(symbols, offsets, left, right,
+                                      n_threads) == expected))
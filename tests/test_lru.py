@@ -0,0 +1,74 @@
+import pickle
+import threading
+
+from tde.util.lru import LRUCache
+
+
+class TestLRUCache(object):
+    def test_maxsize(self):
+        c = LRUCache(maxsize=2)
+        c['a'] = 1
+        c['b'] = 2
+        assert (c.get('a') == 1)
+        c['c'] = 3
+        assert ('b' not in c)
+        assert ('a' in c and 'c' in c)
+        assert (c.get('b') is None)
+        assert ((c.hits, c.misses) == (1, 1))
+
+    def test_maxbytes(self):
+        c = LRUCache()
+        c['a'] = (1, 2, 3)
+        size = c.nbytes
+        assert (size > 0)
+        c.resize(maxbytes=2 * size)
+        c['b'] = (4, 5, 6)
+        c['c'] = (7, 8, 9)
+        assert (len(c) == 2 and 'a' not in c)
+        assert (c.nbytes == 2 * size)
+        c.resize(maxsize=0)
+        assert (len(c) == 0 and c.nbytes == 0)
+
+    def test_replace(self):
+        c = LRUCache(maxsize=2)
+        c['a'] = (1,)
+        c['a'] = (1, 2)
+        assert (len(c) == 1)
+        assert (c.get('a') == (1, 2))
+        assert (c.nbytes == c.info().nbytes)
+
+    def test_clear(self):
+        c = LRUCache(maxsize=3, maxbytes=1000)
+        c['a'] = 1
+        c.get('a')
+        c.clear()
+        info = c.info()
+        assert (info == (1, 0, 3, 1000, 0, 0))
+
+    def test_pickle(self):
+        c = LRUCache(maxsize=3)
+        c['a'] = 1
+        c['b'] = 2
+        c.get('a')
+        c = pickle.loads(pickle.dumps(c, pickle.HIGHEST_PROTOCOL))
+        c['c'] = 3
+        c['d'] = 4
+        assert ('b' not in c and 'a' in c)
+
+    def test_threads(self):
+        c = LRUCache(maxsize=50)
+
+        def work(offset):
+            for i in range(2000):
+                key = (offset + i) % 100
+                if c.get(key) is None:
+                    c[key] = (key,)
+        threads = [threading.Thread(target=work, args=(k * 7,))
+                   for k in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert (len(c) == 50)
+        assert (c.hits + c.misses == 8000)
+        assert (c.nbytes == sum(c._entries[k][1] for k in c._entries))
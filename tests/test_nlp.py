@@ -1,7 +1,10 @@
 from __future__ import division
 
 from tde.data.interval import Interval
-from tde.measures.nlp import collapse, cover, coverage, ued, ned, NED
+from tde.data.classes import ClassDict, ClassID, CompactClassDict
+from tde.data.fragment import FragmentToken
+from tde.measures.nlp import collapse, collapse_arrays, cover, coverage, \
+    ued, ned, NED
 from tde.util.reader import load_corpus_txt, load_classes_txt
 
 def test_collapse():
@@ -17,6 +20,26 @@ def test_collapse():
     is4 = [Interval(0, 1), Interval(2, 3),
            Interval(0, 10)]
     assert(collapse(is4) == [Interval(0.,10)])
+    is5 = [Interval(0, 1), Interval(1.000000001, 2), Interval(0.5, 0.7)]
+    assert(collapse(is5) == [Interval(0, 2)])
+    assert(collapse([]) == [])
+
+def test_collapse_arrays():
+    codes, starts, ends = collapse_arrays([1, 0, 1, 0, 1],
+                                          [2.0, 0.0, 0.0, 0.5, 5.0],
+                                          [3.0, 1.0, 2.0, 4.0, 6.0])
+    assert(codes.tolist() == [0, 1, 1])
+    assert(starts.tolist() == [0.0, 0.0, 5.0])
+    assert(ends.tolist() == [4.0, 3.0, 6.0])
+
+def test_cover_compact():
+    clsdict = ClassDict({
+        ClassID(0, None): (FragmentToken('a', Interval(0.0, 1.0), None),
+                           FragmentToken('b', Interval(0.5, 1.0), None)),
+        ClassID(1, None): (FragmentToken('a', Interval(0.5, 2.0), None),
+                           FragmentToken('b', Interval(3.0, 4.0), None))})
+    assert(cover(clsdict) == 3.5)
+    assert(cover(CompactClassDict.from_clsdict(clsdict)) == 3.5)
 
 corpus = load_corpus_txt('tests/mockdata/tiny.phn')
 disc_clsdict = load_classes_txt('tests/mockdata/tiny.classes', corpus)
@@ -0,0 +1,219 @@
+import pickle
+
+import numpy as np
+
+from tde.data.classes import ClassDict, ClassID
+from tde.data.interval import Interval, IntervalDB
+from tde.data.fragment import FragmentToken
+from tde.data.corpus import Corpus
+from tde.data.segment_annotation import SegmentAnnotation
+from tde.data.pairs import FragmentTable, PairSet, PairIndex, within_pairs, \
+    gold_pairs, substring_pairs, _class_chunks
+from tde.data.sets import nmatch, typeset, freqs, weights, weighted_ratio
+from tde.measures.match import eval_from_psets
+from tde.substrings.acss import pairwise_substring_completion
+from tde.util.functions import unique, flatten
+from tde.util.shared import SharedData
+
+
+class TestPairs(object):
+    tokens = [FragmentToken('a', Interval(0.0, 1.0), ('x', 'y')),
+              FragmentToken('a', Interval(2.0, 3.0), ('x', 'y')),
+              FragmentToken('b', Interval(0.0, 1.0), ('x', 'z')),
+              FragmentToken('b', Interval(2.0, 3.0), ('x', 'y')),
+              FragmentToken('a', Interval(2.0, 2.5), ('x', 'z'))]
+    clsdict = ClassDict({ClassID(0, None): (tokens[1], tokens[0], tokens[2]),
+                         ClassID(1, None): (tokens[3], tokens[4]),
+                         ClassID(2, None): (tokens[0], tokens[1])})
+
+    def test_table(self):
+        table = FragmentTable.from_clsdict(self.clsdict)
+        assert (len(table) == 5)
+        assert (set(table.tokens()) == set(self.tokens))
+        assert (table.ids.shape[0] == 7)
+
+    def test_within_pairs(self):
+        for order in [True, False]:
+            pairs = within_pairs(self.clsdict, order)
+            assert (isinstance(pairs, PairSet))
+            assert (list(pairs) ==
+                    list(self.clsdict.iter_pairs(within=True, order=order)))
+
+    def test_gold_pairs(self):
+        # like iter_pairs, the overlap filter does not look at the names, so
+        # tokens 1 and 3 are not paired
+        assert (set(gold_pairs(self.clsdict)) ==
+                set([(self.tokens[0], self.tokens[1]),
+                     (self.tokens[0], self.tokens[3]),
+                     (self.tokens[4], self.tokens[2])]))
+
+    def test_set_primitives(self):
+        pairs = within_pairs(self.clsdict, True)
+        plain = list(pairs)
+        assert (typeset(pairs) is not None)
+        assert (list(typeset(pairs)) == list(typeset(plain)))
+        assert (freqs(pairs) == freqs(plain))
+        assert (weights(pairs) == weights(plain))
+        assert (nmatch(pairs) == nmatch(plain))
+
+    def test_intersection(self):
+        pclus = within_pairs(self.clsdict, False)
+        pgold = gold_pairs(self.clsdict)
+        assert (list(pgold.intersection(pclus)) ==
+                [p for p in pgold if p in set(pclus)])
+
+    def test_empty(self):
+        pairs = within_pairs(ClassDict({}), True)
+        assert (len(pairs) == 0)
+        assert (list(pairs) == [])
+        assert (nmatch(pairs) == {})
+        assert (len(gold_pairs(ClassDict({}))) == 0)
+
+    def test_pickle(self):
+        pairs = within_pairs(self.clsdict, True)
+        assert (list(pickle.loads(pickle.dumps(pairs))) == list(pairs))
+
+
+class TestSubstringPairs(object):
+    # the files do not overlap in time, as pairs of overlapping fragments are
+    # discarded regardless of their names
+    phones = 'abcdeabcdxfghij'
+    tokens = [FragmentToken(name, Interval(t + i * 0.25, t + (i + 1) * 0.25), p)
+              for name, t, ps in [('a', 0., phones[:5]),
+                                  ('b', 2., phones[5:10]),
+                                  ('c', 4., phones[10:])]
+              for i, p in enumerate(ps)]
+    corpus = Corpus([SegmentAnnotation('a', tokens[:5]),
+                     SegmentAnnotation('b', tokens[5:10]),
+                     SegmentAnnotation('c', tokens[10:])])
+    clsdict = ClassDict({
+        ClassID(0, None): (
+            FragmentToken('a', Interval(0.0, 1.0), tuple('abcd')),
+            FragmentToken('b', Interval(2.0, 3.25), tuple('abcdx')),
+            FragmentToken('c', Interval(4.25, 5.0), tuple('ghi'))),
+        ClassID(1, None): (
+            FragmentToken('a', Interval(0.0, 1.25), tuple('abcde')),
+            FragmentToken('c', Interval(4.0, 5.25), tuple('fghij')))})
+    gold = ClassDict({
+        ClassID(0, None): (
+            FragmentToken('a', Interval(0.0, 0.75), tuple('abc')),
+            FragmentToken('b', Interval(2.0, 2.75), tuple('abc')),
+            FragmentToken('c', Interval(4.0, 4.75), tuple('fgh'))),
+        ClassID(1, None): (
+            FragmentToken('a', Interval(0.25, 1.0), tuple('bcd')),
+            FragmentToken('b', Interval(2.25, 3.0), tuple('bcd')))})
+
+    def psubs(self, minlength, maxlength):
+        return set(unique(flatten(
+            pairwise_substring_completion(f1, f2, self.corpus,
+                                          minlength, maxlength)
+            for f1, f2 in self.clsdict.iter_pairs(within=True, order=True))))
+
+    def test_equivalence(self):
+        for minlength, maxlength in [(3, 20), (2, 4), (1, 2), (6, 20)]:
+            pairs = substring_pairs(self.clsdict, self.corpus,
+                                    minlength, maxlength)
+            assert (isinstance(pairs, PairSet))
+            assert ((len(pairs) == 0) == (minlength > 5))
+            assert (len(pairs) == len(set(pairs)))
+            assert (set(pairs) == self.psubs(minlength, maxlength))
+
+    def test_n_jobs(self):
+        pairs = substring_pairs(self.clsdict, self.corpus)
+        assert (_class_chunks(np.array([0, 3, 5]), 2) == [(0, 1), (1, 2)])
+        for n_jobs in (2, 3):
+            chunked = substring_pairs(self.clsdict, self.corpus,
+                                      n_jobs=n_jobs)
+            assert (list(chunked) == list(pairs))
+        with SharedData(self.corpus) as shared:
+            chunked = substring_pairs(self.clsdict, shared, n_jobs=2)
+            assert (list(chunked) == list(pairs))
+
+    def test_counts(self):
+        pairs = substring_pairs(self.clsdict, self.corpus)
+        plain = list(self.psubs(3, 20))
+        assert (freqs(pairs) == freqs(plain))
+        assert (weights(pairs) == weights(plain))
+        assert (nmatch(pairs) == nmatch(plain))
+
+    def test_translate(self):
+        pairs = substring_pairs(self.clsdict, self.corpus)
+        gold = FragmentTable.from_clsdict(self.gold)
+        tokens = pairs.table.tokens()
+        ids = pairs.table.translate(gold)
+        assert (ids.shape[0] == len(gold))
+        for i, token in zip(ids.tolist(), gold.tokens()):
+            if i < 0:
+                assert (token not in tokens)
+            else:
+                assert (tokens[i] == token)
+
+    def test_eval_from_psets(self):
+        pgold = within_pairs(self.gold, True)
+        psubs = substring_pairs(self.clsdict, self.corpus)
+        prec, rec = eval_from_psets(None, pgold, psubs)
+        eprec, erec = eval_from_psets(None, list(pgold), list(psubs))
+        assert (0 < prec < 1)
+        assert (np.isclose(prec, eprec))
+        assert (np.isclose(rec, erec))
+
+
+class TestPairIndex(object):
+    tokens = [FragmentToken('a', Interval(0.0, 1.0), ('x', 'y')),
+              FragmentToken('a', Interval(2.0, 3.0), ('x', 'y')),
+              FragmentToken('b', Interval(4.0, 5.0), ('x', 'y')),
+              FragmentToken('b', Interval(6.0, 7.0), ('x', 'z')),
+              FragmentToken('c', Interval(8.0, 9.0), ('x', 'z'))]
+    gold = ClassDict({ClassID(0, None): tuple(tokens[:3]),
+                      ClassID(1, None): tuple(tokens[3:])})
+    disc = ClassDict({
+        ClassID(0, None): (tokens[0], tokens[2],
+                           FragmentToken('c', Interval(8.0, 9.0), ('x', 'y'))),
+        ClassID(1, None): (tokens[3], tokens[4], tokens[1])})
+
+    def test_lookup(self):
+        index = PairIndex(within_pairs(self.gold, True))
+        table = FragmentTable.from_clsdict(self.disc)
+        assert (np.all(index.lookup(table) ==
+                       index.table.translate(table)))
+        ids = index.lookup(table)
+        assert (np.sum(ids < 0) == 1)
+
+    def test_contains(self):
+        index = PairIndex(within_pairs(self.gold, True))
+        pdisc = within_pairs(self.disc, True)
+        expected = set(within_pairs(self.gold, True))
+        assert (index.contains(pdisc).tolist() ==
+                [p in expected for p in pdisc])
+
+    def test_restrict(self):
+        index = PairIndex(within_pairs(self.gold, True))
+        for db in [IntervalDB({'a': [(0.0, 3.0)], 'b': [(4.0, 5.0)]}),
+                   IntervalDB({'b': [(4.0, 7.0)], 'c': [(8.0, 9.0)]}),
+                   IntervalDB({'d': [(0.0, 1.0)]})]:
+            pgold = index.restrict(db)
+            assert (pgold.index is index)
+            assert (set(pgold) ==
+                    set(within_pairs(self.gold.restrict(db, True), True)))
+
+    def test_intersection(self):
+        index = PairIndex(within_pairs(self.gold, True))
+        pgold = index.restrict(IntervalDB({'a': [(0.0, 3.0)],
+                                           'b': [(4.0, 7.0)],
+                                           'c': [(8.0, 9.0)]}))
+        plain = within_pairs(self.gold, True)
+        pdisc = within_pairs(self.disc, True)
+        assert (list(pgold.intersection(pdisc)) ==
+                [p for p in pgold if p in set(pdisc)])
+        assert (list(pdisc.intersection(pgold)) ==
+                list(pdisc.intersection(plain)))
+        assert (len(pdisc.intersection(pgold)) == 4)
+
+
+def test_weighted_ratio():
+    assert (weighted_ratio(np.array([0.5, 0.5]), np.array([1, 2]),
+                           np.array([2, 4])) == 0.5)
+    assert (weighted_ratio(np.array([0.5, 0.5, 0.]), np.array([1, 0]),
+                           np.array([1, 0, 0])) == 0.5)
+    assert (np.isnan(weighted_ratio(np.zeros(2), np.zeros(2, dtype=int),
+                                    np.zeros(2, dtype=int))))
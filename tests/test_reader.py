@@ -1,11 +1,18 @@
 import cPickle as pickle
+import os
+import os.path as path
 
+import numpy as np
 import pytest
 
 from tde.data.interval import IntervalDB
 from tde.util.reader import load_annotation, ReadError, \
     load_corpus_txt, read_classfile, annotate_classes, \
-    tokenlists_to_corpus, read_split_single, read_split_multiple, read_annotation
+    tokenlists_to_corpus, read_split_single, read_split_multiple, \
+    read_annotation, save_corpus_bin, load_corpus_bin, load_corpus, \
+    read_annotation_arrays, read_classfile_arrays, iter_classfile, \
+    load_classes_txt
+import tde.util.reader
 from tde.data.classes import ClassID
 from tde.data.fragment import FragmentToken
 from tde.data.segment_annotation import SegmentAnnotation
@@ -72,6 +79,47 @@ f2 3.000 4.000 d
                 annotate_classes(read_classfile(self.tiny_classes),
                                  tokenlists_to_corpus(read_annotation(self.tiny_corpus))))
 
+    def test_iter(self, tmpdir):
+        fname = str(tmpdir.join('tiny.classes'))
+        with open(fname, 'w') as fid:
+            fid.write(self.tiny_classes)
+        assert (list(iter_classfile(fname)) ==
+                sorted(self.clsdict_e.items(), key=lambda x: x[0].ID))
+        with open(fname, 'w') as fid:
+            fid.write(self.tiny_classes.rstrip('\n'))
+        assert (dict(iter_classfile(fname)) == self.clsdict_e)
+
+    def test_annotate_lazy(self, tmpdir, monkeypatch):
+        monkeypatch.setattr(tde.util.reader, '_ANNOTATE_CHUNKSIZE', 3)
+        fname = str(tmpdir.join('tiny.classes'))
+        with open(fname, 'w') as fid:
+            fid.write(self.tiny_classes)
+        split = IntervalDB({'f1': [(0.0, 3.5)], 'f2': [(0.0, 4.0)]})
+        key = lambda t: (t.name, t.interval.start, t.interval.end)
+        for s in [None, split]:
+            eager, eager_errors = annotate_classes(self.clsdict_e,
+                                                   self.corpus, split=s)
+            lazy, lazy_errors = load_classes_txt(fname, self.corpus, split=s)
+            assert (lazy.clsdict == eager.clsdict)
+            assert (sorted(lazy_errors, key=key) ==
+                    sorted(eager_errors, key=key))
+        assert (lazy.clsdict[ClassID(1, None)] ==
+                (FragmentToken('f1', Interval(1.0, 3.5), ('b', 'c', 'd')),
+                 FragmentToken('f2', Interval(1.0, 4.0), ('b', 'c', 'd'))))
+        assert (len(lazy_errors) == 2)
+
+    def test_annotate_duplicate(self):
+        items = [(ClassID(0, None),
+                  (FragmentToken('f1', Interval(0.0, 2.0), None),)),
+                 (ClassID(0, None),
+                  (FragmentToken('f3', Interval(0.0, 2.0), None),))]
+        clsdict, _ = annotate_classes(items, self.corpus)
+        assert (clsdict.clsdict == {})
+        clsdict, _ = annotate_classes(items[::-1], self.corpus)
+        assert (clsdict.clsdict ==
+                {ClassID(0, None):
+                 (FragmentToken('f1', Interval(0.0, 2.0), ('a', 'b')),)})
+
 
 class TestReadSplit(object):
     multi = """a 0.000 1.000
@@ -182,6 +230,172 @@ class TestCorpusAnnotationFromPhoneFile(object):
         assert (corpus1 == corpus2)
 
 
+class TestReadArrays(object):
+    contents = """f2 0.000 1.000 a
+f2 1.000 2.000 b
+f1 0.500 1.000 b
+
+f1 1.000 2.500 a
+f1 3.000 4.000 d
+"""
+
+    def test_annotation(self):
+        names, starts, ends, marks = read_annotation_arrays(self.contents)
+        assert (names == ['f2', 'f2', 'f1', 'f1', 'f1'])
+        assert (np.all(starts == [0.0, 1.0, 0.5, 1.0, 3.0]))
+        assert (np.all(ends == [1.0, 2.0, 1.0, 2.5, 4.0]))
+        assert (marks == ['a', 'b', 'b', 'a', 'd'])
+        assert ([len(tokens) for tokens in read_annotation(self.contents)] ==
+                [2, 2, 1])
+
+    def test_annotation_irregular(self):
+        # parsed line by line, like the regular text
+        irregular = self.contents.replace('f2 1.000', ' f2 1.000') \
+                                 .replace('f1 3.000 4.000 d', 'f1 3.0 4 d ')
+        assert (read_annotation(irregular) == read_annotation(self.contents))
+
+    def test_annotation_errors(self):
+        for bad, msg in [('f1 1.000 2.500  a', 'badly formatted line 4'),
+                         ('f1 1.000 2.500\ta', 'badly formatted line 4'),
+                         ('f1 1.000 2.500', 'badly formatted line 4'),
+                         ('f1 1.000 x a', 'could not convert string to float '
+                          'in line 4'),
+                         ('f1 2.600 2.500 a', 'invalid interval in line 4')]:
+            contents = self.contents.replace('f1 1.000 2.500 a', bad)
+            with pytest.raises(ReadError) as e:
+                read_annotation_arrays(contents)
+            assert (str(e.value).startswith(msg))
+
+    def test_annotation_empty(self):
+        names, starts, ends, marks = read_annotation_arrays('')
+        assert (names == [] and marks == [])
+        assert (starts.shape == ends.shape == (0,))
+        assert (read_annotation('') == [[]])
+
+    def test_corpus(self, tmpdir):
+        fname = str(tmpdir.join('corpus.phn'))
+        with open(fname, 'w') as fid:
+            fid.write(self.contents)
+        assert (load_corpus_txt(fname) ==
+                tokenlists_to_corpus(read_annotation(self.contents)))
+        with open(fname, 'w') as fid:
+            fid.write(self.contents + 'f1 2.000 3.500 c\n')
+        with pytest.raises(ReadError):
+            load_corpus_txt(fname)
+
+    def test_classfile(self):
+        classes, offsets, names, starts, ends = \
+            read_classfile_arrays(TestReadClasses.tiny_classes)
+        assert (classes == [ClassID(0, None), ClassID(1, None),
+                            ClassID(2, None)])
+        assert (np.all(offsets == [0, 2, 4, 6]))
+        assert (names == ['f1', 'f2'] * 3)
+        assert (np.all(starts == [0.0, 0.0, 1.0, 1.0, 0.0, 0.0]))
+        assert (np.all(ends == [4.0, 4.0, 4.0, 4.0, 3.0, 3.0]))
+
+    def test_classfile_irregular(self):
+        contents = """Class 0 mark
+f1 0.000 4.000 extra
+  f2 0.000 4.000\t
+
+Class 1
+f1 1.000 4.000
+"""
+        assert (read_classfile(contents) ==
+                {ClassID(0, 'mark'): (
+                    FragmentToken('f1', Interval(0.0, 4.0), None),
+                    FragmentToken('f2', Interval(0.0, 4.0), None)),
+                 ClassID(1, None): (
+                     FragmentToken('f1', Interval(1.0, 4.0), None),)})
+
+    def test_classfile_errors(self):
+        with pytest.raises(ValueError):
+            read_classfile('Class 0\nf1 0.000 4.000\nClass 1\n')
+        with pytest.raises(ValueError):
+            read_classfile('Class 0\nf1 0.000 x\n')
+        with pytest.raises(IndexError):
+            read_classfile('Class 0\nf1 0.000\n')
+        with pytest.raises(IndexError):
+            read_classfile('Class 0\nf1\t0.000 4.000\n')
+
+
+class TestCorpusBin(object):
+    contents = """f2 0.000 1.000 a
+f2 1.000 2.000 b
+f2 2.000 3.000 c
+f1 0.500 1.000 b
+f1 1.000 2.500 a
+f1 3.000 4.000 d
+f1 4.000 4.500 a
+f2 5.000 6.000 d
+"""
+
+    def write_txt(self, tmpdir):
+        fname = str(tmpdir.join('corpus.phn'))
+        with open(fname, 'w') as fid:
+            fid.write(self.contents)
+        return fname
+
+    def test_roundtrip(self, tmpdir):
+        corpus = tokenlists_to_corpus(read_annotation(self.contents))
+        dirname = str(tmpdir.join('corpus.bin'))
+        save_corpus_bin(corpus, dirname)
+        for mmap in [True, False]:
+            loaded = load_corpus_bin(dirname, mmap=mmap)
+            assert (loaded == corpus)
+            assert (loaded.symbols.phones == corpus.symbols.phones)
+            arrays, expected = loaded.token_arrays(), corpus.token_arrays()
+            assert (arrays[0] == expected[0] == ['f1', 'f2'])
+            for a, e in zip(arrays[1:], expected[1:]):
+                assert (np.all(a == e))
+            assert (isinstance(arrays[2], np.memmap) == mmap)
+            assert (loaded.tokens('f1', Interval(0.9, 2.6)) ==
+                    corpus.tokens('f1', Interval(0.9, 2.6)))
+            assert (loaded.token_range('f2', Interval(5.0, 6.0)) ==
+                    corpus.token_range('f2', Interval(5.0, 6.0)))
+
+    def test_empty(self, tmpdir):
+        dirname = str(tmpdir.join('empty.bin'))
+        save_corpus_bin(Corpus(), dirname)
+        assert (load_corpus_bin(dirname) == Corpus())
+
+    def test_missing(self, tmpdir):
+        corpus = tokenlists_to_corpus(read_annotation(self.contents))
+        dirname = str(tmpdir.join('corpus.bin'))
+        save_corpus_bin(corpus, dirname)
+        os.remove(path.join(dirname, 'starts.npy'))
+        with pytest.raises(ReadError):
+            load_corpus_bin(dirname)
+
+    def test_inconsistent(self, tmpdir):
+        corpus = tokenlists_to_corpus(read_annotation(self.contents))
+        dirname = str(tmpdir.join('corpus.bin'))
+        save_corpus_bin(corpus, dirname)
+        np.save(path.join(dirname, 'offsets.npy'), np.array([0, 2, 8]))
+        with pytest.raises(ReadError):
+            load_corpus_bin(dirname)
+        np.save(path.join(dirname, 'offsets.npy'), np.array([0, 4, 8]))
+        starts = np.load(path.join(dirname, 'starts.npy'))
+        np.save(path.join(dirname, 'starts.npy'), starts[::-1])
+        with pytest.raises(ReadError):
+            load_corpus_bin(dirname)
+
+    def test_load_corpus(self, tmpdir):
+        fname = self.write_txt(tmpdir)
+        corpus = load_corpus_txt(fname)
+        assert (load_corpus(fname) == corpus)
+        save_corpus_bin(corpus, fname + '.bin')
+        os.utime(fname, (0, 0))
+        loaded = load_corpus(fname)
+        assert (loaded == corpus)
+        assert (isinstance(loaded.token_arrays()[2], np.memmap))
+        # stale compiled corpus
+        os.utime(fname, None)
+        for name in os.listdir(fname + '.bin'):
+            os.utime(path.join(fname + '.bin', name), (0, 0))
+        assert (not isinstance(load_corpus(fname).token_arrays()[2],
+                               np.memmap))
+
 
 if __name__ == '__main__':
     fname = 'tests/mockdata/mockcorpus_small.phn'
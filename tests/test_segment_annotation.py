@@ -1,3 +1,5 @@
+import pickle
+
 import pytest
 
 from tde.data.interval import Interval, IntervalDB
@@ -64,6 +66,26 @@ class TestSegmentAnnotation(object):
         assert (SegmentAnnotation('', []).tokens_at_interval(Interval(0,1))
                 == tuple())
 
+    def test_bounds(self):
+        starts, ends, params = self.sa.bounds()
+        assert (starts.tolist() == [0.0, 0.1, 0.2, 0.3, 0.4])
+        assert (ends.tolist() == [0.1, 0.2, 0.3, 0.4, 0.5])
+        assert (params == (0.03, 0.5))
+        mixed = SegmentAnnotation('a', [
+            FragmentToken('a', Interval(0.0, 0.1), 'a'),
+            FragmentToken('a', Interval(0.1, 0.2, minimum_overlap=0.01), 'b')],
+            presorted=True)
+        assert (mixed.bounds()[2] is None)
+        # falls back to bisecting the tokens, which fails on the mixed
+        # overlap parameters
+        assert (mixed.tokens_at_interval(Interval(0.0, 0.2)) == tuple())
+
+    def test_pickle(self):
+        sa = pickle.loads(pickle.dumps(self.sa, pickle.HIGHEST_PROTOCOL))
+        assert (sa == self.sa)
+        assert (sa.tokens_at_interval(Interval(0.1, 0.4))
+                == tuple(self.tokenlist[1:4]))
+
     def test_annotation_at_interval(self):
         assert(self.sa.annotation_at_interval(Interval(0.0, 0.5))
                == tuple(['a', 'r', 'm', 's', 'a']))
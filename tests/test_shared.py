@@ -0,0 +1,66 @@
+import os.path as path
+import pickle
+import shutil
+
+import numpy as np
+
+from tde.util.shared import SharedData
+
+
+class TestSharedData(object):
+    def test_get(self):
+        obj = {'x': np.arange(10)}
+        with SharedData(obj) as shared:
+            assert (shared.get() is obj)
+            assert (shared.filename is None)
+
+    def test_pickle(self):
+        obj = {'x': np.arange(10), 'y': 'why'}
+        with SharedData(obj) as shared:
+            loaded = pickle.loads(pickle.dumps(shared)).get()
+            assert (path.exists(shared.filename))
+            assert (isinstance(loaded['x'], np.memmap))
+            assert (np.all(loaded['x'] == obj['x']))
+            assert (loaded['y'] == 'why')
+            # dumped only once
+            filename = shared.filename
+            other = pickle.loads(pickle.dumps(shared))
+            assert (shared.filename == filename)
+            assert (other.get() is loaded)
+
+    def test_close(self):
+        shared = SharedData(np.arange(10))
+        pickle.dumps(shared)
+        folder = shared.folder
+        assert (path.isdir(folder))
+        shared.close()
+        assert (not path.exists(folder))
+        shared.close()
+
+    def test_from_file(self, tmpdir):
+        import joblib
+        filename = str(tmpdir.join('data.pkl'))
+        joblib.dump({'x': np.arange(10)}, filename)
+        shared = SharedData.from_file(filename)
+        loaded = pickle.loads(pickle.dumps(shared)).get()
+        assert (isinstance(loaded['x'], np.memmap))
+        assert (np.all(loaded['x'] == np.arange(10)))
+        assert (shared.filename == filename)
+        shared.close()
+        assert (path.exists(filename))
+
+    def test_loaded(self):
+        from tde.util import shared as shared_module
+        shared = SharedData(np.arange(10))
+        pickle.loads(pickle.dumps(shared)).get()
+        assert (shared.filename in shared_module._loaded)
+        shared.close()
+        assert (shared.filename not in shared_module._loaded)
+        # an entry whose dump was removed elsewhere is dropped on next load
+        other = SharedData(np.arange(5))
+        pickle.loads(pickle.dumps(other)).get()
+        filename = other.filename
+        shutil.rmtree(other.folder)
+        with SharedData(np.arange(3)) as third:
+            pickle.loads(pickle.dumps(third)).get()
+            assert (filename not in shared_module._loaded)
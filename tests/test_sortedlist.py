@@ -209,3 +209,12 @@ def test_tuplelist_random(l1, l2):
     sl = SortedList(zip2, key=lambda x: x[1])
     assert(sorted(l1) == sl._k)
     assert(sorted(zip2, key=lambda x: x[1]) == sl._v)
+
+def test_from_sorted():
+    sl = SortedList.from_sorted([0, 1, 3, 6, 7])
+    assert(sl._k == [0, 1, 3, 6, 7])
+    assert(sl._v == [0, 1, 3, 6, 7])
+    assert(sl.find_le(4) == 3)
+    sl = SortedList.from_sorted(['c', 'bb', 'aaa'], key=len)
+    assert(sl._k == [1, 2, 3])
+    assert(sl.find_ge('xx') == 'bb')
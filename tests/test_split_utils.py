@@ -1,4 +1,5 @@
-from tde.util.splits import check_intervals, truncate_intervals
+from tde.util.splits import check_intervals, truncate_intervals, \
+    FoldPartition
 from tde.data.corpus import Corpus
 from tde.data.interval import Interval, IntervalDB
 from tde.data.classes import ClassDict, ClassID
@@ -60,3 +61,36 @@ class TestCheckTruncateIntervals(object):
            (ClassDict({ClassID(0, 'm1'): (FragmentToken('a', Interval(0.5, 1.0),
                                                         ('c', 'd')),)}),
             [], []))
+
+class TestFoldPartition(object):
+    folds = [IntervalDB({'a': [(0.0, 1.0)]}),
+             IntervalDB({'a': [(0.0, 1.0), (2.0, 3.0)], 'b': [(0.0, 1.0)]}),
+             IntervalDB({'c': [(0.0, 1.0)]})]
+    clsdict = ClassDict({
+        ClassID(0, None): (FragmentToken('a', Interval(0.0, 0.5), None),
+                           FragmentToken('a', Interval(2.0, 2.5), None),
+                           FragmentToken('b', Interval(0.5, 1.5), None)),
+        ClassID(1, None): (FragmentToken('b', Interval(0.0, 0.5), None),
+                           FragmentToken('a', Interval(0.5, 1.0), None))})
+    corpus = Corpus([SegmentAnnotation('a', [
+        FragmentToken('a', Interval(0.0, 0.5), 'x'),
+        FragmentToken('a', Interval(0.5, 1.0), 'y'),
+        FragmentToken('a', Interval(1.0, 2.5), 'z')]),
+                     SegmentAnnotation('b', [
+        FragmentToken('b', Interval(0.0, 1.0), 'x')])])
+
+    def test_positions(self):
+        p = FoldPartition.from_clsdict(self.folds, self.clsdict)
+        assert(len(p) == 3)
+        assert(p.sizes().tolist() == [2, 4, 0])
+        compact = self.clsdict.compact()
+        for k, fold in enumerate(self.folds):
+            for remove_singletons in (False, True):
+                assert(compact.take(p.positions(k), remove_singletons) ==
+                       compact.restrict(fold, remove_singletons))
+
+    def test_corpus(self):
+        p = FoldPartition.from_corpus(self.folds, self.corpus)
+        for k, fold in enumerate(self.folds):
+            assert(self.corpus.take(p.positions(k)) ==
+                   self.corpus.restrict(fold))
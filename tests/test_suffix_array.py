@@ -0,0 +1,60 @@
+import random
+from collections import Counter
+from itertools import combinations, chain, izip
+
+import numpy as np
+
+from tde.data.fragment import FragmentToken
+from tde.data.interval import Interval
+from tde.goldset import extract_gold_fragments, extract_batch
+from tde.substrings.suffix_array import suffix_array, repeats, repeat_pairs
+
+
+def test_suffix_array():
+    s = np.array([1, 2, 1, 2, 1, 0])
+    sa, lcp = suffix_array(s, 10)
+    suffixes = [tuple(s[i:]) for i in sa]
+    assert (suffixes == sorted(suffixes))
+    assert (lcp.tolist() == [0, 0, 1, 3, 0, 2])
+    _, lcp = suffix_array(s, 2)
+    assert (lcp.tolist() == [0, 0, 1, 2, 0, 2])
+
+
+def test_suffix_array_empty():
+    sa, lcp = suffix_array(np.zeros(0, dtype=int), 5)
+    assert (sa.shape[0] == 0)
+    p, o = repeats(sa, lcp, 3)
+    assert (p.shape[0] == 0 and o.tolist() == [0])
+
+
+def test_repeats():
+    s = np.array([1, 2, 1, 2, 1, 0])
+    sa, lcp = suffix_array(s, 3)
+    positions, offsets = repeats(sa, lcp, 2)
+    groups = sorted(positions[offsets[i]:offsets[i+1]].tolist()
+                    for i in xrange(offsets.shape[0] - 1))
+    assert (groups == [[0, 2], [1, 3]])
+    first, second = repeat_pairs(sa, lcp, 3)
+    assert (zip(first.tolist(), second.tolist()) == [(0, 2)])
+    assert (repeat_pairs(sa, lcp, 4)[0].shape[0] == 0)
+
+
+def test_extract_gold_fragments():
+    random.seed(0)
+    tokenlists = []
+    for u in xrange(8):
+        name = 'f{0}'.format(u // 2)
+        t0 = (u % 2) * 10.
+        tokenlists.append([FragmentToken(name,
+                                         Interval(t0 + i * 0.1,
+                                                  t0 + (i + 1) * 0.1),
+                                         random.choice('aab'))
+                           for i in xrange(random.randint(3, 25))])
+    n = len(tokenlists)
+    combos = list(chain(combinations(xrange(n), 2),
+                        izip(xrange(n), xrange(n))))
+    for minlength, maxlength in [(3, 20), (2, 4)]:
+        expected = extract_batch(tokenlists, combos, minlength, maxlength)
+        r = extract_gold_fragments(tokenlists, minlength, maxlength)
+        assert (len(r) > 0)
+        assert (Counter(r) == Counter(expected))
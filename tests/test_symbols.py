@@ -0,0 +1,60 @@
+import pickle
+
+import numpy as np
+
+from tde.data.symbols import SymbolTable
+from tde.data.classes import ClassDict, ClassID
+from tde.data.interval import Interval
+from tde.data.fragment import FragmentToken
+from tde.data.pairs import FragmentTable
+from tde.util.reader import read_annotation, tokenlists_to_corpus, \
+    annotate_classes
+
+
+class TestSymbolTable(object):
+    def test_phones(self):
+        s = SymbolTable(['a', 'b', 'a', 'c'])
+        assert (s.phones == ['a', 'b', 'c'])
+        assert (s.phone_id('b') == 1)
+        assert (s.encode(('c', 'a')).tolist() == [2, 0])
+
+    def test_marks(self):
+        s = SymbolTable(['a', 'b'])
+        assert (s.mark_id(('a', 'b')) == 0)
+        assert (s.mark_id(('b',)) == 1)
+        assert (s.mark_id(('a', 'b')) == 0)
+        assert (s.mark_ids([('b',), ('a',), ('a', 'b')]).tolist() ==
+                [1, 2, 0])
+        assert (s.marks == [('a', 'b'), ('b',), ('a',)])
+
+    def test_pickle(self):
+        s = SymbolTable(['a', 'b'])
+        s.mark_id(('a', 'b'))
+        s2 = pickle.loads(pickle.dumps(s))
+        assert (s2 == s)
+        assert (s2.mark_id(('a', 'b')) == 0)
+
+
+class TestCorpusSymbols(object):
+    contents = """f1 0.000 0.100 a
+f1 0.100 0.200 r
+f1 0.200 0.300 m
+f2 0.100 0.200 r
+f2 0.200 0.300 m
+"""
+    corpus = tokenlists_to_corpus(read_annotation(contents))
+
+    def test_corpus(self):
+        assert (self.corpus.symbols.phones == ['a', 'm', 'r'])
+
+    def test_shared_marks(self):
+        raw = ClassDict({ClassID(0, None): (
+            FragmentToken('f1', Interval(0.1, 0.3), None),
+            FragmentToken('f2', Interval(0.1, 0.3), None))})
+        clsdict, _ = annotate_classes(raw, self.corpus)
+        assert (clsdict.symbols is self.corpus.symbols)
+        table = FragmentTable.from_clsdict(clsdict)
+        mark_id = self.corpus.symbols.mark_id(('r', 'm'))
+        assert (table.mark_codes.tolist() == [mark_id, mark_id])
+        restricted = clsdict.compact().take(np.array([True, True]))
+        assert (restricted.symbols is self.corpus.symbols)
@@ -0,0 +1,25 @@
+from tde.data.classes import ClassDict, ClassID
+from tde.data.corpus import Corpus
+from tde.data.fragment import FragmentToken
+from tde.data.interval import Interval
+from tde.data.segment_annotation import SegmentAnnotation
+from tde.measures.token_type import evaluate_token_type
+
+
+class TestTokenType(object):
+    wrd_corpus = Corpus([SegmentAnnotation('a', [
+        FragmentToken('a', Interval(0.0, 0.5), 'one'),
+        FragmentToken('a', Interval(0.5, 1.0), 'two'),
+        FragmentToken('a', Interval(1.0, 1.5), 'one')])])
+    # the first fragment is listed in both classes
+    clsdict = ClassDict({
+        ClassID(0, None): (FragmentToken('a', Interval(0.0, 0.5), None),
+                           FragmentToken('a', Interval(0.5, 1.5), None)),
+        ClassID(1, None): (FragmentToken('a', Interval(0.0, 0.5), None),
+                           FragmentToken('a', Interval(0.51, 1.0), None))})
+
+    def test_shared_fragment(self):
+        expected = evaluate_token_type(self.clsdict, self.wrd_corpus)
+        assert (expected == (2 / 3., 2 / 3., 2 / 3., 1.))
+        assert (evaluate_token_type(self.clsdict.compact(),
+                                    self.wrd_corpus) == expected)